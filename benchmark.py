@@ -0,0 +1,539 @@
+"""
+离线基准测试: 在本机启动一个模拟猎聘搜索页/简历详情页的站点，以及一个模拟的火山引擎
+chat/completions 接口 (可配置延迟和错误率)，然后以非交互方式驱动 main_portable.main()
+跑完整流程，最后报告吞吐 (份简历/分钟)、分阶段耗时和内存占用。
+
+页面结构沿用线上的选择器 (div.new-resume-personal-name、.G0UQv、"查看云电话"按钮、
+getcontact 图片等)，样本数据见 benchmark_fixtures/。所有输出文件写在临时目录中，
+不会影响当前目录下的缓存、索引和登录文件。
+
+用法:
+    python benchmark.py
+    python benchmark.py --workers 4 --llm-latency 1.5 --llm-error-rate 0.1
+    python benchmark.py --scale 5 --lean --network-capture --report bench.json
+    python benchmark.py --shards 3             # 多账号分片运行 (run_sharded)，每个 worker 一个登录文件
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+try:
+    import resource  # 仅 Unix 可用
+except ImportError:
+    resource = None
+
+from aiohttp import web
+
+import main_portable as mp
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_fixtures")
+
+
+# -------------------------------------------------------------------
+# 1. 样本数据
+# -------------------------------------------------------------------
+
+def load_candidates(scale=1):
+    """读取样本候选人；scale > 1 时复制多份 (id 加后缀) 以模拟更多搜索结果。"""
+    with open(os.path.join(FIXTURE_DIR, "candidates.json"), encoding="utf-8") as f:
+        base = json.load(f)
+    candidates = []
+    for copy in range(max(1, scale)):
+        for candidate in base:
+            item = dict(candidate)
+            if copy:
+                item["id"] = f"{candidate['id']}x{copy}"
+            candidates.append(item)
+    return candidates
+
+
+def format_ym(value):
+    """'202203' -> '2022.03'，空值为 '至今' (与线上页面的写法一致)。"""
+    if not value:
+        return "至今"
+    return f"{value[:4]}.{value[4:]}"
+
+
+def work_time_text(work):
+    return f"{format_ym(work['startYm'])} - {format_ym(work['endYm'])}"
+
+
+def cv_text(candidate):
+    lines = [f"{candidate['name']} {candidate['gender']} {candidate['age']}岁 {candidate['city']}", "工作经历"]
+    for work in candidate["works"]:
+        lines.append(f"{work_time_text(work)} {work['compName']} {work['title']}")
+        lines.append(work["desc"])
+    return "\n".join(lines)
+
+
+def escape_html(text):
+    return str(text).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def render_resume(template, candidate):
+    latest = candidate["works"][0]
+    if candidate["purchased"]:
+        contact_entry = '<span class="view-phone-btn">查看云电话</span>'
+    else:
+        contact_entry = '<button class="get-chat-btn">联系</button>'
+    values = {
+        "ID": candidate["id"],
+        "NAME": escape_html(candidate["name"]),
+        "GENDER": candidate["gender"],
+        "AGE": str(candidate["age"]),
+        "CITY": escape_html(candidate["city"]),
+        "CONTACT_ENTRY": contact_entry,
+        "COMPANY": escape_html(latest["compName"]),
+        "TITLE": escape_html(latest["title"]),
+        "WORK_TIME": work_time_text(latest),
+        "CV_HTML": "<br>".join(escape_html(line) for line in cv_text(candidate).split("\n")),
+    }
+    return re.sub(r"\{\{(\w+)\}\}", lambda m: values[m.group(1)], template)
+
+
+def make_png(width, height, rows):
+    """生成 8 位灰度 PNG。rows 为 height 个长度为 width 的 bytes (0 黑 ~ 255 白)。"""
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    raw = b"".join(b"\x00" + bytes(row) for row in rows)
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw))
+            + chunk(b"IEND", b""))
+
+
+# 5x7 点阵数字字体，模拟线上联系方式图片的固定字体
+DIGIT_FONT = {
+    "0": ("01110", "10001", "10011", "10101", "11001", "10001", "01110"),
+    "1": ("00100", "01100", "00100", "00100", "00100", "00100", "01110"),
+    "2": ("01110", "10001", "00001", "00010", "00100", "01000", "11111"),
+    "3": ("11110", "00001", "00001", "01110", "00001", "00001", "11110"),
+    "4": ("00010", "00110", "01010", "10010", "11111", "00010", "00010"),
+    "5": ("11111", "10000", "11110", "00001", "00001", "10001", "01110"),
+    "6": ("00110", "01000", "10000", "11110", "10001", "10001", "01110"),
+    "7": ("11111", "00001", "00010", "00100", "01000", "01000", "01000"),
+    "8": ("01110", "10001", "10001", "01110", "10001", "10001", "01110"),
+    "9": ("01110", "10001", "10001", "01111", "00001", "00010", "01100"),
+}
+
+
+def render_digits(text, scale=2, gap=2, margin=4):
+    """用 DIGIT_FONT 把数字渲染为 PNG (浅灰底、深色字)。"""
+    height = 7 * scale + 2 * margin
+    rows = [[235] * margin for _ in range(height)]
+    for char in text:
+        glyph = DIGIT_FONT[char]
+        for y in range(height):
+            gy = (y - margin) // scale
+            inside = 0 <= y - margin < 7 * scale
+            rows[y].extend(40 if inside and glyph[gy][x // scale] == "1" else 235 for x in range(5 * scale))
+            rows[y].extend([235] * gap)
+    for row in rows:
+        row.extend([235] * margin)
+    return make_png(len(rows[0]), height, rows)
+
+
+def contact_image(candidate):
+    """联系方式图片: 号码以固定字体渲染，供截图号码识别使用。"""
+    return render_digits(candidate["phone"])
+
+
+def write_digit_templates(path):
+    """渲染一张 "0123456789" 样图并据此生成字形模板 (相当于线上人工核对一张截图)。"""
+    sample = os.path.abspath("digit_sample.png")
+    with open(sample, "wb") as f:
+        f.write(render_digits("0123456789"))
+    mp.build_digit_templates(sample, "0123456789", path)
+
+
+# -------------------------------------------------------------------
+# 2. 模拟站点与模拟 AI 接口
+# -------------------------------------------------------------------
+
+class MockServer:
+    """
+    一个 aiohttp 应用同时提供:
+    - /search                         搜索页 (结果由 /api/search 分页返回)
+    - /resume/{id}                    简历详情页
+    - /api/resume/detail              简历详情 JSON (网络捕获模式使用)
+    - /mock/liepin.com/v1/getcontact  联系方式图片
+    - /api/v3/chat/completions        模拟的火山引擎接口: 简历中出现 match_term 判为 YES
+    """
+
+    def __init__(self, candidates, page_size=20, page_latency=0.0, llm_latency=0.8,
+                 llm_error_rate=0.0, match_term="腾讯", seed=0):
+        self.candidates = candidates
+        self.by_id = {c["id"]: c for c in candidates}
+        self.page_size = page_size
+        self.page_latency = page_latency
+        self.llm_latency = llm_latency
+        self.llm_error_rate = llm_error_rate
+        self.match_term = match_term
+        self.random = random.Random(seed)
+        with open(os.path.join(FIXTURE_DIR, "search.html"), encoding="utf-8") as f:
+            self.search_template = f.read()
+        with open(os.path.join(FIXTURE_DIR, "resume.html"), encoding="utf-8") as f:
+            self.resume_template = f.read()
+        self.stats = {"pages": 0, "resume_api": 0, "images": 0, "llm_requests": 0, "llm_errors_injected": 0}
+        self._prefixes = set()  # 模拟服务端前缀缓存: 见过的 system 消息
+        self._runner = None
+        self.port = None
+
+    def build_app(self):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_get("/search", self.search_page)
+        app.router.add_get("/api/search", self.search_api)
+        app.router.add_get("/resume/{res_id}", self.resume_page)
+        app.router.add_get("/api/resume/detail", self.resume_api)
+        app.router.add_get("/mock/liepin.com/v1/getcontact", self.contact_image)
+        app.router.add_post("/api/v3/chat/completions", self.chat_completions)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    async def _page_delay(self):
+        if self.page_latency:
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.page_latency)
+
+    async def search_page(self, request):
+        await self._page_delay()
+        self.stats["pages"] += 1
+        return web.Response(text=self.search_template, content_type="text/html")
+
+    async def search_api(self, request):
+        await self._page_delay()
+        page = max(1, int(request.query.get("page", "1")))
+        start = (page - 1) * self.page_size
+        items = [{
+            "id": c["id"],
+            "name": c["name"],
+            "gender": c["gender"],
+            "age": c["age"],
+            "city": c["city"],
+            "works": [{"company": w["compName"], "title": w["title"], "time": work_time_text(w)} for w in c["works"]],
+        } for c in self.candidates[start:start + self.page_size]]
+        return web.json_response({"items": items, "has_next": start + self.page_size < len(self.candidates)})
+
+    async def resume_page(self, request):
+        candidate = self.by_id.get(request.match_info["res_id"])
+        if candidate is None:
+            raise web.HTTPNotFound()
+        await self._page_delay()
+        self.stats["pages"] += 1
+        return web.Response(text=render_resume(self.resume_template, candidate), content_type="text/html")
+
+    async def resume_api(self, request):
+        candidate = self.by_id.get(request.query.get("resId", ""))
+        if candidate is None:
+            raise web.HTTPNotFound()
+        await self._page_delay()
+        self.stats["resume_api"] += 1
+        return web.json_response({"flag": 1, "data": {
+            "resName": candidate["name"],
+            "sexName": candidate["gender"],
+            "age": str(candidate["age"]),
+            "dqName": candidate["city"],
+            "workExps": [{
+                "compName": w["compName"], "title": w["title"],
+                "startYm": w["startYm"], "endYm": w["endYm"], "duty": w["desc"],
+            } for w in candidate["works"]],
+        }})
+
+    async def contact_image(self, request):
+        candidate = self.by_id.get(request.query.get("resId", ""))
+        if candidate is None:
+            raise web.HTTPNotFound()
+        self.stats["images"] += 1
+        return web.Response(body=contact_image(candidate), content_type="image/png")
+
+    def _verdict(self, text):
+        return "YES" if self.match_term in text else "NO"
+
+    async def chat_completions(self, request):
+        payload = await request.json()
+        self.stats["llm_requests"] += 1
+        if self.llm_latency:
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.llm_latency)
+        if self.random.random() < self.llm_error_rate:
+            self.stats["llm_errors_injected"] += 1
+            status = self.random.choice((429, 500, 503))
+            return web.json_response({"error": {"code": str(status), "message": "mock injected error"}}, status=status)
+
+        # system 消息是固定前缀 (任务说明 + 提纲)，简历只在 user 消息中
+        content = next(m["content"] for m in reversed(payload["messages"]) if m["role"] == "user")
+        blocks = re.split(r"【候选人 (\d+)】:", content)
+        if len(blocks) > 1:
+            # 批量请求: 按编号分别判断
+            results = [{"id": int(idx), "verdict": self._verdict(text)} for idx, text in zip(blocks[1::2], blocks[2::2])]
+            answer = json.dumps({"results": results})
+        else:
+            cv_part = content.split("【候选人简历】:", 1)[-1]
+            answer = json.dumps({"verdict": self._verdict(cv_part)})
+
+        prompt_tokens = sum(mp.estimate_tokens(m["content"]) for m in payload["messages"])
+        prefix = payload["messages"][0]["content"] if len(payload["messages"]) > 1 else None
+        cached_tokens = mp.estimate_tokens(prefix) if prefix in self._prefixes else 0
+        if prefix:
+            self._prefixes.add(prefix)
+        return web.json_response({
+            "id": f"mock-{self.stats['llm_requests']}",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": mp.estimate_tokens(answer),
+                "total_tokens": prompt_tokens + mp.estimate_tokens(answer),
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        })
+
+
+# -------------------------------------------------------------------
+# 3. 驱动主流程并汇总报告
+# -------------------------------------------------------------------
+
+def configure_pipeline(args, server):
+    """把 main_portable 的配置指向模拟站点，所有缓存/索引/统计文件放在当前 (临时) 目录。"""
+    mp.SEARCH_PAGE_URL = server.url("/search")
+    mp.VOLC_API_URL = server.url("/api/v3/chat/completions")
+    mp.VOLC_SECRETKEY = "benchmark"
+    mp.BROWSER_CDP_URL = ""
+    mp.BROWSER_CHANNEL = "chrome" if args.chrome else None
+    mp.BROWSER_HEADLESS = not args.headed
+    mp.MAX_CONCURRENT_TABS = args.workers
+    mp.MAX_RESULT_PAGES = args.max_pages
+    mp.PROFILE_OPEN_INTERVAL_MS = tuple(args.open_interval)
+    # 速率上限 (令牌桶): 线上默认值会让吞吐封顶在限速器上，本地测试默认放开
+    mp.NAV_RATE_PER_MINUTE = args.nav_rate
+    mp.NAV_BURST = args.nav_burst
+    mp.LLM_RATE_PER_SECOND = args.llm_rate
+    mp.LLM_MAX_CONCURRENCY = args.llm_concurrency
+    mp.LLM_BATCH_MODE = args.batch
+    mp.LEAN_MODE = args.lean
+    mp.NETWORK_CAPTURE_ENABLED = args.network_capture
+    mp.SEEN_INDEX_ENABLED = False  # 每次基准测试都应完整处理全部样本
+    mp.VERDICT_CACHE_PATH = os.path.abspath("verdict_cache.sqlite3")
+    mp.SEEN_INDEX_PATH = os.path.abspath("seen_candidates.sqlite3")
+    mp.SELECTOR_STATS_PATH = os.path.abspath("selector_stats.json")
+    mp.OCR_CACHE_PATH = os.path.abspath("ocr_cache.sqlite3")
+    mp.WAREHOUSE_PATH = os.path.abspath("candidate_warehouse.sqlite3")
+    mp.OCR_TEMPLATE_PATH = os.path.abspath("digit_templates.json")
+    mp.OCR_ENABLED = not args.no_ocr
+    if mp.OCR_ENABLED and importlib.util.find_spec("PIL") is not None:
+        write_digit_templates(mp.OCR_TEMPLATE_PATH)
+    with open("state.json", "w", encoding="utf-8") as f:
+        json.dump({"cookies": [], "origins": []}, f)
+
+
+def write_shard_state_files(count):
+    """分片模式: 每个 worker 一个 (空的) 登录文件，对应线上的多个账号。"""
+    paths = []
+    for k in range(count):
+        path = os.path.abspath("state.json" if k == 0 else f"state_{k + 1}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"cookies": [], "origins": []}, f)
+        paths.append(path)
+    return paths
+
+
+def peak_rss_mb():
+    """本进程的峰值常驻内存 (MB)。浏览器进程不计入；Windows 上返回 None。"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(usage / 1024 / 1024 if sys.platform == "darwin" else usage / 1024, 1)
+
+
+async def run_benchmark(args):
+    candidates = load_candidates(args.scale)
+    server = await MockServer(
+        candidates,
+        page_size=args.page_size,
+        page_latency=args.page_latency,
+        llm_latency=args.llm_latency,
+        llm_error_rate=args.llm_error_rate,
+        match_term=args.match_term,
+        seed=args.seed,
+    ).start()
+    print(f"--- 模拟站点已启动: {server.url('/search')} ({len(candidates)} 份样本简历) ---")
+
+    configure_pipeline(args, server)
+    job = {
+        "company": args.company,
+        "position": args.position,
+        "briefing": mp.build_default_briefing(args.company, args.position),
+        "output_filename": "benchmark_contacts.xlsx",
+        "min_departure": args.min_departure,
+    }
+
+    shard_summary = None
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        if args.shards:
+            # run_sharded() 是同步的 (内部 asyncio.run + 子进程)，放到线程中运行，模拟站点继续在本事件循环上服务
+            shard_summary = await asyncio.to_thread(mp.run_sharded, write_shard_state_files(args.shards), job)
+        else:
+            await mp.main(job=job)
+    finally:
+        wall = time.perf_counter() - started
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await server.stop()
+
+    if shard_summary is not None:
+        # 简历在 worker 子进程中处理: 计数取自各 worker 的摘要，分阶段耗时见各自的指标文件
+        workers = shard_summary["workers"]
+        snapshot = {}
+        processed = sum(summary.get("processed", 0) for summary in workers)
+        qualified = sum(summary.get("qualified", 0) for summary in workers)
+    else:
+        snapshot = mp.run_metrics.snapshot() if mp.run_metrics is not None else {}
+        processed = mp.processed_resumes_count
+        qualified = mp.qualified_resumes_count
+    return {
+        "config": {
+            "candidates": len(candidates),
+            "workers": args.workers,
+            "llm_concurrency": args.llm_concurrency,
+            "llm_batch": args.batch,
+            "llm_latency": args.llm_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "page_latency": args.page_latency,
+            "open_interval_ms": list(args.open_interval),
+            "nav_rate_per_minute": mp.NAV_RATE_PER_MINUTE,
+            "nav_burst": mp.NAV_BURST,
+            "llm_rate_per_second": mp.LLM_RATE_PER_SECOND,
+            "lean": args.lean,
+            "network_capture": args.network_capture,
+            "ocr": mp.OCR_ENABLED,
+            "shards": args.shards,
+        },
+        "wall_seconds": round(wall, 3),
+        "processed": processed,
+        "qualified": qualified,
+        "resumes_per_minute": round(processed / wall * 60, 2) if wall else 0.0,
+        "python_heap_peak_mb": round(traced_peak / 1024 / 1024, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": snapshot.get("stages", {}),
+        "counters": snapshot.get("counters", {}),
+        "server": dict(server.stats),
+        "shards": shard_summary,
+    }
+
+
+def print_report(report):
+    print("\n========== 基准测试结果 ==========")
+    print(f"处理 {report['processed']} 份简历 (合格 {report['qualified']})，耗时 {report['wall_seconds']:.1f} 秒")
+    print(f"吞吐: {report['resumes_per_minute']} 份简历/分钟")
+    config = report["config"]
+    print(f"限速: 打开简历 {config['nav_rate_per_minute']} 次/分钟 (突发 {config['nav_burst']})，"
+          f"AI 请求 {config['llm_rate_per_second']} 次/秒，打开间隔 {config['open_interval_ms']} 毫秒")
+    print(f"内存: Python 堆峰值 {report['python_heap_peak_mb']} MB，进程峰值 RSS {report['peak_rss_mb']} MB (不含浏览器)")
+    print("分阶段耗时:")
+    for stage, stats in sorted(report["stages"].items()):
+        print(f"  {stage:<20} n={stats['count']:<5} p50={stats['p50']:.2f}s  p95={stats['p95']:.2f}s  max={stats['max']:.2f}s")
+    if report["counters"]:
+        print("计数: " + ", ".join(f"{name}={value}" for name, value in sorted(report["counters"].items())))
+    print("模拟站点: " + ", ".join(f"{name}={value}" for name, value in report["server"].items()))
+    shards = report.get("shards")
+    if shards:
+        print(f"分片: 分发 {shards['dispatched']} 个链接，未处理 {shards['leftover']} 个")
+        for summary in shards["workers"]:
+            if "error" in summary:
+                print(f"  worker {summary['worker']}: 出错 ({summary['error']})")
+            else:
+                print(f"  worker {summary['worker']}: 合格/已看 {summary['qualified']}/{summary['processed']}，"
+                      f"偷取 {summary['stolen']} 个")
+
+
+def parse_interval(text):
+    low, _, high = text.partition(",")
+    return int(low), int(high or low)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="离线基准测试: 用模拟站点和模拟 AI 接口跑完整流程")
+    parser.add_argument("--scale", type=int, default=1, help="样本复制倍数 (默认 60 份 × scale)")
+    parser.add_argument("--page-size", type=int, default=20, help="每页搜索结果数")
+    parser.add_argument("--max-pages", type=int, default=0, help="最多遍历几页 (0 = 全部)")
+    parser.add_argument("--workers", type=int, default=mp.MAX_CONCURRENT_TABS, help="并发标签页数")
+    parser.add_argument("--open-interval", type=parse_interval, default=(200, 500),
+                        help="打开简历的间隔下限,上限 (毫秒)，例如 1000,8000 即线上默认值")
+    parser.add_argument("--nav-rate", type=float, default=6000,
+                        help=f"打开简历的速率上限 (次/分钟)，线上默认 {mp.NAV_RATE_PER_MINUTE}")
+    parser.add_argument("--nav-burst", type=int, default=50, help=f"导航令牌桶容量，线上默认 {mp.NAV_BURST}")
+    parser.add_argument("--llm-rate", type=float, default=1000,
+                        help=f"AI 请求速率上限 (次/秒)，线上默认 {mp.LLM_RATE_PER_SECOND}")
+    parser.add_argument("--page-latency", type=float, default=0.1, help="模拟页面/接口的平均响应时间 (秒)")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="模拟 AI 接口的平均响应时间 (秒)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="模拟 AI 接口返回错误的概率 (0~1)")
+    parser.add_argument("--llm-concurrency", type=int, default=mp.LLM_MAX_CONCURRENCY, help="AI 请求并发上限")
+    parser.add_argument("--batch", action="store_true", help="启用 AI 批量模式")
+    parser.add_argument("--lean", action="store_true", help="启用精简模式")
+    parser.add_argument("--network-capture", action="store_true", help="启用网络捕获模式")
+    parser.add_argument("--company", default="腾讯")
+    parser.add_argument("--position", default="产品经理")
+    parser.add_argument("--min-departure", default="23/1", help="最早离职年限 (YY/M 或 Present)")
+    parser.add_argument("--match-term", default="腾讯", help="模拟 AI: 简历包含该词即判为 YES")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-ocr", action="store_true", help="不识别截图号码")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="以 N 个 worker 进程分片运行 (run_sharded)，每个 worker 使用单独的登录文件 (0 = 单进程 main())")
+    parser.add_argument("--chrome", action="store_true", help="使用本机 Chrome (默认使用 Playwright 自带的 Chromium)")
+    parser.add_argument("--headed", action="store_true", help="显示浏览器窗口")
+    parser.add_argument("--report", help="把结果另存为 JSON 文件")
+    parser.add_argument("--keep-dir", action="store_true", help="保留临时输出目录 (Excel、截图、指标文件)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report_path = os.path.abspath(args.report) if args.report else None
+    original_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="liepin_bench_")
+    os.chdir(workdir)
+    try:
+        report = asyncio.run(run_benchmark(args))
+    finally:
+        os.chdir(original_cwd)
+    report["output_dir"] = workdir
+    print_report(report)
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"--- 结果已写入: {report_path} ---")
+    if args.keep_dir:
+        print(f"--- 输出目录: {workdir} ---")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,154 @@
 import asyncio
+import contextlib
 import os
 import pandas as pd
 import random
 import json
 import requests
+import aiohttp
+from aiohttp import web
 from playwright.async_api import async_playwright
 import threading
+import multiprocessing
+from queue import Empty as QueueEmpty
 import time
 import re # <-- 已导入 re
+import hashlib
+import importlib.util
+import sqlite3
+import zlib
+import concurrent.futures
 
 # Constants
 VOLC_SECRETKEY = "YOUR_VOLC_SECRET_KEY"  # <-- [!!! 在此填入你的密钥 !!!] 请访问 https://www.volcengine.com/docs/82379/1263279 获取
+# 搜索页地址 (可通过环境变量指向本地测试站点)
+SEARCH_PAGE_URL = os.environ.get("LIEPIN_SEARCH_URL", "https://h.liepin.com/search/getConditionItem")
 RESUME_LINK_SELECTOR = "div.new-resume-personal-name"  # Selector for clicking resumes on search page
 CV_TEXT_SELECTOR = ".G0UQv"  # Selector for resume content
+NEXT_PAGE_SELECTOR = 'li.ant-pagination-next:not(.ant-pagination-disabled), button:has-text("下一页"), a:has-text("下一页")'  # 搜索结果翻页
+MAX_RESULT_PAGES = 10  # 最多遍历多少页搜索结果 (0 = 全部)
+MAX_CONCURRENT_TABS = 3  # 同时处理的简历标签页数量 (worker 数), 设为 1 即恢复逐个处理
+PROFILE_OPEN_INTERVAL_MS = (1000, 8000)  # 全局节流: 两次打开简历之间的间隔 (下限, 上限)，毫秒
+PACING_LATENCY_FACTOR = 1.5  # 自适应节流: 间隔 ≈ 该系数 × 最近页面响应时间
+NAV_RATE_PER_MINUTE = 40  # 打开简历页的速率上限 (令牌桶)，出错时自动减半，之后逐步恢复
+NAV_BURST = 2  # 导航令牌桶容量 (允许的短时突发)
+NAV_MAX_RETRIES = 3  # 打开简历被限流 / 拒绝 (429、403、5xx) 时的最大重试次数 (按 BACKOFF_* 指数退避)
+READY_TIMEOUT_MS = 5000  # 等待页面元素就绪的上限 (毫秒)
+SEARCH_READY_TIMEOUT_MS = 15000  # 等待搜索结果出现的上限 (毫秒)
+# 点击查看号码/支付后，出现以下任一元素即视为号码已加载
+CONTACT_READY_SELECTOR = 'img[src*="liepin.com/v1/getcontact"], div.cloud-phone h3, .contact-phone-text'
+
+# <-- !!! [用户必须修改] !!! -->
+# 替换为你在火山方舟平台上选择的模型的 Endpoint ID
+# 例如："doubao-pro-32k", "doubao-pro-128k" 等
+MODEL_ENDPOINT_ID = "doubao-seed-1-6-lite-251015" # 示例模型
+# 可通过环境变量指向本地 mock 服务，便于离线测试
+VOLC_API_URL = os.environ.get("VOLC_API_URL", "https://ark.cn-beijing.volces.com/api/v3/chat/completions")
+LLM_MAX_CONCURRENCY = 4  # 同时进行的 AI 判断请求上限
+LLM_REQUEST_TIMEOUT = 30  # 单个 AI 请求超时 (秒)
+LLM_RATE_PER_SECOND = 5  # AI 请求速率上限 (令牌桶)
+LLM_SLOW_SECONDS = 15  # 单次请求超过该耗时视为过载信号，降低并发 (AIMD)
+LLM_MAX_RETRIES = 4  # 限流 (429) / 服务端错误 (5xx) / 超时的最大重试次数
+BACKOFF_BASE_SECONDS = 1.0  # 指数退避: 第 n 次重试前等待 0 ~ min(上限, 基数 × 2^n) 秒 (随机抖动)
+BACKOFF_MAX_SECONDS = 30.0
+LLM_UNDECIDED_RETRY = True  # 本轮结束前重新处理一次"AI 无法判断"的简历 (仍无法判断的留待续跑)
+LLM_CV_TOKEN_BUDGET = 2500  # 每份简历发给 AI 的估算 token 上限 (超出时按板块优先级截断)
+LLM_MAX_COMPLETION_TOKENS = 64  # 每份简历的输出上限: 只需要 {"verdict": "YES"}
+LLM_REASONING_EFFORT = "minimal"  # 深度思考程度: minimal 不思考，判断 YES/NO 足够 (思考会占用输出上限)
+LLM_BATCH_MODE = False  # 批量模式: 多份简历合并为一次请求 (并发 worker 较多时收益更大)
+LLM_BATCH_SIZE = 5  # 每批最多几份简历
+LLM_BATCH_TOKEN_BUDGET = 24000  # 每批 (提纲 + 简历) 的估算 token 上限
+LLM_BATCH_LINGER_SECONDS = 2.0  # 凑批的最长等待时间 (秒)
+PRESCREEN_ENABLED = True  # 调用 AI 前先做本地关键词预筛
+PRESCREEN_CHECK_POSITION = False  # 是否要求简历中出现职位关键词 (职位叫法差异大，默认关闭)
+PRESCREEN_EXCLUDE_TERMS = []  # 全局排除词，例如 ["外包", "实习"]
+# 公司别名: 简历中出现任一名称即视为有该公司经历
+COMPANY_ALIASES = {
+    "腾讯": ["Tencent", "腾讯科技", "深圳市腾讯计算机系统"],
+    "阿里巴巴": ["阿里", "Alibaba", "淘宝", "天猫", "蚂蚁集团"],
+    "字节跳动": ["字节", "ByteDance", "抖音", "今日头条"],
+    "百度": ["Baidu"],
+    "美团": ["Meituan", "美团点评"],
+}
+# 职位关键词: 目标职位的其他常见叫法
+POSITION_KEYWORDS = {
+    "产品经理": ["产品", "PM", "Product Manager"],
+}
+CARD_PRESCREEN_ENABLED = True  # 打开简历前先用搜索结果卡片上的公司/职位/在职时间预筛
+CARD_CHECK_COMPANY = True  # 卡片上完全没有出现目标公司时不打开 (卡片只显示最近几段经历，若担心漏掉较早的经历可关闭)
+EXCEL_ON_PAUSE = False  # ESC 暂停时是否重新生成整个 Excel (候选人已实时写入流水文件，通常无需)
+OCR_ENABLED = True  # 识别截图格式的联系方式 (需要 Pillow 和字形模板，见 build_digit_templates())
+OCR_TEMPLATE_PATH = "digit_templates.json"  # 字形模板文件
+OCR_CACHE_PATH = "ocr_cache.sqlite3"  # 识别结果缓存 (按图片内容哈希)
+OCR_WORKERS = 2  # 识别用的进程数
+OCR_MIN_CONFIDENCE = 0.85  # 每个字符的最低匹配度，低于此值 (或号码格式不对) 标记为待人工核对
+OCR_EXPECT_PATTERN = r"1[3-9]\d{9}"  # 识别结果应满足的号码格式
+OCR_GLYPH_SIZE = (10, 16)  # 字符归一化后的尺寸 (宽, 高)
+CV_STORE_DIR = "cv_store"  # 简历全文的压缩存储目录 (按内容哈希寻址)，内存中只保留哈希，导出 Excel 时再读取
+CONTROL_HOST = "127.0.0.1"  # 本机控制接口地址 (pause/resume/save/status/drain)
+CONTROL_PORT = 8765  # 控制接口端口，0 = 不启动
+SHARD_STATE_FILES = []  # 多账号分片运行: 每个 worker 进程的登录文件，例如 ["state.json", "state_2.json"]
+SHARD_WORKER_QUOTA = 200  # 每个 worker (账号) 每次运行最多处理的简历数
+BROWSER_CDP_URL = ""  # 例如 "http://localhost:9222": 连接已打开的 Chrome，而不是启动新的
+BROWSER_PAGE_BUDGET = 500  # 常驻浏览器打开的页面数达到该值后，在下一轮开始前重启
+BROWSER_CHANNEL = 'chrome'  # 使用本机安装的 Chrome；设为 None 则使用 Playwright 自带的 Chromium
+BROWSER_HEADLESS = False  # 无头模式运行 main() (登录用的 save_session() 始终显示窗口)
+LEAN_MODE = False  # 精简模式: 拦截图片、字体、音视频和统计脚本，加快页面加载
+LEAN_BLOCK_RESOURCE_TYPES = ("image", "font", "media")
+LEAN_BLOCK_URL_PATTERNS = [r"google-analytics", r"googletagmanager", r"doubleclick", r"hm\.baidu\.com",
+                           r"cnzz\.com", r"growingio", r"sensorsdata", r"/collect\?", r"tracking"]
+LEAN_ALLOW_PATTERNS = [r"liepin\.com/v1/getcontact"]  # 始终放行 (联系方式图片)，简历接口见 RESUME_RESPONSE_PATTERNS
+LEAN_ESTIMATED_BYTES = {"image": 40 * 1024, "font": 60 * 1024, "media": 500 * 1024, "tracker": 20 * 1024}  # 用于估算节省流量
+NETWORK_CAPTURE_ENABLED = False  # 网络捕获模式: 优先解析简历详情接口的 JSON，DOM 提取作为兜底
+NETWORK_CAPTURE_WAIT_MS = 3000  # 等待简历接口响应的上限 (毫秒)
+RESUME_RESPONSE_PATTERNS = [r"resume.*detail", r"showresumedetail", r"/res/.*get"]  # 简历详情接口 URL 正则
+METRICS_FORMAT = "json"  # 运行指标文件格式: "json" 或 "prometheus"
+SELECTOR_STATS_PATH = "selector_stats.json"  # 各字段选择器命中统计，下次运行优先尝试命中最多的
+SEEN_INDEX_ENABLED = True  # 跨运行记录已处理的候选人，再次出现时跳过
+SEEN_INDEX_PATH = "seen_candidates.sqlite3"
+SEEN_SKIP_DAYS = 7  # 最近 N 天内处理过的候选人直接跳过 (0 = 不按时间跳过)
+SEEN_SKIP_PURCHASED = True  # 已获取过联系方式的候选人永远跳过
+VERDICT_CACHE_PATH = "verdict_cache.sqlite3"  # AI 判断结果的本地缓存文件
+VERDICT_CACHE_TTL_DAYS = 30  # 缓存有效期 (天)
+VERDICT_CACHE_MAX_ENTRIES = 50000  # 缓存最大条数，超出按最近使用时间淘汰
+SCREENING_PROMPT_VERSION = 2  # 筛选提示词/输出格式的版本，计入缓存键；修改 build_screening_prefix() 时 +1，旧提示词下的缓存随之失效
+WAREHOUSE_ENABLED = True  # 每份抓取到的简历 (字段 + 全文) 都存入本地候选人库，新提纲可离线重筛 (见 rescreen_warehouse())
+WAREHOUSE_PATH = "candidate_warehouse.sqlite3"
 
 # --- [!!! 修改点 1: 全局变量 !!!] ---
-# Global variables for pause functionality
-pause_flag = threading.Event()
-pause_flag.set()  # Initially running
+# 暂停/继续由 PauseController 控制 (见第 4 节之后的 pause_controller)
 # Global variables for thread-safe saving
 contacts_lock = threading.Lock()
-saved_contacts = []
+saved_contacts = []  # 合格候选人 (CandidateRecord，不含简历全文)
 output_filename = "" 
+llm_client = None  # 当前运行使用的筛选客户端 (VolcScreeningClient 或 BatchScreener，在 main() 中创建)
+verdict_cache = None  # 当前运行使用的 VerdictCache
+pre_screener = None  # 当前运行使用的 PreScreener
+card_screener = None  # 当前运行使用的 CardScreener (搜索结果卡片级预筛)
+target_matcher = None  # 目标公司 (含别名) 的正则，用于在工作经历中找到目标公司的那一段
+contact_journal = None  # 当前运行的候选人流水文件 (ContactJournal)
+run_checkpoint = None  # 当前搜索的检查点 (RunCheckpoint)，用于崩溃后续跑
+seen_index = None  # 跨运行的已处理候选人索引 (SeenIndex)
+candidate_warehouse = None  # 本地候选人库 (CandidateWarehouse)
+wait_tracker = None  # 当前运行的等待时间统计 (WaitTracker)
+selector_stats = None  # 字段选择器命中统计 (SelectorStats)
+response_collector = None  # 网络捕获模式下的简历接口响应收集器 (ResumeResponseCollector)
+resource_blocker = None  # 精简模式下的请求拦截器 (ResourceBlocker)
+run_metrics = None  # 当前运行的分阶段耗时与计数 (RunMetrics)
+rate_controller = None  # 当前运行的导航 / AI 接口限速器 (RateController)
+cv_store = None  # 简历全文存储 (CVStore)
+contact_ocr = None  # 截图号码识别 (ContactOCR)，不可用时为 None
 qualified_resumes_count = 0 # <-- 新增: n (合格数)
 processed_resumes_count = 0 # <-- 新增: m (已看数)
 # --- [!!! 修改结束 !!!] ---
 
 
-async def save_session():
+async def save_session(state_path="state.json"):
     """
     仅运行一次。
     运行此函数，在弹出的浏览器中手动登录猎聘网。
     登录成功后，按 Enter 键，会话将保存到 state.json。
+    (多账号分片运行时，为每个账号分别保存，例如 save_session("state_2.json"))
     """
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=False, channel='chrome')
@@ -43,89 +160,718 @@ async def save_session():
         print("--- 登录成功后，返回此终端，按 Enter 键继续 ---")
         input() # 脚本会暂停在这里，等你登录
         
-        await context.storage_state(path="state.json")
-        print("登录状态已保存到 state.json。")
+        await context.storage_state(path=state_path)
+        print(f"登录状态已保存到 {state_path}。")
         await browser.close()
 
+
+class BrowserManager:
+    """
+    跨多轮搜索常驻的浏览器/上下文。
+    - 每轮搜索通过 new_page() 获得一个新页面，不再每轮冷启动 Chrome、重新加载 state.json
+    - BROWSER_CDP_URL 非空时连接到已经打开的 Chrome (需以 --remote-debugging-port 启动)，使用其中已登录的会话
+    - 浏览器崩溃/断开，或本次会话打开的页面数超过 BROWSER_PAGE_BUDGET 时，在下一轮开始前自动重启
+    - 只统计/关闭本脚本打开的页面 (new_page() 返回的页面及其弹出的标签页)，用户在 CDP 浏览器中手动打开的标签页不受影响
+    """
+
+    def __init__(self, cdp_url=None, page_budget=None, storage_state="state.json"):
+        self.cdp_url = cdp_url if cdp_url is not None else BROWSER_CDP_URL
+        self.storage_state = storage_state
+        self.page_budget = page_budget or BROWSER_PAGE_BUDGET
+        self._playwright = None
+        self.browser = None
+        self.context = None
+        self.resource_blocker = None
+        self.response_collector = None
+        self.pages_opened = 0
+        self._own_pages = []
+        self._disconnected = False
+
+    async def _launch(self):
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+
+        self._disconnected = False
+        self.pages_opened = 0
+        if self.cdp_url:
+            print(f"--- 连接到已运行的 Chrome: {self.cdp_url} ---")
+            self.browser = await self._playwright.chromium.connect_over_cdp(self.cdp_url)
+            self.context = self.browser.contexts[0] if self.browser.contexts else await self.browser.new_context()
+        else:
+            # headless=False 可以在调试时看到浏览器窗口
+            self.browser = await self._playwright.chromium.launch(headless=BROWSER_HEADLESS, channel=BROWSER_CHANNEL)
+            self.context = await self.browser.new_context(storage_state=self.storage_state)
+        self.browser.on("disconnected", self._on_disconnected)
+
+        self.resource_blocker = ResourceBlocker() if LEAN_MODE else None
+        if self.resource_blocker is not None:
+            await self.resource_blocker.attach(self.context)
+        self.response_collector = ResumeResponseCollector() if NETWORK_CAPTURE_ENABLED else None
+        if self.response_collector is not None:
+            self.response_collector.attach(self.context)
+
+    def _on_disconnected(self, _browser):
+        self._disconnected = True
+
+    def _on_page(self, page):
+        """本脚本打开的页面: 计入页面预算，其弹出的标签页 (点击简历打开的详情页) 同样计入。"""
+        self.pages_opened += 1
+        if self.cdp_url:
+            self._own_pages.append(page)
+        page.on("popup", self._on_page)
+
+    async def new_page(self):
+        """返回一个新页面；必要时先 (重新) 启动浏览器。"""
+        if self.browser is None:
+            await self._launch()
+        elif self._disconnected or not self.browser.is_connected():
+            print("--- 浏览器已断开，正在重新启动... ---")
+            await self._close_browser()
+            await self._launch()
+        elif self.pages_opened >= self.page_budget:
+            print(f"--- 本次浏览器会话已打开 {self.pages_opened} 个页面，重启以释放资源... ---")
+            await self._close_browser()
+            await self._launch()
+        page = await self.context.new_page()
+        self._on_page(page)
+        return page
+
+    async def _close_browser(self):
+        try:
+            if self.cdp_url:
+                # 外部 Chrome 不由我们关闭: 只关闭本脚本打开的页面，撤下挂在用户 context 上的拦截/监听，
+                # 再断开 CDP 连接 (connect_over_cdp 得到的 browser.close() 只断开连接，不会关闭 Chrome)
+                for page in self._own_pages:
+                    if not page.is_closed():
+                        await page.close()
+                self._own_pages = []
+                if self.context is not None and not self._disconnected:
+                    if self.resource_blocker is not None:
+                        await self.resource_blocker.detach(self.context)
+                    if self.response_collector is not None:
+                        self.response_collector.detach(self.context)
+            if self.browser is not None:
+                await self.browser.close()
+        except Exception as e:
+            print(f"--- 关闭浏览器时出错: {e} ---")
+        self.browser = None
+        self.context = None
+
+    async def close(self):
+        await self._close_browser()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
 # -------------------------------------------------------------------
-# 2. 火山引擎 AI 决策函数 (使用 requests)
+# 2. 火山引擎 AI 决策函数 (使用 requests / aiohttp)
 # -------------------------------------------------------------------
 
+# 简历压缩: 去掉页面按钮、提示等无关行，超出 token 预算时按板块优先级保留
+CV_BOILERPLATE_PATTERNS = [
+    r"^(举报|收藏|分享|打印|转发|下载简历|查看联系方式|获取联系方式|立即沟通|继续沟通|不合适|标记|更多)$",
+    r"温馨提示", r"猎聘(网)?(提醒|提示)", r"^©", r"^\d+\s*/\s*\d+$", r"(刚刚|今日|今天|本周|\d+天内)活跃",
+]
+CV_SECTION_PRIORITY = {  # 数字越小越优先保留；第一个板块标题之前的基本信息总是保留
+    "工作经历": 0, "工作经验": 0, "项目经历": 1, "项目经验": 1, "教育经历": 2, "教育背景": 2,
+    "求职意向": 3, "职业技能": 4, "专业技能": 4, "技能标签": 4, "语言能力": 5, "证书": 5,
+    "自我评价": 6, "附加信息": 7,
+}
+CV_BOILERPLATE_RE = re.compile("|".join(CV_BOILERPLATE_PATTERNS))
+
+
+def section_priority(line):
+    """板块标题行返回其优先级，否则返回 None。"""
+    title = line.rstrip(":：").strip()
+    if len(title) > 8:
+        return None
+    for name, priority in CV_SECTION_PRIORITY.items():
+        if title.startswith(name):
+            return priority
+    return None
+
+
+def compact_cv_text(cv_text, token_budget=None):
+    """
+    规范化简历文本: 合并空白、去掉空行/连续重复的行/页面按钮等无关行
+    (只合并相邻的重复行: 不同经历中相同的职位、公司名都要保留)；
+    超出 token_budget 时按 CV_SECTION_PRIORITY 保留重要板块 (保持原有顺序)，放不下的部分截断。
+    """
+    token_budget = token_budget or LLM_CV_TOKEN_BUDGET
+    sections = [[-1, []]]  # [优先级, 行]
+    previous = None
+    for raw_line in (cv_text or "").splitlines():
+        line = re.sub(r"\s+", " ", raw_line).strip()
+        if not line or line == previous or CV_BOILERPLATE_RE.search(line):
+            continue
+        previous = line
+        priority = section_priority(line)
+        if priority is not None:
+            sections.append([priority, []])
+        sections[-1][1].append(line)
+
+    if sum(estimate_tokens(line) for _, lines in sections for line in lines) <= token_budget:
+        return "\n".join(line for _, lines in sections for line in lines)
+
+    kept = {}
+    remaining = token_budget
+    for idx in sorted(range(len(sections)), key=lambda k: sections[k][0]):
+        lines = []
+        for line in sections[idx][1]:
+            cost = estimate_tokens(line)
+            if cost > remaining:
+                lines.append("…(以下省略)")
+                break
+            lines.append(line)
+            remaining -= cost
+        if lines and lines != ["…(以下省略)"]:
+            kept[idx] = lines
+        if remaining <= 0:
+            break
+    return "\n".join(line for idx in sorted(kept) for line in kept[idx])
+
+
+def build_screening_prefix(briefing, batch=False):
+    """
+    固定的提示词前缀 (system 消息): 只包含任务说明和提纲，同一提纲下对所有候选人逐字节相同，
+    便于服务端复用前缀缓存；候选人简历放在其后的 user 消息中。
+    """
+    if batch:
+        task = "逐一判断下列每位候选人的简历是否符合访谈提纲的核心要求。"
+        output = '只输出一行 JSON，不要输出其他内容: {"results": [{"id": 1, "verdict": "YES"}, {"id": 2, "verdict": "NO"}]}'
+    else:
+        task = "判断下面这份简历是否符合访谈提纲的核心要求。"
+        output = '只输出一行 JSON，不要输出其他内容: {"verdict": "YES"} 或 {"verdict": "NO"}'
+    return f"""你是一个专业的招聘/访谈助手。你的任务是{task}
+
+【访谈提纲】:
+{briefing}
+
+【输出要求】:
+{output}"""
+
+
+def build_volc_payload(cv_text, briefing):
+    """构造火山引擎 chat/completions 请求体 (同步与异步客户端共用)。"""
+    return {
+        "model": MODEL_ENDPOINT_ID,
+        "max_completion_tokens": LLM_MAX_COMPLETION_TOKENS,
+        "messages": [
+            {"role": "system", "content": build_screening_prefix(briefing)},
+            {"role": "user", "content": f"【候选人简历】:\n{compact_cv_text(cv_text)}"},
+        ],
+        "reasoning_effort": LLM_REASONING_EFFORT,
+    }
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数: 中文约 1 字 1 token，其他字符约 4 个 1 token。"""
+    text = text or ""
+    cjk = len(re.findall(r"[\u4e00-\u9fff]", text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def build_volc_batch_payload(cv_texts, briefing):
+    """批量模式请求体: 提纲只出现一次 (在固定前缀中)，多份简历按编号排列，要求返回 JSON。"""
+    candidates = "\n\n".join(
+        f"【候选人 {idx}】:\n{compact_cv_text(cv_text)}" for idx, cv_text in enumerate(cv_texts, start=1)
+    )
+    return {
+        "model": MODEL_ENDPOINT_ID,
+        "max_completion_tokens": LLM_MAX_COMPLETION_TOKENS * len(cv_texts),
+        "messages": [
+            {"role": "system", "content": build_screening_prefix(briefing, batch=True)},
+            {"role": "user", "content": candidates},
+        ],
+        "reasoning_effort": LLM_REASONING_EFFORT,
+    }
+
+
+def log_llm_usage(result, seconds):
+    """打印并累计一次调用的 token 用量 (prompt / 其中命中前缀缓存的部分 / completion)。"""
+    usage = result.get("usage") or {}
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    count_event("llm_prompt_tokens", prompt_tokens)
+    count_event("llm_cached_tokens", cached_tokens)
+    count_event("llm_completion_tokens", completion_tokens)
+    print(f"--- AI 用量: 输入 {prompt_tokens} tokens (缓存命中 {cached_tokens})，输出 {completion_tokens} tokens，用时 {seconds:.2f} 秒 ---")
+
+
+def parse_volc_batch_verdicts(result, count):
+    """
+    解析批量模式的 JSON 响应，返回长度为 count 的列表 (True/False/None)。
+    响应整体无法解析时返回 None。
+    """
+    if 'error' in result:
+        error = result['error']
+        print(f"火山引擎 API 返回错误: {error.get('message', error) if isinstance(error, dict) else error}")
+        return None
+
+    choices = result.get('choices') or [{}]
+    content = (choices[0].get('message') or {}).get('content') or ''
+    match = re.search(r"\{.*\}|\[.*\]", content, re.S)  # 兼容 ```json 代码块等包裹
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+
+    items = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return None
+
+    verdicts = [None] * count
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            idx = int(item.get("id")) - 1
+        except (TypeError, ValueError):
+            continue
+        answer = str(item.get("verdict", "")).strip().upper()
+        if 0 <= idx < count and answer in ("YES", "NO"):
+            verdicts[idx] = answer == "YES"
+
+    if all(v is None for v in verdicts):
+        return None
+    print(f"--- 火山引擎 AI 批量判断结果: {['YES' if v else 'NO' if v is False else '?' for v in verdicts]} ---")
+    return verdicts
+
+
+def parse_volc_verdict(result):
+    """
+    解析火山引擎返回的 JSON，返回 True/False。
+    API 报错或答案为空时返回 None (无法判断，不应写入缓存)。
+    """
+    if 'error' in result:
+        print(f"火山引擎 API 返回错误: {result['error']['message']}")
+        return None
+
+    answer = result.get('choices', [{}])[0].get('message', {}).get('content', '') or ''
+    answer = answer.strip().upper()
+
+    if not answer:
+        print("火山引擎 API 未返回有效答案。")
+        return None
+
+    print(f"--- 火山引擎 AI 判断结果: {answer} ---")
+    structured = re.search(r'"VERDICT"\s*:\s*"(YES|NO)"', answer)
+    if structured:
+        return structured.group(1) == "YES"
+    return "YES" in answer
+
+
 def is_match_volc(cv_text, briefing):
     """
     使用火山引擎REST API（通过 requests 库）判断简历是否匹配提纲。
     此方法绕过了 SDK 导入问题，直接调用 API 端点。
+    (同步版本，main() 中使用的是 VolcScreeningClient)
+    返回 True/False；限流、服务端错误、超时在指数退避重试后仍失败时返回 None (无法判断，不等于 NO)。
     """
     # Use the constant defined at the top of the file
     api_key = VOLC_SECRETKEY
     if not api_key:
         print("错误: 未找到 VOLC_SECRETKEY 常量。请确保已正确设置。")
-        return False
+        return None
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    payload = build_volc_payload(cv_text, briefing)
 
-    # <-- !!! [用户必须修改] !!! -->
-    # 替换为你在火山方舟平台上选择的模型的 Endpoint ID
-    # 例如："doubao-pro-32k", "doubao-pro-128k" 等
-    MODEL_ENDPOINT_ID = "doubao-seed-1-6-lite-251015" # 示例模型
-    API_URL = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+    for attempt_no in range(LLM_MAX_RETRIES + 1):
+        try:
+            started = time.perf_counter()
+            with metric_span("llm_request"):
+                response = requests.post(VOLC_API_URL, headers=headers, json=payload, timeout=LLM_REQUEST_TIMEOUT)
+            response.raise_for_status() # 如果请求失败 (例如 4xx, 5xx 错误), 则抛出异常
+            result = response.json()
+            log_llm_usage(result, time.perf_counter() - started)
+            return parse_volc_verdict(result)
+
+        except requests.exceptions.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and status != 429 and status < 500:
+                print(f"火山引擎 API 请求出错: {e}")
+                return None  # 其他 4xx (密钥、参数错误) 重试无用
+            if attempt_no == LLM_MAX_RETRIES:
+                print(f"火山引擎 API 请求出错，重试 {LLM_MAX_RETRIES} 次后仍失败: {e}")
+                return None
+            delay = backoff_delay(attempt_no, e.response.headers.get("Retry-After") if e.response is not None else None)
+            print(f"火山引擎 API 请求出错: {e}，{delay:.1f} 秒后重试 ({attempt_no + 1}/{LLM_MAX_RETRIES})")
+            time.sleep(delay)
+        except Exception as e:
+            print(f"处理火山引擎响应时出错: {e}")
+            return None
 
-    prompt = f"""
-    你是一个专业的招聘/访谈助手。你的任务是判断一份简历是否符合访谈提纲的要求。
 
-    【访谈提纲】:
-    {briefing}
+def normalize_text_for_key(text):
+    """合并空白字符，使排版差异不影响缓存命中。"""
+    return re.sub(r"\s+", " ", text or "").strip()
 
-    【候选人简历】:
-    {cv_text}
 
-    【你的任务】:
-    请仔细阅读提纲和简历，判断该候选人是否符合提纲中的核心要求。
-    
-    请只回答 "YES" 或 "NO"。
+def make_verdict_key(cv_text, briefing_text, model=None):
+    """(简历内容, 提纲, 模型, 提示词版本) 的规范化哈希，作为判断缓存的键。"""
+    h = hashlib.sha256()
+    for part in (normalize_text_for_key(cv_text), normalize_text_for_key(briefing_text), model or MODEL_ENDPOINT_ID,
+                 f"prompt-v{SCREENING_PROMPT_VERSION}"):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class VerdictCache:
+    """
+    持久化的 AI 判断缓存 (SQLite)。
+    同一份简历 + 同一提纲 + 同一模型 + 同一提示词版本，重复筛选时直接返回上次的结果，不再调用 API。
+    - ttl_days: 超过该天数的记录视为过期
+    - max_entries: 超过该条数时按最近使用时间淘汰
+    多个分片进程可同时写入 (WAL 模式 + 忙等待)。
     """
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    
-    payload = {
-        "model": MODEL_ENDPOINT_ID,
-        "max_completion_tokens": 65535,
-        "messages": [
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "reasoning_effort": "medium"
-    }
 
-    try:
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=30)
-        response.raise_for_status() # 如果请求失败 (例如 4xx, 5xx 错误), 则抛出异常
-        
-        result = response.json()
-        
-        if 'error' in result:
-            print(f"火山引擎 API 返回错误: {result['error']['message']}")
-            return False
+    def __init__(self, path=None, ttl_days=None, max_entries=None):
+        self.path = path or VERDICT_CACHE_PATH
+        self.ttl_seconds = (ttl_days if ttl_days is not None else VERDICT_CACHE_TTL_DAYS) * 86400
+        self.max_entries = max_entries or VERDICT_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " key TEXT PRIMARY KEY, verdict INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_verdicts_last_used ON verdicts(last_used)")
+        self._conn.commit()
+        self.evict()
 
-        answer = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-        answer = answer.strip().upper()
+    def get(self, key):
+        """返回缓存的 True/False；未命中或已过期返回 None。"""
+        now = time.time()
+        row = self._conn.execute("SELECT verdict, created_at FROM verdicts WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self._conn.execute("UPDATE verdicts SET last_used = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        self.hits += 1
+        return bool(row[0])
 
-        if not answer:
-            print("火山引擎 API 未返回有效答案。")
-            return False
-        
-        print(f"--- 火山引擎 AI 判断结果: {answer} ---")
-        return "YES" in answer
+    def put(self, key, verdict):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO verdicts (key, verdict, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, int(bool(verdict)), now, now),
+        )
+        self._conn.commit()
+
+    def evict(self):
+        """删除过期记录，并把总条数控制在 max_entries 以内。"""
+        self._conn.execute("DELETE FROM verdicts WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM verdicts WHERE key IN ("
+            " SELECT key FROM verdicts ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+
+    def stats_text(self):
+        return f"缓存 命中/未命中: {self.hits}/{self.misses}"
+
+    def close(self):
+        self.evict()
+        self._conn.close()
+
+
+class VolcScreeningClient:
+    """
+    异步火山引擎筛选客户端。
+    - 每轮运行只创建一个 aiohttp 会话，连接池 + keep-alive 复用 TLS 连接
+    - 请求经过 RateChannel: 令牌桶限速 + 按错误和延迟自动调整的并发上限 (AIMD)
+    - 每个请求单独的超时；429 / 5xx / 超时按带抖动的指数退避重试
+    - is_match() 返回 True/False，重试后仍失败时返回 None (无法判断)
+    用法:
+        async with VolcScreeningClient() as client:
+            ok = await client.is_match(cv_text, briefing)
+            task = client.submit(cv_text, briefing)  # 返回可 await 的 Task，浏览器操作可同时继续
+    """
+
+    def __init__(self, api_key=None, api_url=None, max_concurrency=None, timeout=None, cache=None, limiter=None):
+        self.cache = cache  # 可选的 VerdictCache
+        self.api_key = api_key if api_key is not None else VOLC_SECRETKEY
+        self.api_url = api_url or VOLC_API_URL
+        self.max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
+        self.timeout = timeout or LLM_REQUEST_TIMEOUT
+        self.limiter = limiter or RateChannel.for_api(self.max_concurrency)
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_key}"
+            },
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def is_match(self, cv_text, briefing):
+        """异步版 is_match_volc: 返回 True/False，无法判断时返回 None。先查缓存，命中则不发请求。"""
+        key = None
+        if self.cache is not None:
+            key = make_verdict_key(cv_text, briefing)
+            cached = self.cache.get(key)
+            if cached is not None:
+                print(f"--- (缓存命中) AI 判断结果: {'YES' if cached else 'NO'} ---")
+                return cached
+
+        verdict = await self._request_verdict(cv_text, briefing)
+        if verdict is not None and key is not None:
+            self.cache.put(key, verdict)
+        return verdict
+
+    async def _request_verdict(self, cv_text, briefing):
+        """发送一次请求，返回 True/False，无法判断 (网络错误、API 报错) 时返回 None。"""
+        result = await self._post(build_volc_payload(cv_text, briefing))
+        if result is None:
+            return None
+        try:
+            return parse_volc_verdict(result)
+        except Exception as e:
+            print(f"处理火山引擎响应时出错: {e}")
+            return None
+
+    async def request_batch(self, cv_texts, briefing):
+        """
+        一次请求判断多份简历。
+        返回与 cv_texts 等长的列表 (True/False，缺失的候选人为 None)；
+        请求失败或整个响应无法解析时返回 None。
+        """
+        result = await self._post(build_volc_batch_payload(cv_texts, briefing))
+        if result is None:
+            return None
+        try:
+            return parse_volc_batch_verdicts(result, len(cv_texts))
+        except Exception as e:
+            print(f"处理火山引擎批量响应时出错: {e}")
+            return None
+
+    async def _post(self, payload):
+        """
+        POST 到 chat/completions，返回解析后的 JSON。
+        429 / 5xx / 超时 / 连接错误按指数退避重试 (每次失败都会让 limiter 降低并发和速率)；
+        其他错误或重试耗尽时打印并返回 None。
+        """
+        if not self.api_key:
+            print("错误: 未找到 VOLC_SECRETKEY 常量。请确保已正确设置。")
+            return None
+
+        for attempt_no in range(LLM_MAX_RETRIES + 1):
+            error = None
+            retry_after = None
+            async with self.limiter.slot() as attempt:
+                count_event("llm_requests")
+                started = time.perf_counter()
+                try:
+                    with metric_span("llm_request"):
+                        async with self._session.post(
+                            self.api_url,
+                            json=payload,
+                            timeout=aiohttp.ClientTimeout(total=self.timeout),
+                        ) as response:
+                            if response.status == 429 or response.status >= 500:
+                                error = f"HTTP {response.status}"
+                                retry_after = response.headers.get("Retry-After")
+                            else:
+                                response.raise_for_status()
+                                result = await response.json(content_type=None)
+                except aiohttp.ClientResponseError as e:
+                    count_event("llm_errors")
+                    print(f"火山引擎 API 请求出错: {e}")  # 其他 4xx (密钥、参数错误) 重试无用
+                    return None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = str(e) or type(e).__name__
+                except Exception as e:
+                    print(f"处理火山引擎响应时出错: {e}")
+                    return None
+                if error is None:
+                    log_llm_usage(result, time.perf_counter() - started)
+                    return result
+                attempt.fail()
+
+            count_event("llm_errors")
+            if attempt_no == LLM_MAX_RETRIES:
+                print(f"火山引擎 API 请求出错，重试 {LLM_MAX_RETRIES} 次后仍失败: {error}")
+                return None
+            delay = backoff_delay(attempt_no, retry_after)
+            count_event("llm_retries")
+            print(f"火山引擎 API 请求出错: {error}，{delay:.1f} 秒后重试 ({attempt_no + 1}/{LLM_MAX_RETRIES})")
+            await asyncio.sleep(delay)
+
+    def submit(self, cv_text, briefing):
+        """立即返回一个 Task，稍后 await 获取判断结果。"""
+        return asyncio.ensure_future(self.is_match(cv_text, briefing))
+
+
+class BatchScreener:
+    """
+    批量筛选模式: 把排队中的多份简历打包进一次请求 (提纲只发送一次)。
+    接口与 VolcScreeningClient.is_match 相同，worker 无需关心是否批量。
+    - 凑满 max_batch_size 份、或再加一份会超过 token_budget、或等待超过 linger 秒时发送
+    - 批量响应无法解析时，退回逐份调用
+    """
+
+    def __init__(self, client, max_batch_size=None, token_budget=None, linger=None):
+        self.client = client
+        self.max_batch_size = max_batch_size or LLM_BATCH_SIZE
+        self.token_budget = token_budget or LLM_BATCH_TOKEN_BUDGET
+        self.linger = linger if linger is not None else LLM_BATCH_LINGER_SECONDS
+        self._pending = {}  # briefing -> [(cv_text, cache_key, future), ...]
+        self._timers = {}
+
+    async def is_match(self, cv_text, briefing):
+        cache = self.client.cache
+        key = None
+        if cache is not None:
+            key = make_verdict_key(cv_text, briefing)
+            cached = cache.get(key)
+            if cached is not None:
+                print(f"--- (缓存命中) AI 判断结果: {'YES' if cached else 'NO'} ---")
+                return cached
+
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.get(briefing, [])
+        # 每份简历发送前会压缩到 LLM_CV_TOKEN_BUDGET 以内
+        batch_tokens = estimate_tokens(briefing) + sum(min(estimate_tokens(cv), LLM_CV_TOKEN_BUDGET) for cv, _, _ in batch)
+        if batch and batch_tokens + min(estimate_tokens(cv_text), LLM_CV_TOKEN_BUDGET) > self.token_budget:
+            self._flush(briefing)
+
+        batch = self._pending.setdefault(briefing, [])
+        batch.append((cv_text, key, future))
+        if len(batch) >= self.max_batch_size:
+            self._flush(briefing)
+        elif len(batch) == 1:
+            self._timers[briefing] = asyncio.get_running_loop().call_later(self.linger, self._flush, briefing)
+
+        return await future
+
+    def _flush(self, briefing):
+        timer = self._timers.pop(briefing, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(briefing, None)
+        if batch:
+            asyncio.ensure_future(self._run_batch(briefing, batch))
+
+    async def _run_batch(self, briefing, batch):
+        verdicts = [None] * len(batch)
+        try:
+            if len(batch) > 1:
+                print(f"--- (批量模式) 一次请求判断 {len(batch)} 份简历 ---")
+                try:
+                    verdicts = await self.client.request_batch([cv for cv, _, _ in batch], briefing) or verdicts
+                except Exception as e:
+                    print(f"--- (批量模式) 批量请求出错: {e} ---")
+                if all(verdict is None for verdict in verdicts):
+                    print("--- (批量模式) 批量响应无法解析，改为逐份判断 ---")
+
+            # 批量失败或模型漏掉的候选人: 并发地逐份请求
+            missing = [idx for idx, verdict in enumerate(verdicts) if verdict is None]
+            retried = await asyncio.gather(*(self.client._request_verdict(batch[idx][0], briefing) for idx in missing),
+                                           return_exceptions=True)
+            for idx, verdict in zip(missing, retried):
+                verdicts[idx] = verdict if isinstance(verdict, bool) else None
+
+            for (cv_text, key, future), verdict in zip(batch, verdicts):
+                if verdict is not None and key is not None:
+                    self.client.cache.put(key, verdict)
+        finally:
+            # 无论出现什么异常都要唤醒等待者，否则调用方会永远挂起
+            for (cv_text, key, future), verdict in zip(batch, verdicts):
+                if not future.done():
+                    future.set_result(verdict)  # None = 无法判断
+
+# --- 本地规则预筛 (在调用付费 AI 之前剔除明显不符的简历) ---
+
+def parse_exclusion_terms(briefing_text):
+    """
+    从提纲中提取排除词，例如一行 "排除: 外包, 实习" 或 "不考虑：猎头、销售"。
+    """
+    terms = []
+    for match in re.finditer(r"(?:排除|不考虑|不要)[:：]\s*(.+)", briefing_text or ""):
+        terms.extend(t for t in re.split(r"[,，、;；/\s]+", match.group(1)) if t)
+    return terms
+
+
+def compile_terms(terms):
+    """把一组关键词编译为一个忽略大小写的正则 (空列表返回 None，表示该阶段跳过)。"""
+    terms = sorted({t.strip() for t in terms if t and t.strip()}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+
+
+class PreScreener:
+    """
+    本地预筛级联，按顺序检查:
+      1. company  - 简历中必须出现目标公司或其别名 (COMPANY_ALIASES)
+      2. position - 简历中必须出现职位关键词 (PRESCREEN_CHECK_POSITION 为 True 时)
+      3. exclude  - 简历中不能出现排除词 (提纲中的 "排除: ..." + PRESCREEN_EXCLUDE_TERMS)
+    只有全部通过的简历才会发给 AI。
+    """
+
+    STAGES = ("company", "position", "exclude")
+
+    def __init__(self, target_company, target_position, briefing_text):
+        company_terms = [target_company] + COMPANY_ALIASES.get(target_company, [])
+        position_terms = [target_position] + re.split(r"[\s/、,，]+", target_position or "")
+        position_terms += POSITION_KEYWORDS.get(target_position, [])
+        exclude_terms = parse_exclusion_terms(briefing_text) + PRESCREEN_EXCLUDE_TERMS
+
+        self.matchers = {
+            "company": compile_terms(company_terms),
+            "position": compile_terms(position_terms) if PRESCREEN_CHECK_POSITION else None,
+            "exclude": compile_terms(exclude_terms),
+        }
+        self.checked = 0
+        self.rejected = {stage: 0 for stage in self.STAGES}
+
+    def check(self, cv_text):
+        """返回 (是否通过, 未通过的阶段名或 None)。"""
+        self.checked += 1
+        cv_text = cv_text or ""
+        for stage in self.STAGES:
+            matcher = self.matchers[stage]
+            if matcher is None:
+                continue
+            found = matcher.search(cv_text)
+            if (stage == "exclude" and found) or (stage != "exclude" and not found):
+                self.rejected[stage] += 1
+                return False, stage
+        return True, None
+
+    def stats_text(self):
+        saved = sum(self.rejected.values())
+        parts = []
+        for stage in self.STAGES:
+            rate = self.rejected[stage] / self.checked * 100 if self.checked else 0
+            parts.append(f"{stage} {self.rejected[stage]} ({rate:.0f}%)")
+        return f"预筛淘汰: {', '.join(parts)}，节省 AI 调用 {saved} 次"
 
-    except requests.exceptions.RequestException as e:
-        print(f"火山引擎 API 请求出错: {e}")
-        return False
-    except Exception as e:
-        print(f"处理火山引擎响应时出错: {e}")
-        return False
 
 # --- [!!! 新增: 日期解析与比较辅助函数 !!!] ---
 
@@ -216,10 +962,237 @@ def format_work_time(time_str):
     except Exception:
         return time_str # 出错时返回原始字符串
 
+# 工作经历中的一段在职时间: "2019.03 - 2022.05"、"2019/3-至今"、"2019年3月 ~ 2022年5月" 等
+WORK_PERIOD_PATTERN = re.compile(
+    r"(\d{4})\s*[./\-年]\s*(\d{1,2})\s*月?\s*[-–—~至到]+\s*(?:(\d{4})\s*[./\-年]\s*(\d{1,2})\s*月?|(至今|今|现在))"
+)
+
+
+def parse_work_history(text):
+    """
+    解析文本中的全部在职时间段，返回 [(在职时间, 上下文), ...] (按出现顺序)。
+    在职时间为 'YY/M-YY/M' 或 'YY/M-Present'；上下文为该时间段所在行去掉时间后的文字，通常包含公司和职位
+    (该行只有时间时，取上下相邻且不含时间段的行)。
+    """
+    history = []
+    lines = [line.strip() for line in (text or "").splitlines()]
+    for idx, line in enumerate(lines):
+        for match in WORK_PERIOD_PATTERN.finditer(line):
+            start = f"{match.group(1)[-2:]}/{int(match.group(2))}"
+            end = "Present" if match.group(5) else f"{match.group(3)[-2:]}/{int(match.group(4))}"
+            context = (line[:match.start()] + line[match.end():]).strip(" ,，|·()（）")
+            if len(context) < 2:
+                neighbours = lines[max(0, idx - 1):idx] + lines[idx + 1:idx + 2]
+                context = " ".join(n for n in neighbours if not WORK_PERIOD_PATTERN.search(n))
+            history.append((f"{start}-{end}", context))
+    return history
+
+
+def select_departure_period(history, company_matcher):
+    """在工作经历中找出目标公司的那一段 (有多段时取离职最晚的)，找不到时返回 None。"""
+    if company_matcher is None:
+        return None
+    matched = [period for period, context in history if company_matcher.search(context)]
+    if not matched:
+        return None
+    return max(matched, key=lambda period: convert_date_to_value(period.split("-")[1]))
+
+
+class CardScreener(PreScreener):
+    """
+    搜索结果卡片级预筛: 在打开简历页之前，用卡片上的公司/职位/在职时间做判断，只打开通过的卡片。
+      1. date     - 卡片上目标公司那段经历 (没有则取第一段，即最近一段) 的离职时间早于要求
+      2. company  - 卡片上完全没有出现目标公司 (CARD_CHECK_COMPANY 为 True 时)
+      3. position / exclude - 同 PreScreener
+    卡片上没有在职时间时不做日期判断，交给简历页处理。
+    """
+
+    STAGES = ("date",) + PreScreener.STAGES
+
+    def __init__(self, target_company, target_position, briefing_text, min_departure_str):
+        super().__init__(target_company, target_position, briefing_text)
+        self.min_departure = min_departure_str
+        self.company_matcher = self.matchers["company"]
+        self.matchers["date"] = None  # 日期单独判断
+        if not CARD_CHECK_COMPANY:
+            self.matchers["company"] = None
+        self.rejected = {stage: 0 for stage in self.STAGES}
+
+    def check(self, card_text):
+        """返回 (是否通过, 未通过的阶段名或 None)。"""
+        history = parse_work_history(card_text)
+        period = select_departure_period(history, self.company_matcher) or (history[0][0] if history else None)
+        if period and not is_departure_date_ok(period, self.min_departure):
+            self.checked += 1
+            self.rejected["date"] += 1
+            return False, "date"
+        return super().check(card_text)
+
+    def stats_text(self):
+        skipped = sum(self.rejected.values())
+        detail = ", ".join(f"{stage} {count}" for stage, count in self.rejected.items() if count)
+        return f"卡片预筛: 免开 {skipped}/{self.checked} 个简历页" + (f" ({detail})" if detail else "")
+
+
+def progress_extras():
+    """附加在进度行后面的统计信息 (缓存命中、预筛淘汰等)。"""
+    extras = ""
+    if card_screener is not None and card_screener.checked:
+        extras += f" | {card_screener.stats_text()}"
+    if verdict_cache is not None:
+        extras += f" | {verdict_cache.stats_text()}"
+    if pre_screener is not None:
+        extras += f" | {pre_screener.stats_text()}"
+    if seen_index is not None and seen_index.skipped:
+        extras += f" | 已处理过跳过: {seen_index.skipped}"
+    if contact_ocr is not None and (contact_ocr.decoded or contact_ocr.flagged):
+        extras += f" | {contact_ocr.stats_text()}"
+    return extras
+
+
+class ContactJournal:
+    """
+    追加写入的候选人流水文件 (JSONL，一行一位候选人)。
+    每找到一位合格候选人立即写入并 fsync，保存成本与已保存的总人数无关；
+    .xlsx 只在需要时 (结束时或手动) 由流水文件生成。
+    """
+
+    def __init__(self, path, reset=False):
+        self.path = path
+        self._file = open(path, "w" if reset else "a", encoding="utf-8")
+
+    def append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def read_all(self):
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass  # 崩溃时可能留下半行，忽略
+        return records
+
+    def close(self):
+        self._file.close()
+
+
+class CVStore:
+    """
+    按内容哈希寻址的简历全文存储: 每份简历 zlib 压缩后写入 <目录>/<哈希前 2 位>/<哈希>.z，
+    内容相同的简历只存一份。写入先落临时文件再改名，多个分片进程可共用同一目录。
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or CV_STORE_DIR
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + ".z")
+
+    def put(self, text):
+        """保存简历全文，返回其哈希。"""
+        data = (text or "").encode("utf-8")
+        digest = hashlib.sha1(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        """读取简历全文；哈希为空或文件缺失时返回空字符串。"""
+        if not digest:
+            return ""
+        try:
+            with open(self._path(digest), "rb") as f:
+                return zlib.decompress(f.read()).decode("utf-8")
+        except (OSError, zlib.error):
+            return ""
+
+
+class CandidateRecord:
+    """
+    内存中的合格候选人: 只保存导出用的短字段，简历全文以哈希 (cv_ref) 引用 CVStore，
+    因此 saved_contacts 占用的内存与简历长度无关。
+    """
+
+    __slots__ = ("name", "title", "company", "work_time", "contact", "url", "contact_image", "review", "cv_ref")
+
+    # (Excel 列名, 属性名)，导出时 Profile 列 (简历全文) 附在最后
+    COLUMNS = (("姓名", "name"), ("职位", "title"), ("在职公司", "company"), ("在职时间", "work_time"),
+               ("云号码", "contact"), ("简历链接", "url"), ("号码截图", "contact_image"), ("待人工核对", "review"))
+    REF_KEY = "简历哈希"
+
+    def __init__(self, name="", title="", company="", work_time="", contact="", url="", contact_image="",
+                 review="", cv_ref=None):
+        self.name = name
+        self.title = title
+        self.company = company
+        self.work_time = work_time
+        self.contact = contact
+        self.url = url
+        self.contact_image = contact_image  # 联系方式为图片时的截图路径
+        self.review = review  # 截图号码未能可靠识别时的说明 (空 = 无需核对)
+        self.cv_ref = cv_ref
+
+    def to_journal(self):
+        data = {column: getattr(self, attr) for column, attr in self.COLUMNS}
+        data[self.REF_KEY] = self.cv_ref
+        return data
+
+    @classmethod
+    def from_journal(cls, data, store=None):
+        """从流水文件的一行恢复。旧格式 (直接包含 Profile 全文) 会把全文转存到 store。"""
+        cv_ref = data.get(cls.REF_KEY)
+        if cv_ref is None and data.get("Profile") and store is not None:
+            cv_ref = store.put(data["Profile"])
+        return cls(cv_ref=cv_ref, **{attr: data.get(column) or "" for column, attr in cls.COLUMNS})
+
+    def to_row(self, store=None):
+        """导出 Excel 的一行，此时才从 store 读取简历全文。"""
+        row = {column: getattr(self, attr) for column, attr in self.COLUMNS}
+        row["Profile"] = store.get(self.cv_ref) if store is not None else ""
+        return row
+
+
+def export_contacts(records, filename, store=None):
+    """把 CandidateRecord 列表导出为 Excel，返回条数。"""
+    store = store or cv_store or CVStore()
+    df = pd.DataFrame([record.to_row(store) for record in records],
+                      columns=[column for column, _ in CandidateRecord.COLUMNS] + ["Profile"])
+    df.to_excel(filename, index=False, engine='openpyxl')
+    return len(df)
+
+
+def journal_path_for(filename):
+    """xlsx 对应的流水文件名，例如 a_b_contacts.xlsx -> a_b_contacts.journal.jsonl"""
+    return os.path.splitext(filename)[0] + ".journal.jsonl"
+
+
+def record_contact(record):
+    """登记一位合格候选人 (CandidateRecord): 加入 saved_contacts、合格计数 +1、追加到流水文件。"""
+    global qualified_resumes_count
+    with contacts_lock:
+        saved_contacts.append(record)
+        qualified_resumes_count += 1 # <-- 合格计数器+1
+        if contact_journal is not None:
+            contact_journal.append(record.to_journal())
+
+
 # --- [!!! 修改点 2: 新增线程安全的保存函数 !!!] ---
 def save_data_to_excel():
     """
-    线程安全地将全局 saved_contacts 保存到全局 output_filename。
+    线程安全地将已保存的候选人写入全局 output_filename。
+    有流水文件时从流水文件生成 (包含所有已追加的记录)，否则使用内存中的 saved_contacts。
     """
     # --- [!!! 修改: 引用全局计数器 !!!] ---
     global saved_contacts, output_filename, contacts_lock, qualified_resumes_count, processed_resumes_count
@@ -238,73 +1211,1867 @@ def save_data_to_excel():
             print(f"--- (保存请求) 当前进度: {n}/{m} (合格/已看) ---")
             return
         
-        # 创建数据的副本以尽快释放锁
-        df = pd.DataFrame(list(saved_contacts)) # 使用 list() 创建副本
+        # 创建数据的副本以尽快释放锁 (记录只含短字段，复制成本很低)
+        journal = contact_journal
+        records = None if journal is not None else list(saved_contacts) # 使用 list() 创建副本
         n = qualified_resumes_count # <-- 获取当前进度
         m = processed_resumes_count # <-- 获取当前进度
 
     # 在锁之外执行慢速的 I/O 操作
     try:
-        df.to_excel(output_filename, index=False, engine='openpyxl')
-        print(f"--- (保存请求) {len(df)} 条数据已成功保存到: {output_filename} ---")
-        print(f"--- (保存请求) 当前进度: {n}/{m} (合格/已看) ---") # <-- 打印进度
+        with metric_span("save"):
+            if records is None:
+                records = [CandidateRecord.from_journal(row, cv_store) for row in journal.read_all()]
+            count = export_contacts(records, output_filename)
+        print(f"--- (保存请求) {count} 条数据已成功保存到: {output_filename} ---")
+        print(f"--- (保存请求) 当前进度: {n}/{m} (合格/已看){progress_extras()} ---") # <-- 打印进度
     except Exception as e:
         print(f"--- (保存请求) 保存到 Excel 时出错: {e} ---")
 # --- [!!! 修改结束 !!!] ---
 
 
-# -------------------------------------------------------------------
-# 3. 主自动化流程
-# -------------------------------------------------------------------
-async def main():
-    
-    # --- [!!! 修改点 3: 使用全局变量 !!!] ---
-    global saved_contacts, output_filename, contacts_lock, qualified_resumes_count, processed_resumes_count
-    
-    # --- 1. 定义你的每日需求 (已修改为动态输入) ---
-    print("\n--- 1. 定义你的每日需求 ---")
-    
-    # 清空上一轮的数据
-    with contacts_lock:
-        saved_contacts.clear()
-        qualified_resumes_count = 0 # <-- 重置计数器 n
-        processed_resumes_count = 0 # <-- 重置计数器 m
-        
-    target_company = input("请输入目标公司 (例如: 腾讯): ").strip()
-    target_position = input("请输入目标职位 (例如: 产品经理): ").strip()
-    # --- [!!! 修改结束 !!!] ---
+def content_fingerprint(cv_text):
+    """简历内容指纹: 规范化文本的哈希 (链接或 ID 变化时仍能识别同一份简历)。"""
+    return "fp:" + hashlib.sha1(normalize_text_for_key(cv_text).encode("utf-8")).hexdigest()
 
 
-    # 建议一个 briefing
-    default_briefing = f"""
-访谈提纲核心要求：
-1. 必须有在 {target_company} 的工作经历。
-2. 职位与 {target_position} 相关。
-"""
-    print("\n--- 建议的访谈提纲 ---")
-    print(default_briefing)
-    print("------------------------")
-    
-    # 让用户选择
-    use_default = input("是否使用上述建议提纲? (Y/n): ").strip().lower()
-    
-    if use_default == 'n':
-        print("请输入你的自定义访谈提纲 (在最后一行输入 'END' 并按 Enter 结束):")
-        lines = []
-        while True:
-            line = input()
-            if line.strip().upper() == "END":
-                break
-            lines.append(line)
-        briefing_text = "\n".join(lines)
-    else:
-        briefing_text = default_briefing
-        
-    # --- [!!! 修改点 4: 设置全局 output_filename !!!] ---
-    # 获取文件名
-    global output_filename # 确保修改的是全局变量
-    default_filename = f"{target_company}_{target_position}_contacts.xlsx"
-    user_filename = input(f"请输入输出文件名 (默认: {default_filename}): ").strip()
+def seen_scope_for(job):
+    """搜索条件 (公司、职位、提纲、最早离职) 的短哈希，作为 SeenIndex 的查询范围。"""
+    parts = [job["company"], job["position"], normalize_text_for_key(job["briefing"]), job["min_departure"]]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+class SeenIndex:
+    """
+    跨运行的已处理候选人索引 (SQLite)。
+    同一候选人以多个键登记: 结果卡片标识 (简历 ID / 链接)、简历链接、内容指纹。
+    启动时把全部键载入内存字典，数万条记录的查询也是 O(1)，写入时同步落盘。
+    跳过策略:
+      - 同一搜索条件 (scope，见 seen_scope_for()) 下 SEEN_SKIP_DAYS 天内处理过的 (0 表示不按时间跳过)；
+        日期、预筛、AI 淘汰都取决于搜索条件和提纲，换一组条件时不跳过
+      - SEEN_SKIP_PURCHASED 为 True 时，已获取过联系方式的候选人在任何搜索中都跳过，避免重复付费
+    多个分片进程可同时写入 (WAL 模式 + 忙等待)。
+    """
+
+    def __init__(self, path=None, scope=""):
+        self.path = path or SEEN_INDEX_PATH
+        self.scope = scope
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " key TEXT PRIMARY KEY, last_seen REAL NOT NULL,"
+            " outcome TEXT, purchased INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.commit()
+        self._entries = {
+            key: (last_seen, bool(purchased))
+            for key, last_seen, purchased in self._conn.execute("SELECT key, last_seen, purchased FROM seen")
+        }
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _scoped(self, key):
+        """按搜索条件区分的键 (不带前缀的键只用于记录是否已获取联系方式)。"""
+        return f"q:{self.scope}|{key}"
+
+    def should_skip(self, *keys):
+        """任一键命中跳过策略时返回原因文字，否则返回 None。"""
+        cutoff = time.time() - SEEN_SKIP_DAYS * 86400
+        for key in keys:
+            if not key:
+                continue
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] and SEEN_SKIP_PURCHASED:
+                self.skipped += 1
+                return "已获取过联系方式"
+            entry = self._entries.get(self._scoped(key))
+            if entry is not None and SEEN_SKIP_DAYS and entry[0] >= cutoff:
+                self.skipped += 1
+                return f"在最近 {SEEN_SKIP_DAYS} 天内以相同条件处理过"
+        return None
+
+    def _put(self, key, when, outcome, purchased):
+        self._entries[key] = (when, purchased)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO seen (key, last_seen, outcome, purchased) VALUES (?, ?, ?, ?)",
+            (key, when, outcome, int(purchased)),
+        )
+
+    def mark(self, keys, outcome):
+        """
+        登记一次处理结果；出错的不登记，以便下次重试 (因已处理而跳过的也不刷新记录)。
+        卡片预筛淘汰的只与本次搜索条件有关，也不登记。
+        处理结果登记在本次搜索条件下；获取到联系方式的另外登记为全局 "已购买"。
+        """
+        if outcome not in DECIDED_OUTCOMES or outcome in ("seen-skipped", "card-rejected"):
+            return
+        now = time.time()
+        for key in keys:
+            if not key:
+                continue
+            self._put(self._scoped(key), now, outcome, False)
+            if outcome == "qualified":
+                self._put(key, now, outcome, True)
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+CJK_CHAR_PATTERN = re.compile(r"([\u3400-\u9fff\uf900-\ufaff])")
+
+
+def segment_for_search(text):
+    """全文索引用的文本: 每个汉字前后加空格 (unicode61 分词器不切分中文，逐字成词后用短语查询即可匹配任意子串)。"""
+    return CJK_CHAR_PATTERN.sub(r" \1 ", text or "")
+
+
+def build_match_query(terms):
+    """把一组关键词转换为 FTS5 查询: 任一关键词出现即命中 (中文按相邻字短语匹配，英文按前缀匹配)。"""
+    phrases = []
+    for term in terms:
+        tokens = segment_for_search(term).split()
+        if not tokens:
+            continue
+        phrase = '"' + " ".join(tokens).replace('"', '""') + '"'
+        if not CJK_CHAR_PATTERN.search(tokens[-1]):
+            phrase += "*"
+        phrases.append(phrase)
+    return " OR ".join(phrases) or None
+
+
+class CandidateWarehouse:
+    """
+    本地候选人库 (SQLite + FTS5 全文索引)。每份抓取到的简历 (字段 + 全文) 都按内容指纹入库，
+    同一份简历再次出现时只刷新字段和 last_seen；获取到联系方式后补记号码。
+    新提纲到来时可用 rescreen_warehouse() 离线重筛，不需要再打开浏览器。
+    多个分片进程可同时写入 (WAL 模式 + 忙等待)。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or WAREHOUSE_PATH
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS candidates ("
+            " id INTEGER PRIMARY KEY, fingerprint TEXT UNIQUE NOT NULL, url TEXT,"
+            " name TEXT, title TEXT, company TEXT, work_time TEXT,"
+            " contact TEXT, contact_image TEXT, cv_text TEXT NOT NULL, source TEXT,"
+            " first_seen REAL NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_candidates_url ON candidates(url)")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS candidate_search USING fts5("
+            " name, title, company, body, tokenize='unicode61')"
+        )
+        self._conn.commit()
+        self.stored = 0
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+    def upsert(self, cv_text, url=None, name="", title="", company="", work_time="", contact="", contact_image="",
+               source=""):
+        """登记一份简历，返回其内容指纹。已有的联系方式不会被空值覆盖。"""
+        fingerprint = content_fingerprint(cv_text)
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO candidates (fingerprint, url, name, title, company, work_time, contact, contact_image,"
+            " cv_text, source, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(fingerprint) DO UPDATE SET"
+            " url = COALESCE(NULLIF(excluded.url, ''), url),"
+            " name = COALESCE(NULLIF(excluded.name, ''), name),"
+            " title = COALESCE(NULLIF(excluded.title, ''), title),"
+            " company = COALESCE(NULLIF(excluded.company, ''), company),"
+            " work_time = COALESCE(NULLIF(excluded.work_time, ''), work_time),"
+            " contact = COALESCE(NULLIF(excluded.contact, ''), contact),"
+            " contact_image = COALESCE(NULLIF(excluded.contact_image, ''), contact_image),"
+            " cv_text = excluded.cv_text, source = excluded.source, last_seen = excluded.last_seen",
+            (fingerprint, url or "", name or "", title or "", company or "", work_time or "", contact or "",
+             contact_image or "", cv_text, source or "", now, now),
+        )
+        row_id, name, title, company = self._conn.execute(
+            "SELECT id, name, title, company FROM candidates WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        self._conn.execute("DELETE FROM candidate_search WHERE rowid = ?", (row_id,))
+        self._conn.execute(
+            "INSERT INTO candidate_search (rowid, name, title, company, body) VALUES (?, ?, ?, ?, ?)",
+            (row_id, segment_for_search(name), segment_for_search(title), segment_for_search(company),
+             segment_for_search(cv_text)),
+        )
+        self._conn.commit()
+        self.stored += 1
+        return fingerprint
+
+    def set_contact(self, fingerprint, contact, contact_image="", name=""):
+        """补记已获取的联系方式 (以及整理后的姓名)。"""
+        self._conn.execute(
+            "UPDATE candidates SET contact = ?, contact_image = COALESCE(NULLIF(?, ''), contact_image),"
+            " name = COALESCE(NULLIF(?, ''), name) WHERE fingerprint = ?",
+            (contact or "", contact_image or "", name or "", fingerprint),
+        )
+        self._conn.commit()
+
+    def search(self, terms, limit=None):
+        """
+        全文检索: 简历中出现任一关键词的候选人，逐行返回字典 (按相关度排序)。
+        terms 为空时返回全部候选人。
+        """
+        columns = "c.id, c.fingerprint, c.url, c.name, c.title, c.company, c.work_time, c.contact, c.contact_image, c.cv_text"
+        query = build_match_query(terms or [])
+        if query is None:
+            sql = f"SELECT {columns} FROM candidates c ORDER BY c.last_seen DESC"
+            params = ()
+        else:
+            sql = (f"SELECT {columns} FROM candidate_search s JOIN candidates c ON c.id = s.rowid"
+                   " WHERE candidate_search MATCH ? ORDER BY s.rank")
+            params = (query,)
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        keys = [column.split(".")[1] for column in columns.split(", ")]
+        for row in self._conn.execute(sql, params):
+            yield dict(zip(keys, row))
+
+    def import_excel(self, filename, source=None):
+        """把以前导出的 Excel (save_data_to_excel() 的列格式，含 Profile 全文) 导入库中，返回导入条数。"""
+        df = pd.read_excel(filename, dtype=str).fillna("")
+        count = 0
+        for row in df.to_dict("records"):
+            if not row.get("Profile"):
+                continue
+            fields = {attr: row.get(column, "") for column, attr in CandidateRecord.COLUMNS if attr != "review"}
+            self.upsert(row["Profile"], source=source or os.path.basename(filename), **fields)
+            count += 1
+        return count
+
+    def close(self):
+        self._conn.close()
+
+
+# 这些结果在续跑时视为"已决定"，直接跳过；"error" 会在续跑时重试
+DECIDED_OUTCOMES = ("card-rejected", "date-rejected", "prescreen-rejected", "ai-rejected", "qualified", "contact-failed",
+                    "seen-skipped")
+
+
+class RunCheckpoint:
+    """
+    每个搜索一个检查点文件 (JSONL，追加写入并 fsync，崩溃也不会丢失已写入的行)。
+    记录每张简历卡片的 card_key、简历链接和处理结果；合格候选人本身保存在流水文件中。
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.decided = {}  # card_key -> outcome
+        self.decided_urls = set()
+        self.completed = False
+        if resume:
+            self._load()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    @staticmethod
+    def peek(path):
+        """读取已有检查点的概况: (已决定的卡片数, 是否已正常结束)；文件不存在返回 None。"""
+        if not os.path.exists(path):
+            return None
+        checkpoint = RunCheckpoint.__new__(RunCheckpoint)
+        checkpoint.path = path
+        checkpoint.decided = {}
+        checkpoint.decided_urls = set()
+        checkpoint.completed = False
+        checkpoint._load()
+        return len(checkpoint.decided), checkpoint.completed
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return  # 尚无检查点: 视为从头开始
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时可能留下半行
+                if entry.get("event") == "completed":
+                    self.completed = True
+                elif entry.get("outcome") in DECIDED_OUTCOMES:
+                    if entry.get("card_key"):
+                        self.decided[entry["card_key"]] = entry["outcome"]
+                    if entry.get("url"):
+                        self.decided_urls.add(entry["url"])
+
+    def is_decided(self, card_key):
+        return card_key is not None and card_key in self.decided
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(self, card_key, url, outcome):
+        if outcome in DECIDED_OUTCOMES:
+            if card_key:
+                self.decided[card_key] = outcome
+            if url:
+                self.decided_urls.add(url)
+        self._write({"card_key": card_key, "url": url, "outcome": outcome, "ts": time.time()})
+
+    def mark_completed(self):
+        self._write({"event": "completed", "ts": time.time()})
+
+    def close(self):
+        self._file.close()
+
+
+def checkpoint_path_for(filename):
+    """xlsx 对应的检查点文件名，例如 a_b_contacts.xlsx -> a_b_contacts.checkpoint.jsonl"""
+    return os.path.splitext(filename)[0] + ".checkpoint.jsonl"
+
+
+# 在搜索结果卡片上计算稳定标识 (点击之前): 优先简历 ID / 链接，否则用卡片文本
+CARD_KEY_JS = """
+el => {
+    const card = el.closest('[data-resumeid], [data-resume-id], [data-res-id], li, .resume-card, .new-resume-card') || el;
+    for (const attr of ['data-resumeid', 'data-resume-id', 'data-res-id']) {
+        const value = card.getAttribute(attr);
+        if (value) return 'id:' + value;
+    }
+    const link = card.querySelector('a[href*="resume"], a[href*="res_id"]');
+    if (link) return 'href:' + link.getAttribute('href');
+    return 'text:' + (card.innerText || el.innerText || '').replace(/\\s+/g, ' ').trim();
+}
+"""
+
+
+async def get_card_key(link_locator):
+    """返回结果卡片的稳定标识；取不到时返回 None。"""
+    try:
+        raw = await link_locator.evaluate(CARD_KEY_JS, timeout=3000)
+    except Exception:
+        return None
+    if not raw:
+        return None
+    if raw.startswith("text:"):
+        return "text:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return raw
+
+
+class WaitTracker:
+    """
+    统计一次运行的时间去向: 各类等待 (节流、页面就绪等) 累计了多少秒，占总运行时间多少。
+    (就绪等待发生在多个并发 worker 中，累计值可能超过总运行时间)
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.totals = {}
+
+    @contextlib.asynccontextmanager
+    async def track(self, category):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self.totals[category] = self.totals.get(category, 0.0) + elapsed
+            observe_metric(f"wait:{category}", elapsed)
+
+    def summary(self):
+        wall = time.monotonic() - self.started
+        parts = [f"{category} {seconds:.1f} 秒 ({seconds / wall * 100:.0f}%)" for category, seconds in self.totals.items()] if wall else []
+        return f"总运行 {wall:.1f} 秒，其中等待: {', '.join(parts) or '无'}"
+
+
+class RunMetrics:
+    """
+    每个处理阶段的耗时样本 (秒) 与事件计数。
+    阶段: navigation (打开简历页)、extraction (字段提取)、llm (AI 判断，含缓存/批量等待)、
+    llm_request (单次 API 往返)、contact (联系方式/支付流程)、save (导出 Excel)、profile_total (单份简历总耗时)；
+    等待时间以 wait:<类别> 记录。结束时可导出 JSON 或 Prometheus 文本格式。
+    """
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.samples = {}
+        self.counters = {}
+
+    def observe(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def incr(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    @staticmethod
+    def percentile(values, q):
+        ordered = sorted(values)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    def snapshot(self):
+        wall = time.monotonic() - self.started
+        profiles = len(self.samples.get("profile_total", []))
+        return {
+            "wall_seconds": round(wall, 3),
+            "resumes_per_minute": round(profiles / wall * 60, 2) if wall else 0.0,
+            "counters": dict(self.counters),
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "sum": round(sum(values), 3),
+                    "p50": round(self.percentile(values, 0.50), 3),
+                    "p95": round(self.percentile(values, 0.95), 3),
+                    "max": round(max(values), 3),
+                }
+                for stage, values in self.samples.items() if values
+            },
+        }
+
+    def to_prometheus(self):
+        lines = [
+            "# TYPE liepin_stage_seconds histogram",
+        ]
+        for stage, values in self.samples.items():
+            for bound in self.BUCKETS:
+                lines.append(f'liepin_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {sum(1 for v in values if v <= bound)}')
+            lines.append(f'liepin_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {len(values)}')
+            lines.append(f'liepin_stage_seconds_sum{{stage="{stage}"}} {sum(values):.6f}')
+            lines.append(f'liepin_stage_seconds_count{{stage="{stage}"}} {len(values)}')
+        lines.append("# TYPE liepin_events_total counter")
+        for name, value in self.counters.items():
+            lines.append(f'liepin_events_total{{name="{name}"}} {value}')
+        snapshot = self.snapshot()
+        lines.append("# TYPE liepin_resumes_per_minute gauge")
+        lines.append(f"liepin_resumes_per_minute {snapshot['resumes_per_minute']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """按扩展名写出指标文件: .prom 为 Prometheus 文本格式，其他为 JSON。"""
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                if path.endswith(".prom"):
+                    f.write(self.to_prometheus())
+                else:
+                    json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            print(f"--- 运行指标已写入: {path} ---")
+        except OSError as e:
+            print(f"--- 写入运行指标失败: {e} ---")
+
+    def summary_text(self):
+        snapshot = self.snapshot()
+        lines = [f"运行 {snapshot['wall_seconds']:.0f} 秒，{snapshot['resumes_per_minute']} 份简历/分钟"]
+        for stage, stats in sorted(snapshot["stages"].items()):
+            lines.append(f"  {stage:<20} n={stats['count']:<5} p50={stats['p50']:.2f}s  p95={stats['p95']:.2f}s  max={stats['max']:.2f}s")
+        if snapshot["counters"]:
+            lines.append("  " + ", ".join(f"{name}={value}" for name, value in sorted(snapshot["counters"].items())))
+        return "\n".join(lines)
+
+
+def observe_metric(stage, seconds):
+    if run_metrics is not None:
+        run_metrics.observe(stage, seconds)
+
+
+def count_event(name, amount=1):
+    if run_metrics is not None:
+        run_metrics.incr(name, amount)
+
+
+@contextlib.contextmanager
+def metric_span(stage):
+    """记录代码块耗时到 run_metrics (未启用时不做任何事)。可包裹含 await 的代码。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_metric(stage, time.perf_counter() - start)
+
+
+def metrics_path_for(filename):
+    """xlsx 对应的指标文件名，例如 a_contacts.xlsx -> a_contacts.metrics.json"""
+    return os.path.splitext(filename)[0] + (".metrics.prom" if METRICS_FORMAT == "prometheus" else ".metrics.json")
+
+
+async def wait_ready(page, selector, timeout=None, state="visible"):
+    """
+    事件驱动的等待: selector 达到 state 即返回 True，最多等待 timeout 毫秒，超时返回 False。
+    代替固定的 wait_for_timeout()，页面就绪多快就继续多快。
+    """
+    async with wait_tracker.track("页面就绪"):
+        try:
+            await page.locator(selector).first.wait_for(state=state, timeout=timeout or READY_TIMEOUT_MS)
+            return True
+        except Exception:
+            return False
+
+
+class ProfilePacer:
+    """
+    全局自适应节流器: 所有 worker 共享。
+    保证同一时刻只有一个 worker 在打开简历页，两次打开之间的间隔根据观测到的服务器响应时间调整:
+    间隔 ≈ PACING_LATENCY_FACTOR × 最近响应时间的滑动平均 (带随机抖动)，限制在 min_ms~max_ms 之间。
+    服务器变慢时自动放缓，响应快时不做无谓等待；避免并发变成突发请求。
+    """
+
+    def __init__(self, min_ms, max_ms):
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self._lock = asyncio.Lock()
+        self._next_allowed = 0.0
+        self._latency_ewma = None  # 秒
+
+    def observe(self, seconds):
+        """记录一次页面响应时间。"""
+        if self._latency_ewma is None:
+            self._latency_ewma = seconds
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * seconds
+
+    def next_interval(self):
+        """下一次打开前的间隔 (秒)。"""
+        if self._latency_ewma is None:
+            target_ms = (self.min_ms + self.max_ms) / 2
+        else:
+            target_ms = self._latency_ewma * 1000 * PACING_LATENCY_FACTOR
+        target_ms *= random.uniform(0.7, 1.3)
+        return min(max(target_ms, self.min_ms), self.max_ms) / 1000
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        async with self._lock:
+            delay = self._next_allowed - time.monotonic()
+            if delay > 0:
+                async with wait_tracker.track("节流"):
+                    await asyncio.sleep(delay)
+            try:
+                yield
+            finally:
+                self._next_allowed = time.monotonic() + self.next_interval()
+
+
+def backoff_delay(attempt, retry_after=None):
+    """第 attempt 次 (从 0 开始) 重试前的等待秒数: 全抖动指数退避，服务端给出 Retry-After 时不少于该值。"""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    try:
+        delay = max(delay, min(BACKOFF_MAX_SECONDS, float(retry_after)))
+    except (TypeError, ValueError):
+        pass  # 没有 Retry-After，或是 HTTP 日期格式
+    return delay
+
+
+class RateAttempt:
+    """RateChannel.slot() 中的一次操作；调用 fail() (或代码块抛出异常) 表示失败。"""
+
+    def __init__(self):
+        self.ok = True
+
+    def fail(self):
+        self.ok = False
+
+
+class RateChannel:
+    """
+    一类流量 (导航 / AI 接口) 的限速与并发控制:
+    - 令牌桶: 每秒补充 rate 个令牌，最多积攒 burst 个，每次操作消耗一个
+    - AIMD: 操作成功且耗时正常时，并发上限每次 +1/当前上限 (约每轮 +1)、速率逐步回升到初始值；
+      失败 (限流、服务端错误、超时) 或耗时超过 slow_seconds 时，并发上限和速率减半 (每秒最多一次)
+    """
+
+    def __init__(self, name, rate, burst=1, max_concurrency=1, slow_seconds=None):
+        self.name = name
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.slow_seconds = slow_seconds
+        self.in_flight = 0
+        self.tokens = float(burst)
+        self.failures = 0
+        self.decreases = 0
+        self._refilled_at = time.monotonic()
+        self._decreased_at = 0.0
+        self._cond = None
+
+    @classmethod
+    def for_api(cls, max_concurrency=None):
+        return cls("api", LLM_RATE_PER_SECOND, burst=max(1, LLM_RATE_PER_SECOND),
+                   max_concurrency=max_concurrency or LLM_MAX_CONCURRENCY, slow_seconds=LLM_SLOW_SECONDS)
+
+    @classmethod
+    def for_navigation(cls):
+        return cls("navigation", NAV_RATE_PER_MINUTE / 60, burst=NAV_BURST, max_concurrency=max(1, MAX_CONCURRENT_TABS))
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    async def acquire_slot(self):
+        """只占用一个并发名额 (导航通道: 一个打开中的简历标签页，每次请求另取令牌)。"""
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        started = time.monotonic()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < max(1, int(self.concurrency)))
+            self.in_flight += 1
+        waited = time.monotonic() - started
+        if waited > 0.01:
+            observe_metric(f"wait:并发:{self.name}", waited)
+
+    async def take_token(self):
+        """从令牌桶取一个令牌 (每次实际发出的请求一个)。"""
+        started = time.monotonic()
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                break
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+        waited = time.monotonic() - started
+        if waited > 0.01:
+            observe_metric(f"wait:限速:{self.name}", waited)
+
+    async def acquire(self):
+        await self.acquire_slot()
+        await self.take_token()
+
+    def adjust(self, ok, seconds=0.0):
+        """按一次操作的结果调整并发上限和速率 (AIMD)。"""
+        if not ok:
+            self.failures += 1
+        if ok and not (self.slow_seconds and seconds > self.slow_seconds):
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 10)
+        elif time.monotonic() - self._decreased_at >= 1.0:
+            self._decreased_at = time.monotonic()
+            self.decreases += 1
+            self.concurrency = max(1.0, self.concurrency / 2)
+            self.rate = max(self.base_rate / 16, self.rate / 2)
+
+    async def release(self, ok, seconds):
+        self.in_flight -= 1
+        self.adjust(ok, seconds)
+        async with self._cond:
+            self._cond.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, token=True):
+        """占用一个并发名额和一个令牌 (token=False 时只占名额)，结束时按结果和耗时调整。"""
+        if token:
+            await self.acquire()
+        else:
+            await self.acquire_slot()
+        attempt = RateAttempt()
+        started = time.monotonic()
+        try:
+            yield attempt
+        except BaseException:
+            attempt.fail()
+            raise
+        finally:
+            await self.release(attempt.ok, time.monotonic() - started)
+
+    def summary(self):
+        if self.name == "navigation":
+            rate = f"{self.rate * 60:.0f}/分钟"
+        else:
+            rate = f"{self.rate:.1f}/秒"
+        return f"{self.name}: 速率 {rate}，并发上限 {int(self.concurrency)}，失败 {self.failures} 次，降速 {self.decreases} 次"
+
+
+class RateController:
+    """每轮运行一个: 导航 (打开简历页) 与 AI 接口两个互不影响的 RateChannel。"""
+
+    def __init__(self):
+        self.navigation = RateChannel.for_navigation()
+        self.api = RateChannel.for_api()
+
+    def summary(self):
+        return f"{self.navigation.summary()} | {self.api.summary()}"
+
+
+@contextlib.asynccontextmanager
+async def navigation_tab():
+    """
+    占用导航通道的一个并发名额 (一个打开中的简历标签页) 直到代码块结束 (未创建 rate_controller 时不限制)。
+    同时打开的标签页数由该通道的 AIMD 并发上限决定，被拒绝或处理出错时自动减少。
+    """
+    if rate_controller is None:
+        yield RateAttempt()
+        return
+    async with rate_controller.navigation.slot(token=False) as attempt:
+        yield attempt
+
+
+class NavigationBlocked(Exception):
+    """打开简历页被限流 / 拒绝 (429、403、5xx)，重试后仍失败。"""
+
+
+# 页面主文档的 HTTP 状态 (点击打开的新标签页拿不到 Response 对象时使用)
+DOCUMENT_STATUS_JS = """
+() => {
+    const entry = performance.getEntriesByType('navigation')[0];
+    return entry && entry.responseStatus ? entry.responseStatus : null;
+}
+"""
+
+
+def is_blocked_status(status):
+    """站点限流 / 拒绝访问 / 服务端出错的状态码。"""
+    return status is not None and (status in (403, 429) or status >= 500)
+
+
+async def take_navigation_token():
+    """每次实际发出导航请求前从导航令牌桶取一个令牌 (未创建 rate_controller 时不限制)。"""
+    if rate_controller is not None:
+        await rate_controller.navigation.take_token()
+
+
+async def backoff_navigation(status, retry_after, attempt_no, url):
+    """
+    简历页被拒绝后: 让导航通道降低并发和速率；重试次数用完时抛出 NavigationBlocked，
+    否则按带抖动的指数退避等待 (服务端给出 Retry-After 时不少于该值)。
+    """
+    count_event("nav_blocked")
+    if rate_controller is not None:
+        rate_controller.navigation.adjust(False)
+    if attempt_no >= NAV_MAX_RETRIES:
+        raise NavigationBlocked(f"HTTP {status}，重试 {NAV_MAX_RETRIES} 次后仍失败: {url}")
+    delay = backoff_delay(attempt_no, retry_after)
+    count_event("nav_retries")
+    print(f"--- 打开简历被拒绝 (HTTP {status})，{delay:.1f} 秒后重试 ({attempt_no + 1}/{NAV_MAX_RETRIES}) ---")
+    await asyncio.sleep(delay)
+
+
+async def goto_profile(profile_page, url, pacer, first_attempt=0):
+    """
+    在已有的页面中打开简历链接 (受 pacer 与导航令牌桶控制)。
+    主文档返回 429 / 403 / 5xx 时退避重试；重试耗尽 (NavigationBlocked) 或其他错误时抛出异常。
+    并发名额 (同时打开的标签页数) 由调用方通过 rate_controller.navigation 占用。
+    """
+    for attempt_no in range(first_attempt, NAV_MAX_RETRIES + 1):
+        async with pacer.slot():
+            start = time.monotonic()
+            count_event("pages_opened")
+            await take_navigation_token()
+            response = await profile_page.goto(url, wait_until="domcontentloaded")
+        pacer.observe(time.monotonic() - start)
+        observe_metric("navigation", time.monotonic() - start)
+        if response is None or not is_blocked_status(response.status):
+            return
+        await backoff_navigation(response.status, response.headers.get("retry-after"), attempt_no, url)
+
+
+# 翻页完成的判断: 旧的第一张卡片已从页面移除 (或被复用但卡片标识已变化)。
+# 不比较姓名文本: 姓名是 "罗**" 这样的脱敏姓氏，相邻两页的第一位候选人经常相同。
+PAGE_CHANGED_JS = """
+([sel, before]) => {
+    const el = document.querySelector(sel);
+    if (!el) return false;
+    if (!el.__staleResultCard) return true;
+    return (%s)(el) !== before;
+}
+""" % CARD_KEY_JS.strip()
+# 点击下一页前标记当前的第一张卡片，并返回其标识
+MARK_FIRST_CARD_JS = "el => { el.__staleResultCard = true; return (%s)(el); }" % CARD_KEY_JS.strip()
+
+
+async def goto_next_results_page(page):
+    """
+    点击搜索结果的"下一页"，等待旧的第一张卡片被替换后返回 True；
+    没有下一页或翻页失败时返回 False。
+    """
+    next_button = page.locator(NEXT_PAGE_SELECTOR).first
+    try:
+        if not await next_button.is_visible():
+            return False
+        first_card = page.locator(RESUME_LINK_SELECTOR).first
+        key_before = await first_card.evaluate(MARK_FIRST_CARD_JS, timeout=3000)
+        await next_button.click(timeout=5000)
+        await page.wait_for_function(PAGE_CHANGED_JS, arg=[RESUME_LINK_SELECTOR, key_before], timeout=10000)
+        return True
+    except Exception as e:
+        print(f"--- 翻页失败或已是最后一页: {e} ---")
+        return False
+
+
+CARD_TEXTS_JS = """
+sel => Array.from(document.querySelectorAll(sel)).map(el => {
+    const card = el.closest('[data-resumeid], [data-resume-id], [data-res-id], li, .resume-card, .new-resume-card') || el;
+    return card.innerText || '';
+})
+"""
+
+
+async def iter_result_cards(page, max_pages=None):
+    """
+    异步生成器: 逐页产出搜索结果卡片 (序号, 页码, locator, 卡片文字)。
+    卡片文字 (公司、职位、在职时间等) 每页一次求值全部取出，供卡片级预筛使用。
+    调用方取完当前页的最后一张卡片并再次迭代时，才会翻到下一页，
+    因此当前页的卡片必须在继续迭代前点击完毕。
+    max_pages 为 None 或 0 时遍历所有页。
+    """
+    index = 0
+    page_no = 1
+    while True:
+        cards = await page.locator(RESUME_LINK_SELECTOR).all()
+        print(f"--- 第 {page_no} 页找到 {len(cards)} 个简历链接 ---")
+        try:
+            card_texts = await page.evaluate(CARD_TEXTS_JS, RESUME_LINK_SELECTOR)
+        except Exception:
+            card_texts = []
+        if len(card_texts) != len(cards):
+            card_texts = [""] * len(cards)  # 页面在两次查询之间变化，本页不做卡片预筛
+        for link_locator, card_text in zip(cards, card_texts):
+            yield index, page_no, link_locator, card_text
+            index += 1
+
+        if not cards or (max_pages and page_no >= max_pages):
+            return
+        if not await goto_next_results_page(page):
+            return
+        page_no += 1
+
+
+# 简历详情页各字段的候选选择器 (按优先级)。inner=True 的字段用 innerText (保留换行/可见文本)
+PROFILE_FIELD_SELECTORS = {
+    "cv_text": {"selectors": [CV_TEXT_SELECTOR]},
+    "work_time": {"selectors": ['div.work-time', '.work-duration', '.time-text', '.work-time-text', '.contact-time', 'span.rd-work-time']},
+    "name": {"selectors": ['div.resume-preview-name', '.person-name', '.resume-name', '.name-text', '.contact-name', 'h4.name']},
+    "gender_info": {"selectors": ['div.basic-cont > div.sep-info'], "inner": True},  # 包含性别、年龄、地区的行
+    "company": {"selectors": ['div.company-name', '.work-company', '.company-text', '.company-title', '.contact-company', 'div.rd-work-comp > h5']},
+    "title": {"selectors": ['div.position-name', '.work-position', '.position-text', '.position-title', '.contact-position', 'h6.job-name']},
+}
+
+EXTRACT_FIELDS_JS = """
+fields => {
+    const out = {};
+    for (const [field, spec] of Object.entries(fields)) {
+        out[field] = {value: null, selector: null};
+        for (const sel of spec.selectors) {
+            let el = null;
+            try { el = document.querySelector(sel); } catch (e) { continue; }
+            if (el) {
+                out[field] = {value: spec.inner ? el.innerText : el.textContent, selector: sel};
+                break;
+            }
+        }
+    }
+    return out;
+}
+"""
+
+
+class SelectorStats:
+    """
+    记录每个字段哪个候选选择器命中次数最多，保存到 SELECTOR_STATS_PATH；
+    之后的运行按命中次数排序，优先尝试上次成功的选择器。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or SELECTOR_STATS_PATH
+        self.wins = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.wins = json.load(f)
+            except (OSError, ValueError):
+                self.wins = {}
+
+    def ordered(self, field, selectors):
+        wins = self.wins.get(field, {})
+        return sorted(selectors, key=lambda sel: -wins.get(sel, 0))  # sorted 稳定，未命中的保持原顺序
+
+    def record(self, field, selector):
+        field_wins = self.wins.setdefault(field, {})
+        field_wins[selector] = field_wins.get(selector, 0) + 1
+
+    def save(self):
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.wins, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"--- 保存选择器统计失败: {e} ---")
+
+
+async def extract_profile_fields(profile_page):
+    """
+    在页面内一次求值取出所有字段，返回 {字段: 文本或 None}，
+    另含 "_selectors": {字段: 命中的选择器}，命中情况同时计入 selector_stats。
+    """
+    spec = {
+        field: {
+            "selectors": selector_stats.ordered(field, conf["selectors"]) if selector_stats else conf["selectors"],
+            "inner": conf.get("inner", False),
+        }
+        for field, conf in PROFILE_FIELD_SELECTORS.items()
+    }
+    try:
+        raw = await profile_page.evaluate(EXTRACT_FIELDS_JS, spec)
+    except Exception as e:
+        print(f"--- 页面字段提取出错: {e} ---")
+        raw = {}
+
+    fields = {"_selectors": {}}
+    for field in PROFILE_FIELD_SELECTORS:
+        result = raw.get(field) or {}
+        fields[field] = result.get("value")
+        if result.get("selector"):
+            fields["_selectors"][field] = result["selector"]
+            if selector_stats is not None:
+                selector_stats.record(field, result["selector"])
+    return fields
+
+
+# --- 网络捕获模式: 直接解析简历详情接口返回的 JSON ---
+
+# 接口 JSON 中可能使用的字段名 (按优先级)
+RESUME_JSON_KEYS = {
+    "name": ("name", "resName", "userName", "realName", "showName"),
+    "gender": ("sexName", "sex", "gender"),
+    "company": ("curCompName", "compName", "companyName", "company"),
+    "title": ("curTitle", "jobTitle", "title", "jobName", "position"),
+}
+RESUME_JSON_WORK_LIST_KEYS = ("workExps", "workExperiences", "workExpList", "workList", "works")
+RESUME_JSON_START_KEYS = ("startYm", "startDate", "start", "beginDate", "startTime")
+RESUME_JSON_END_KEYS = ("endYm", "endDate", "end", "endTime")
+RESUME_JSON_DESC_KEYS = ("duty", "desc", "description", "workDesc", "jobContent", "content")
+# 简历抬头 (姓名 性别 年龄 城市)，与详情页正文第一行一致
+RESUME_JSON_HEADER_KEYS = (RESUME_JSON_KEYS["name"], RESUME_JSON_KEYS["gender"], ("age", "ageStr"),
+                           ("dqName", "cityName", "city"))
+
+
+def find_json_value(data, keys):
+    """在嵌套的 dict/list 中广度优先查找第一个非空的 keys 字段值。"""
+    queue = [data]
+    while queue:
+        node = queue.pop(0)
+        if isinstance(node, dict):
+            for key in keys:
+                value = node.get(key)
+                if value not in (None, "", [], {}):
+                    return value
+            queue.extend(node.values())
+        elif isinstance(node, list):
+            queue.extend(node)
+    return None
+
+
+def collect_json_strings(data, skip=None):
+    """按出现顺序收集 JSON 中所有文本值 (skip 为要跳过的节点，按对象身份比较)。"""
+    if skip is not None and data is skip:
+        return
+    if isinstance(data, dict):
+        for value in data.values():
+            yield from collect_json_strings(value, skip)
+    elif isinstance(data, list):
+        for item in data:
+            yield from collect_json_strings(item, skip)
+    elif isinstance(data, str):
+        text = data.strip()
+        if text and not text.startswith(("http://", "https://", "//")):
+            yield text
+
+
+def format_json_month(value):
+    """'201904' / '2019-04' / '2019.4' / 时间戳(毫秒) -> '2019.04'；空、'至今'、9999 开头视为至今。"""
+    if value in (None, "", 0):
+        return "至今"
+    if isinstance(value, (int, float)) and value > 10**11:
+        return time.strftime("%Y.%m", time.localtime(value / 1000))
+    text = str(value).strip()
+    if text in ("至今", "今") or text.startswith("9999"):
+        return "至今"
+    match = re.match(r"(\d{4})\D?(\d{1,2})", text)
+    if not match:
+        return text
+    return f"{match.group(1)}.{int(match.group(2)):02d}"
+
+
+def render_resume_json_text(data, works):
+    """
+    把接口 JSON 排版成与详情页正文相同形状的简历全文:
+        姓名 性别 年龄岁 城市
+        工作经历
+        2022.03 - 至今 公司 职位
+        工作描述
+        ... (其余文本按出现顺序附在后面)
+    这样 parse_work_history() 能解析出每段在职时间，内容指纹也与页面提取的一致。
+    """
+    header = []
+    for keys in RESUME_JSON_HEADER_KEYS:
+        value = find_json_value(data, keys)
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        value = str(value).strip()
+        if keys[0] == "age" and value.isdigit():
+            value += "岁"
+        header.append(value)
+    lines = [" ".join(header)] if header else []
+
+    used = set(header) | {value[:-1] for value in header if value.endswith("岁")}
+    if works:
+        lines.append("工作经历")
+        for work in works:
+            start = format_json_month(find_json_value(work, RESUME_JSON_START_KEYS))
+            end = format_json_month(find_json_value(work, RESUME_JSON_END_KEYS))
+            company = find_json_value(work, RESUME_JSON_KEYS["company"]) or ""
+            title = find_json_value(work, RESUME_JSON_KEYS["title"]) or ""
+            lines.append(" ".join(str(part).strip() for part in (f"{start} - {end}", company, title) if part))
+            desc = find_json_value(work, RESUME_JSON_DESC_KEYS)
+            if isinstance(desc, str) and desc.strip():
+                lines.append(desc.strip())
+
+    # 教育、项目等其他文本 (抬头和工作经历已单独排版，不再重复)
+    lines.extend(text for text in collect_json_strings(data, skip=works) if text not in used)
+    return "\n".join(lines)
+
+
+def parse_resume_json(data):
+    """
+    把简历详情接口的 JSON 转成与 extract_profile_fields() 相同形状的字段字典。
+    无法识别 (没有任何文本) 时返回 None。
+    """
+    works = find_json_value(data, RESUME_JSON_WORK_LIST_KEYS)
+    if not (isinstance(works, list) and works and isinstance(works[0], dict)):
+        works = None
+    cv_text = render_resume_json_text(data, works)
+    if not cv_text:
+        return None
+
+    fields = {"_selectors": {"_source": "network"}, "cv_text": cv_text}
+    for field, keys in RESUME_JSON_KEYS.items():
+        value = find_json_value(data, keys)
+        fields[field] = str(value) if value is not None and not isinstance(value, (dict, list)) else None
+    fields["gender_info"] = fields.pop("gender")
+
+    work_time = None
+    if works:
+        latest = works[0]  # 接口通常按时间倒序，第一段为最近的工作
+        start = format_json_month(find_json_value(latest, RESUME_JSON_START_KEYS))
+        end = format_json_month(find_json_value(latest, RESUME_JSON_END_KEYS))
+        work_time = f"{start} - {end}"
+        fields["company"] = fields["company"] or find_json_value(latest, RESUME_JSON_KEYS["company"])
+        fields["title"] = fields["title"] or find_json_value(latest, RESUME_JSON_KEYS["title"])
+    fields["work_time"] = work_time
+    return fields
+
+
+class ResumeResponseCollector:
+    """
+    监听 context 上所有 XHR/fetch 响应，URL 匹配 RESUME_RESPONSE_PATTERNS 的按所属页面解析并暂存。
+    process_profile() 通过 take() 取用；等不到可用响应时返回 None，由 DOM 提取兜底。
+    页面关闭时丢弃该页未取用的数据 (take() 超时后才到达的响应也随之清理)，已关闭页面的响应直接忽略。
+    """
+
+    def __init__(self, patterns=None):
+        self._pattern = re.compile("|".join(patterns or RESUME_RESPONSE_PATTERNS), re.IGNORECASE)
+        self._records = {}
+        self._events = {}
+        self.captured = 0
+
+    def attach(self, context):
+        context.on("response", self._on_response)
+
+    def detach(self, context):
+        context.remove_listener("response", self._on_response)
+
+    def _event(self, page):
+        event = self._events.get(page)
+        if event is None:
+            event = self._events[page] = asyncio.Event()
+            page.once("close", self._forget)
+        return event
+
+    def _forget(self, page):
+        self._events.pop(page, None)
+        self._records.pop(page, None)
+
+    def _on_response(self, response):
+        if response.request.resource_type not in ("xhr", "fetch"):
+            return
+        if not self._pattern.search(response.url):
+            return
+        asyncio.ensure_future(self._handle(response))
+
+    async def _handle(self, response):
+        try:
+            page = response.frame.page
+            data = await response.json()
+        except Exception:
+            return  # 非 JSON 或页面已关闭
+        if page.is_closed():
+            return
+        fields = parse_resume_json(data)
+        if not fields or not fields.get("work_time"):
+            return  # 不是简历详情数据
+        self._records[page] = fields
+        self._event(page).set()
+        self.captured += 1
+
+    async def take(self, page, timeout_ms=None):
+        """等待该页面的简历接口数据，最多 timeout_ms 毫秒；返回字段字典或 None。"""
+        event = self._event(page)
+        try:
+            await asyncio.wait_for(event.wait(), (timeout_ms or NETWORK_CAPTURE_WAIT_MS) / 1000)
+        except asyncio.TimeoutError:
+            pass
+        self._events.pop(page, None)
+        return self._records.pop(page, None)
+
+
+class ResourceBlocker:
+    """
+    精简模式: 拦截爬取用不到的请求 (图片、字体、音视频、统计/广告脚本)。
+    联系方式图片 (getcontact) 与简历数据接口始终放行 (LEAN_ALLOW_PATTERNS)。
+    被拦截请求的大小按 LEAN_ESTIMATED_BYTES 估算，页面关闭时打印本页节省量。
+    """
+
+    def __init__(self):
+        self._allow = re.compile("|".join(LEAN_ALLOW_PATTERNS + RESUME_RESPONSE_PATTERNS), re.IGNORECASE)
+        self._block_urls = re.compile("|".join(LEAN_BLOCK_URL_PATTERNS), re.IGNORECASE)
+        self._per_page = {}  # page -> [拦截数, 估算字节]
+        self.blocked = 0
+        self.bytes_saved = 0
+
+    async def attach(self, context):
+        await context.route("**/*", self._handle)
+        context.on("page", self._watch_page)
+
+    async def detach(self, context):
+        await context.unroute("**/*", self._handle)
+        context.remove_listener("page", self._watch_page)
+
+    def _watch_page(self, page):
+        page.on("close", self._report_page)
+
+    def _classify(self, request):
+        """返回拦截类别 (资源类型或 'tracker')；应放行时返回 None。"""
+        if self._allow.search(request.url):
+            return None
+        if request.resource_type in LEAN_BLOCK_RESOURCE_TYPES:
+            return request.resource_type
+        if self._block_urls.search(request.url):
+            return "tracker"
+        return None
+
+    async def _handle(self, route):
+        category = self._classify(route.request)
+        if category is None:
+            await route.continue_()
+            return
+        await route.abort()
+        estimated = LEAN_ESTIMATED_BYTES.get(category, 0)
+        self.blocked += 1
+        self.bytes_saved += estimated
+        try:
+            stats = self._per_page.setdefault(route.request.frame.page, [0, 0])
+            stats[0] += 1
+            stats[1] += estimated
+        except Exception:
+            pass  # service worker 等没有所属页面的请求
+
+    def _report_page(self, page):
+        count, estimated = self._per_page.pop(page, (0, 0))
+        if count:
+            print(f"--- (精简模式) 本页拦截 {count} 个请求，约节省 {estimated / 1024:.0f} KB ---")
+
+    def summary(self):
+        return f"共拦截 {self.blocked} 个请求，约节省 {self.bytes_saved / 1024 / 1024:.1f} MB"
+
+
+# --- 截图号码识别: 固定字体的数字图片，按字形模板匹配 ---
+# 模板来自一张人工核对过的截图: build_digit_templates("张先生.png", "13812345678")，
+# 覆盖 0-9 后即可自动识别；识别在进程池中进行，不占用事件循环。
+
+def read_ink_mask(image_path):
+    """读取图片并二值化，返回按行的布尔矩阵 (True = 字迹)。纯色图片返回 []。"""
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        gray = img.convert("L")
+        width, height = gray.size
+        pixels = list(gray.getdata())
+    low, high = min(pixels), max(pixels)
+    if high - low < 32:
+        return []
+    threshold = (low + high) / 2
+    dark_ink = sum(pixels) / len(pixels) > threshold  # 背景占多数: 浅底深字或深底浅字
+    return [[(p < threshold) == dark_ink for p in pixels[y * width:(y + 1) * width]] for y in range(height)]
+
+
+def segment_glyphs(mask, width_ratio=None):
+    """
+    按列投影切分字符，返回各字符的矩阵 (统一取整行字迹的上下边界，宽度补齐到典型字宽并居中)。
+    粘连的字符按典型字宽均分。典型字宽 = width_ratio × 字高 (来自模板，见 template_width_ratio())；
+    未提供时取本图各字符宽度的中位数 (号码中窄的 "1" 占多数时会偏小，只用于生成模板)。
+    """
+    if not mask:
+        return []
+    ink_rows = [y for y, row in enumerate(mask) if any(row)]
+    if not ink_rows:
+        return []
+    mask = mask[ink_rows[0]:ink_rows[-1] + 1]
+    width = len(mask[0])
+    ink_cols = [any(row[x] for row in mask) for x in range(width)]
+
+    spans = []
+    start = None
+    for x, ink in enumerate(ink_cols + [False]):
+        if ink and start is None:
+            start = x
+        elif not ink and start is not None:
+            spans.append((start, x))
+            start = None
+    if width_ratio:
+        typical = max(1, round(width_ratio * len(mask)))
+    else:
+        widths = sorted(end - begin for begin, end in spans)
+        typical = widths[len(widths) // 2]
+
+    glyphs = []
+    for begin, end in spans:
+        parts = max(1, round((end - begin) / typical))
+        step = (end - begin) / parts
+        for k in range(parts):
+            x0 = begin + int(round(k * step))
+            x1 = begin + int(round((k + 1) * step))
+            pad = max(0, typical - (x1 - x0))
+            left = [False] * (pad // 2)
+            right = [False] * (pad - pad // 2)
+            glyphs.append([left + row[x0:x1] + right for row in mask])
+    return glyphs
+
+
+def normalize_glyph(glyph, size=None):
+    """最近邻缩放到 size，返回 "0"/"1" 字符串。"""
+    w, h = size or OCR_GLYPH_SIZE
+    gh, gw = len(glyph), len(glyph[0])
+    return "".join(
+        "1" if glyph[min(gh - 1, int((y + 0.5) * gh / h))][min(gw - 1, int((x + 0.5) * gw / w))] else "0"
+        for y in range(h) for x in range(w)
+    )
+
+
+def glyph_ink_width(glyph):
+    """字形矩阵中有字迹的列宽 (去掉补齐的空白列)。"""
+    cols = [x for x in range(len(glyph[0])) if any(row[x] for row in glyph)]
+    return cols[-1] - cols[0] + 1 if cols else 0
+
+
+def template_width_ratio(templates):
+    """模板记录的典型字宽与字高之比 (各字符宽高比的中位数，窄的 "1" 只占一个)；旧模板没有记录时返回 None。"""
+    ratios = sorted((templates or {}).get("widths", {}).values())
+    return ratios[len(ratios) // 2] if ratios else None
+
+
+def load_digit_templates(path=None):
+    """
+    读取字形模板 {"size": [w, h], "glyphs": {"0": [位串, ...], ...}, "widths": {"0": 宽高比, ...}}；
+    不存在或损坏时返回 None。
+    """
+    try:
+        with open(path or OCR_TEMPLATE_PATH, encoding="utf-8") as f:
+            templates = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return templates if templates.get("glyphs") else None
+
+
+def build_digit_templates(image_path, text, template_path=None):
+    """
+    用一张已人工核对的号码截图生成/补充字形模板。
+    text 为图片上的字符 (例如 "13812345678")，字符数必须与切分出的字形数一致。
+    """
+    template_path = template_path or OCR_TEMPLATE_PATH
+    chars = [c for c in text if not c.isspace()]
+    glyphs = segment_glyphs(read_ink_mask(image_path))
+    if len(glyphs) != len(chars):
+        raise ValueError(f"切分出 {len(glyphs)} 个字符，与输入的 {len(chars)} 个字符不一致")
+
+    templates = load_digit_templates(template_path) or {"size": list(OCR_GLYPH_SIZE), "glyphs": {}}
+    size = tuple(templates["size"])
+    widths = templates.setdefault("widths", {})
+    for char, glyph in zip(chars, glyphs):
+        ratio = glyph_ink_width(glyph) / len(glyph)
+        widths[char] = round((widths[char] + ratio) / 2 if char in widths else ratio, 4)
+        samples = templates["glyphs"].setdefault(char, [])
+        bits = normalize_glyph(glyph, size)
+        if bits not in samples:
+            samples.append(bits)
+    with open(template_path, "w", encoding="utf-8") as f:
+        json.dump(templates, f, ensure_ascii=False)
+    print(f"--- 字形模板已更新: {template_path} (已覆盖字符: {''.join(sorted(templates['glyphs']))}) ---")
+    return templates
+
+
+_ocr_templates = None  # 识别进程中的模板 (由 _init_ocr_worker 设置)
+
+
+def _init_ocr_worker(templates):
+    global _ocr_templates
+    _ocr_templates = templates
+
+
+def decode_contact_image(image_path, templates=None):
+    """
+    识别号码图片，返回 (文本, 置信度)。置信度为各字符与最相近模板的最低匹配比例 (0~1)。
+    在识别进程中运行 (模块顶层函数，可被 pickle)。
+    """
+    templates = templates or _ocr_templates
+    size = tuple(templates["size"])
+    text = ""
+    confidence = 1.0
+    for glyph in segment_glyphs(read_ink_mask(image_path), template_width_ratio(templates)):
+        bits = normalize_glyph(glyph, size)
+        best_char, best_score = "?", 0.0
+        for char, samples in templates["glyphs"].items():
+            for sample in samples:
+                score = sum(a == b for a, b in zip(bits, sample)) / len(sample)
+                if score > best_score:
+                    best_char, best_score = char, score
+        text += best_char
+        confidence = min(confidence, best_score)
+    return text, (confidence if text else 0.0)
+
+
+class ContactOCR:
+    """
+    截图号码识别: 进程池中做模板匹配，结果按 (图片内容哈希, 模板版本) 缓存在 SQLite 中。
+    read() 返回 (号码, 置信度, 是否可信)；不可信的结果由调用方标记为待人工核对。
+    缺少 Pillow 或模板时 available 为 False。多个分片进程可同时写入缓存 (WAL 模式 + 忙等待)。
+    """
+
+    def __init__(self, template_path=None, cache_path=None, workers=None):
+        self.templates = load_digit_templates(template_path)
+        self.available = self.templates is not None and importlib.util.find_spec("PIL") is not None
+        self.decoded = 0
+        self.flagged = 0
+        self.cache_hits = 0
+        self._pool = None
+        self._conn = None
+        if not self.available:
+            return
+        self.version = hashlib.sha1(json.dumps(self.templates, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        if multiprocessing.current_process().daemon:
+            # 分片 worker 是守护进程，不能再创建子进程，改用线程 (同样不占用事件循环)
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        else:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers or OCR_WORKERS, initializer=_init_ocr_worker, initargs=(self.templates,))
+        self._conn = sqlite3.connect(cache_path or OCR_CACHE_PATH, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_results (key TEXT PRIMARY KEY, text TEXT, confidence REAL, created REAL)"
+        )
+        self._conn.commit()
+
+    async def read(self, image_path):
+        if not self.available:
+            return None, 0.0, False
+        try:
+            with open(image_path, "rb") as f:
+                key = hashlib.sha1(f.read()).hexdigest() + ":" + self.version
+            row = self._conn.execute("SELECT text, confidence FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.cache_hits += 1
+                text, confidence = row
+            else:
+                loop = asyncio.get_running_loop()
+                with metric_span("ocr"):
+                    text, confidence = await loop.run_in_executor(
+                        self._pool, decode_contact_image, image_path, self.templates)
+                self._conn.execute("INSERT OR REPLACE INTO ocr_results VALUES (?, ?, ?, ?)",
+                                   (key, text, confidence, time.time()))
+                self._conn.commit()
+        except Exception as e:
+            print(f"--- 号码图片识别出错: {e} ---")
+            self.flagged += 1
+            return None, 0.0, False
+
+        confident = confidence >= OCR_MIN_CONFIDENCE and re.fullmatch(OCR_EXPECT_PATTERN, text) is not None
+        if confident:
+            self.decoded += 1
+        else:
+            self.flagged += 1
+        count_event("ocr:decoded" if confident else "ocr:review")
+        return text, confidence, confident
+
+    def stats_text(self):
+        return f"号码识别: {self.decoded}, 待核对: {self.flagged}"
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def open_contact_ocr():
+    """OCR_ENABLED 时创建 ContactOCR；缺少 Pillow 或字形模板时给出提示并返回 None。"""
+    if not OCR_ENABLED:
+        return None
+    ocr = ContactOCR()
+    if ocr.available:
+        return ocr
+    if importlib.util.find_spec("PIL") is None:
+        print("--- Pillow 未安装，截图号码不做识别。请运行: pip install Pillow ---")
+    else:
+        print(f"--- 未找到字形模板 {OCR_TEMPLATE_PATH}，截图号码不做识别 (先用 build_digit_templates() 生成) ---")
+    return None
+
+
+async def open_profile(context, link_locator, pacer):
+    """点击结果卡片，返回新打开的简历详情页。"""
+    # 打开新标签页需要串行: expect_page() 监听的是整个 context,
+    # 并发点击会导致拿到别人的页面。pacer 同时限制全局打开速率。
+    async with pacer.slot():
+        # <-- [Gemini 已确认] -->
+        start = time.monotonic()
+        count_event("pages_opened")
+        await take_navigation_token()
+        async with context.expect_page() as new_page_info:
+            await link_locator.click(timeout=5000) # 点击你找到的SOP'器
+
+        profile_page = await new_page_info.value
+
+    # 在节流锁外等待页面加载，并把耗时反馈给 pacer
+    await profile_page.wait_for_load_state('domcontentloaded')
+    pacer.observe(time.monotonic() - start)
+    observe_metric("navigation", time.monotonic() - start)
+
+    # 被限流 / 拒绝时在同一标签页中按链接退避重试
+    try:
+        status = await profile_page.evaluate(DOCUMENT_STATUS_JS)
+    except Exception:
+        status = None
+    if is_blocked_status(status):
+        try:
+            await backoff_navigation(status, None, 0, profile_page.url)
+            await goto_profile(profile_page, profile_page.url, pacer, first_attempt=1)
+        except Exception:
+            await profile_page.close()
+            raise
+    return profile_page
+
+
+async def process_profile(profile_page, i, page_no, briefing_text, min_departure_str, is_retry=False):
+    """
+    处理一个已打开的简历详情页: 日期过滤 -> AI 判断 -> 获取联系方式 -> 写入 saved_contacts。
+    由 main() 中的多个 worker 并发调用；is_retry=True 表示重新处理 (不重复计入已看数)。
+    返回 (outcome, profile_url, fingerprint)，outcome 见 DECIDED_OUTCOMES，出错时为 "error"，
+    AI 重试后仍无法判断时为 "ai-undecided" (不算淘汰，稍后重试)；
+    fingerprint 为简历内容指纹 (未取到简历文本时为 None)。
+    """
+    global saved_contacts, contacts_lock, qualified_resumes_count, processed_resumes_count
+
+    if is_retry:
+        print(f"\n--- (重试) 重新处理第 {i+1} 个简历 (结果第 {page_no} 页) ---")
+    else:
+        with contacts_lock:
+            processed_resumes_count += 1
+        print(f"\n--- 正在处理第 {i+1} 个简历 (结果第 {page_no} 页) ---")
+
+    # 安全点: 暂停时在此挂起 (不阻塞事件循环)
+    await pause_controller.wait_if_paused()
+
+    profile_url = None
+    fingerprint = None
+    try:
+        await profile_page.wait_for_load_state('domcontentloaded')
+        profile_url = profile_page.url 
+        # <-- [Gemini 逻辑结束] -->
+
+        if run_checkpoint is not None and profile_url in run_checkpoint.decided_urls:
+            # 卡片标识变化但链接相同: 上次已处理过
+            print(f"--- (续跑) 该简历上次已处理，跳过: {profile_url} ---")
+            await profile_page.close()
+            return "skipped", profile_url, fingerprint
+
+        if seen_index is not None:
+            # 先按链接判断，命中时不再等待正文、提取字段 (内容指纹要等取到简历文本后再判断)
+            reason = seen_index.should_skip(profile_url)
+            if reason:
+                print(f"--- 该候选人{reason}，跳过 ---")
+                await profile_page.close()
+                return "seen-skipped", profile_url, fingerprint
+
+        current_cv_selector = CV_TEXT_SELECTOR
+        extraction_started = time.perf_counter()
+        fields = None
+        if response_collector is not None:
+            async with wait_tracker.track("页面就绪"):
+                fields = await response_collector.take(profile_page)
+            if fields:
+                print("--- (网络捕获) 已从简历接口数据中解析字段 ---")
+            else:
+                print("--- (网络捕获) 未捕获到可用的简历接口数据，改用页面提取 ---")
+
+        if fields is None:
+            # 等待简历正文出现 (有上限)，代替固定的 2 秒等待
+            await wait_ready(profile_page, current_cv_selector)
+
+            # 一次页面内求值取出全部字段，缺失的字段不再各自等待 5 秒超时
+            fields = await extract_profile_fields(profile_page)
+        observe_metric("extraction", time.perf_counter() - extraction_started)
+        cv_text = fields["cv_text"]
+        if not cv_text:
+            print(f"提取简历文本失败。请检查选择器 {current_cv_selector}")
+            print("--- 调试SOP：请将这个新打开的“简历详情页”另存为 HTML，然后发给我。---")
+            await profile_page.close()
+            return "error", profile_url, fingerprint
+
+        fingerprint = content_fingerprint(cv_text)
+        raw_work_time = fields["work_time"]
+        work_time = format_work_time(raw_work_time) if raw_work_time else "" # <-- 应用格式化
+        if candidate_warehouse is not None:
+            # 无论后续是否合格，简历都入库，供以后的提纲离线重筛
+            try:
+                candidate_warehouse.upsert(
+                    cv_text, url=profile_url, name=(fields["name"] or "").strip().replace("*", ""),
+                    title=(fields["title"] or "").strip(), company=(fields["company"] or "").strip(),
+                    work_time=work_time.strip(), source=output_filename)
+            except sqlite3.Error as e:
+                print(f"--- 写入候选人库失败: {e} ---")
+
+        if seen_index is not None:
+            reason = seen_index.should_skip(fingerprint)
+            if reason:
+                print(f"--- 该候选人{reason}，跳过 ---")
+                await profile_page.close()
+                return "seen-skipped", profile_url, fingerprint
+
+        # 解析全部工作经历，用目标公司那一段的离职时间做日期过滤 (找不到时沿用页面上的在职时间)
+        history = parse_work_history(cv_text)
+        departure = select_departure_period(history, target_matcher) or work_time
+        if not departure:
+            print("--- 提取 [在职时间] 失败，跳过此人 ---")
+            await profile_page.close()
+            return "error", profile_url, fingerprint
+        if raw_work_time:
+            print(f"--- 提取在职时间: {work_time} (原始: {raw_work_time.strip()}) ---")
+        else:
+            work_time = departure
+        if departure != work_time:
+            print(f"--- 目标公司在职时间: {departure} (共解析 {len(history)} 段工作经历) ---")
+
+        if not is_departure_date_ok(departure, min_departure_str):
+            print(f"--- 日期不符: 候选人离职于 {departure} (要求不早于 {min_departure_str})，跳过 ---")
+            await profile_page.close()
+            return "date-rejected", profile_url, fingerprint
+        else:
+            print(f"--- 日期符合: {departure} (要求: {min_departure_str})，进入AI判断 ---")
+
+
+        if pre_screener is not None:
+            passed, stage = pre_screener.check(cv_text)
+            if not passed:
+                print(f"--- 本地预筛未通过 (阶段: {stage})，跳过 AI 判断 ---")
+                await profile_page.close()
+                return "prescreen-rejected", profile_url, fingerprint
+
+        await pause_controller.wait_if_paused()
+
+        # 异步请求: 等待判断期间其他 worker 的页面操作照常进行
+        with metric_span("llm"):
+            is_match = await llm_client.is_match(cv_text, briefing_text)
+        if is_match is None:
+            print("--- AI 暂时无法判断 (接口限流或出错)，不算淘汰，稍后重试 ---")
+            await profile_page.close()
+            return "ai-undecided", profile_url, fingerprint
+        if is_match:
+            print(f"AI 判断匹配: {profile_url}")
+            outcome = "contact-failed"  # 成功保存后改为 qualified
+
+            # 以下字段已在上面的单次求值中取得
+            name = fields["name"] or ""
+            gender = "" 
+            clean_name = "" 
+            company = fields["company"] or ""
+            title = fields["title"] or ""
+            contact_info = None
+            contact_image = ""
+            review = ""
+
+            if not name:
+                print("--- 提取 [姓名] 失败 ---")
+
+            info_text = fields["gender_info"]
+            if info_text:
+                gender_match = re.search(r'\s*(男|女)\s*', info_text)
+                if gender_match:
+                    gender = gender_match.group(1)
+                    print(f"--- G (G): {gender} ---")
+                else:
+                    print(f"--- 未能从 '{info_text}' 中提取到性别 ---")
+            else:
+                print("--- 提取 [性别] 失败 ---")
+
+            clean_name = name.strip().replace("*", "") # <-- 移除星号
+
+            if gender and "先生" not in clean_name and "女士" not in clean_name:
+                if gender == "男":
+                    clean_name = clean_name + "先生"
+                elif gender == "女":
+                    clean_name = clean_name + "女士"
+                print(f"--- 格式化后 [姓名]: {clean_name} ---")
+            else:
+                print(f"--- 成功提取到 [姓名]: {clean_name} (无需添加称谓) ---")
+
+            if company:
+                print(f"--- 成功提取到 [公司]: {company.strip()} ---")
+            else:
+                print("--- 提取 [公司] 失败 ---")
+
+            if title:
+                print(f"--- 成功提取到 [职位]: {title.strip()} ---")
+            else:
+                print("--- 提取 [职位] 失败 ---")
+
+            print(f"--- (确认) 在职时间: {work_time} ---")
+
+            contact_started = time.perf_counter()
+            try:
+                cloud_phone_selector = '#resume-detail-basic-info > div.basic-cont > dl > dd:nth-child(1) > span.view-phone-btn, span.view-phone-btn:has-text("查看云电话")'
+                cloud_phone_button = profile_page.locator(cloud_phone_selector).first
+
+                is_already_paid = False
+                try:
+                    await cloud_phone_button.wait_for(state="visible", timeout=3000) 
+                    print("--- (优先检查) 检测到“查看云电话”按钮，判定为已购买 ---")
+                    await cloud_phone_button.click(timeout=3000) # 点击它以显示号码
+                    await wait_ready(profile_page, CONTACT_READY_SELECTOR) # 等待号码加载
+                    is_already_paid = True
+                except Exception:
+                    print("--- (优先检查) 未检测到“查看云电话”按钮，判定为未购买 ---")
+                    is_already_paid = False
+
+                if not is_already_paid:
+                    contact_button_selector = 'button:has-text("联系"), .get-chat-btn'
+                    await profile_page.locator(contact_button_selector).first.click(timeout=5000)
+                    print("--- 已点击“查看联系方式”按钮 ---")
+
+                    try:
+                        pay_button_selector = 'button:has-text("立即获得"), button:has-text("确认支付"), button:has-text("立即打开"), button:has-text("立即获取")'
+                        pay_button = profile_page.locator(pay_button_selector).first
+
+                        await pay_button.wait_for(state="visible", timeout=3000) # 等待最多3秒
+                        print("--- 检测到支付弹窗，尝试点击支付按钮 ---")
+                        await pay_button.click()
+                        await wait_ready(profile_page, CONTACT_READY_SELECTOR) # 等待号码加载
+
+                    except Exception as e:
+                        print(f"--- 未检测到支付弹窗 (或处理出错: {e})，直接进入下一步 ---")
+                        pass
+
+                try:
+                    image_selector = 'img[src*="liepin.com/v1/getcontact"]' # 使用更通用的图片src选择器
+                    image_locator = profile_page.locator(image_selector).first
+                    async with wait_tracker.track("页面就绪"):
+                        await image_locator.wait_for(state="visible", timeout=5000)
+
+                    print("--- 检测到图片格式的联系方式，准备截图 ---")
+
+                    name_for_file = clean_name if clean_name else f"Unknown_contact_{i+1}"
+                    image_filename = f"{name_for_file}.png"
+                    image_path = os.path.join(os.getcwd(), image_filename)
+
+                    await image_locator.screenshot(path=image_path)
+
+                    contact_info = image_path # 无法识别时在Excel中记录图片的完整路径
+                    contact_image = image_path
+                    print(f"--- 成功截图并保存为: {image_path} ---")
+
+                    if contact_ocr is not None:
+                        number, confidence, confident = await contact_ocr.read(image_path)
+                        if confident:
+                            contact_info = f"云 {number}"
+                            print(f"--- 识别截图号码: {contact_info} (置信度 {confidence:.2f}) ---")
+                        else:
+                            review = f"识别结果 {number or '无'} (置信度 {confidence:.2f})"
+                            print(f"--- 截图号码识别不可靠: {review}，标记为待人工核对 ---")
+
+                except Exception:
+                    print("--- 未找到图片格式的联系方式，尝试提取文本格式 ---")
+                    try:
+                        # (不再固定等待 2 秒: 下面每个选择器都会等待其出现)
+                        phone_selectors = [
+                            'div.cloud-phone h3', 
+                            '.contact-phone-text', 
+                            '#resume-detail-basic-info > div.basic-cont > dl > dd:nth-child(1) > span.view-phone-btn',
+                            'span.view-phone-btn',  # 简化选择器
+                            '.basic-cont dl dd span'  # 一般性选择器
+                        ]
+
+                        phone_number = None
+                        for selector in phone_selectors:
+                            try:
+                                phone_locator = profile_page.locator(selector).first
+                                await phone_locator.wait_for(state="visible", timeout=5000)
+                                phone_number = await phone_locator.text_content()
+                                if phone_number and phone_number.strip():  # 确保获取到非空文本
+                                    break
+                            except Exception:
+                                continue  # 尝试下一个选择器
+
+                        if phone_number:
+                            cleaned_phone = phone_number.replace(" ", "") # 移除所有空格
+                            contact_info = f"云 {cleaned_phone}" # 云 后面加一个空格
+                            print(f"--- 成功提取文本联系方式: {contact_info} ---")
+                        else:
+                            print("--- 尝试从页面源码中查找电话号码 ---")
+                            page_content = await profile_page.content()
+                            phone_pattern = r'1[3-9]\d{9}'
+                            phone_matches = re.findall(phone_pattern, page_content)
+                            if phone_matches:
+                                contact_info = f"云 {phone_matches[0]}" # 匹配结果已经是无空格的
+                                print(f"--- 从页面源码中提取到电话号码: {contact_info} ---")
+                            else:
+                                raise ValueError("无法在页面上找到电话号码")
+                    except Exception:
+                        print("--- 提取图片和文本联系方式均失败 ---")
+                        raise ValueError("无法找到联系方式")
+
+                if contact_info:
+
+                    # --- [!!! 修改点 6: 更新合格计数器 n (并立即追加到流水文件) !!!] ---
+                    record_contact(CandidateRecord(
+                        name=clean_name,
+                        title=title.strip(),
+                        company=company.strip(),
+                        work_time=work_time.strip(), # work_time 已经是格式化后的
+                        contact=contact_info,
+                        url=profile_url,
+                        contact_image=contact_image,
+                        review=review,
+                        cv_ref=cv_store.put(cv_text),  # 简历全文存盘，记录中只保留哈希
+                    ))
+                    # --- [!!! 修改结束 !!!] ---
+                    if candidate_warehouse is not None:
+                        try:
+                            candidate_warehouse.set_contact(fingerprint, contact_info, contact_image, clean_name)
+                        except sqlite3.Error as e:
+                            print(f"--- 候选人库补记联系方式失败: {e} ---")
+                    outcome = "qualified"
+                    print(f"成功保存候选人: {clean_name}, 职位: {title.strip()}, 在职时间: {work_time.strip()}, 联系方式: {contact_info}")
+                else:
+                    if name:
+                        print(f"--- 成功提取了 {clean_name} 的信息，但提取联系方式失败 ---")
+
+            except Exception as e:
+                print(f"提取联系方式的整体流程(步骤6)出错: {e}")
+            observe_metric("contact", time.perf_counter() - contact_started)
+
+        else:
+            print("AI 判断不匹配，跳过。")
+            outcome = "ai-rejected"
+
+
+        await pause_controller.wait_if_paused()
+
+        await profile_page.close()
+
+        # --- [!!! 修改点 7: 打印当前进度 !!!] ---
+        with contacts_lock:
+            n = qualified_resumes_count
+            m = processed_resumes_count
+        print(f"--- 进度: {n}/{m} (合格/已看){progress_extras()} ---")
+        # --- [!!! 修改结束 !!!] ---
+        # (原先的 2-5 秒随机等待已移至 ProfilePacer, 作为全局打开间隔)
+        return outcome, profile_url, fingerprint
+
+    except Exception as e:
+        print(f"处理第 {i+1} 个链接时发生未知错误: {e}")
+        if 'profile_page' in locals() and not profile_page.is_closed():
+            await profile_page.close()
+
+        # --- [!!! 新增: 即使出错也打印进度 !!!] ---
+        with contacts_lock:
+            n = qualified_resumes_count
+            m = processed_resumes_count
+        print(f"--- (出错) 进度: {n}/{m} (合格/已看){progress_extras()} ---")
+        # --- [!!! 修改结束 !!!] ---
+        return "error", profile_url, fingerprint
+
+
+
+async def retry_undecided_profiles(new_page, items, pacer, briefing_text, min_departure_str, on_result):
+    """
+    重新处理本轮中 AI 无法判断的简历 (等待一个最大退避时间，让接口先恢复)。
+    items 为 [(序号, 页码, card_key, 简历链接), ...]；new_page 为创建空白页的协程函数；
+    每份简历处理完后调用 on_result(card_key, profile_url, fingerprint, outcome)。
+    """
+    print(f"\n--- 有 {len(items)} 份简历 AI 无法判断，{BACKOFF_MAX_SECONDS:.0f} 秒后重试 ---")
+    await asyncio.sleep(BACKOFF_MAX_SECONDS)
+    for i, page_no, card_key, url in items:
+        await pause_controller.wait_if_paused()
+        if pause_controller.draining:
+            return
+        async with navigation_tab() as attempt:
+            profile_page = await new_page()
+            try:
+                await goto_profile(profile_page, url, pacer)
+            except Exception as e:
+                print(f"--- (重试) 打开简历失败: {e} ---")
+                await profile_page.close()
+                attempt.fail()
+                continue
+            with metric_span("profile_total"):
+                outcome, profile_url, fingerprint = await process_profile(
+                    profile_page, i, page_no, briefing_text, min_departure_str, is_retry=True)
+            if outcome == "error":
+                attempt.fail()
+        on_result(card_key, profile_url or url, fingerprint, outcome)
+
+
+def build_default_briefing(target_company, target_position):
+    """根据公司和职位生成建议的访谈提纲。"""
+    return f"""
+访谈提纲核心要求：
+1. 必须有在 {target_company} 的工作经历。
+2. 职位与 {target_position} 相关。
+"""
+
+
+async def prompt_search_job():
+    """
+    交互式询问一轮搜索的条件，返回 job 字典:
+    company / position / briefing / output_filename / min_departure
+    (input() 放到线程中等待，等待输入期间事件循环上的控制接口、暂停控制照常响应)
+    """
+    target_company = (await asyncio.to_thread(input, "请输入目标公司 (例如: 腾讯): ")).strip()
+    target_position = (await asyncio.to_thread(input, "请输入目标职位 (例如: 产品经理): ")).strip()
+
+    # 建议一个 briefing
+    default_briefing = build_default_briefing(target_company, target_position)
+    print("\n--- 建议的访谈提纲 ---")
+    print(default_briefing)
+    print("------------------------")
+    
+    # 让用户选择
+    use_default = (await asyncio.to_thread(input, "是否使用上述建议提纲? (Y/n): ")).strip().lower()
+    
+    if use_default == 'n':
+        print("请输入你的自定义访谈提纲 (在最后一行输入 'END' 并按 Enter 结束):")
+        lines = []
+        while True:
+            line = await asyncio.to_thread(input)
+            if line.strip().upper() == "END":
+                break
+            lines.append(line)
+        briefing_text = "\n".join(lines)
+    else:
+        briefing_text = default_briefing
+        
+    # --- [!!! 修改点 4: 获取输出文件名 !!!] ---
+    # 获取文件名
+    default_filename = f"{target_company}_{target_position}_contacts.xlsx"
+    user_filename = (await asyncio.to_thread(input, f"请输入输出文件名 (默认: {default_filename}): ")).strip()
     if not user_filename:
         output_filename = default_filename
     else:
@@ -315,7 +3082,7 @@ async def main():
     # --- [!!! 修改结束 !!!] ---
         
     # --- [!!! 新增: 获取最早离职年限 !!!] ---
-    min_departure_str = input("请输入最早离职年限 (格式: YY/M, 例如 24/4。若要求在职请输入 'Present'): ").strip()
+    min_departure_str = (await asyncio.to_thread(input, "请输入最早离职年限 (格式: YY/M, 例如 24/4。若要求在职请输入 'Present'): ")).strip()
     if not min_departure_str:
         min_departure_str = "00/1"  # 设一个极早的默认值
         print("--- 未输入最早离职年限，默认不过滤 ---")
@@ -327,326 +3094,269 @@ async def main():
     print(f"最早离职: {min_departure_str}") # <-- 新增
     print(f"提纲: \n{briefing_text}")
     print("------------------\n")
+    return {
+        "company": target_company,
+        "position": target_position,
+        "briefing": briefing_text,
+        "output_filename": output_filename,
+        "min_departure": min_departure_str,
+    }
+
+
+async def submit_search(page, target_company, target_position, wait_for_enter=True):
+    """打开搜索页，输入 "公司 职位" 并提交，等待结果卡片出现。"""
+    await page.goto(SEARCH_PAGE_URL) # 假设这是搜索页
+
+    if wait_for_enter:
+        print("--- 浏览器已打开，页面已加载 ---")
+        print("--- 按 Enter 键以执行搜索... ---")
+        await asyncio.to_thread(input)
+
+    # <-- [Gemini 已保留你的修改] -->
+    await page.fill('input#rc_select_1, input.search-input, input.company-position-input, .search-box, .search-input', f"{target_company} {target_position}")
+    await page.click('button:has-text("搜 索"), button:has-text("搜索"), .search-btn, .submit-btn')
+
+    print("搜索已提交，等待结果加载...")
+    # 结果卡片出现即可开始，不再等待 networkidle + 固定 2 秒
+    if not await wait_ready(page, RESUME_LINK_SELECTOR, timeout=SEARCH_READY_TIMEOUT_MS):
+        print("--- 等待搜索结果超时，继续尝试 ---")
+
+
+# -------------------------------------------------------------------
+# 3. 主自动化流程
+# -------------------------------------------------------------------
+async def main(browser_manager=None, job=None, client=None, rates=None):
+    """
+    执行一轮搜索。browser_manager 由 run_with_pause_control() 传入以在多轮之间复用浏览器；
+    单独调用 asyncio.run(main()) 时会临时创建一个，并在结束时关闭。
+    job: 搜索条件字典 (格式同 prompt_search_job())，传入时不再询问任何输入 (非交互运行)；
+    可额外包含 "resume": True 表示从检查点续跑。
+    client / rates: 批量模式由 run_batch() 传入，多个任务共用同一个 AI 客户端 (连接池、判断缓存)
+    和限速器 (RateController)；不传时本轮临时创建。
+    返回本轮摘要 (见 run_summary)，未找到登录文件时返回 None。
+    """
+    
+    # --- [!!! 修改点 3: 使用全局变量 !!!] ---
+    global saved_contacts, output_filename, contacts_lock, qualified_resumes_count, processed_resumes_count
+    global llm_client, verdict_cache, pre_screener, card_screener, target_matcher, contact_journal, run_checkpoint, seen_index, wait_tracker
+    global selector_stats, response_collector, resource_blocker, run_metrics, cv_store, contact_ocr, rate_controller
+    global candidate_warehouse
+    
+    # --- 1. 定义你的每日需求 (已修改为动态输入) ---
+    print("\n--- 1. 定义你的每日需求 ---")
+    
+    # 清空上一轮的数据
+    with contacts_lock:
+        saved_contacts.clear()
+        qualified_resumes_count = 0 # <-- 重置计数器 n
+        processed_resumes_count = 0 # <-- 重置计数器 m
+        
+    interactive = job is None
+    if interactive:
+        job = await prompt_search_job()
+    target_company = job["company"]
+    target_position = job["position"]
+    briefing_text = job["briefing"]
+    output_filename = job["output_filename"] # 设置全局 output_filename
+    min_departure_str = job["min_departure"]
     # --- 动态输入结束 ---
 
+    pre_screener = PreScreener(target_company, target_position, briefing_text) if PRESCREEN_ENABLED else None
+    card_screener = CardScreener(target_company, target_position, briefing_text, min_departure_str) if CARD_PRESCREEN_ENABLED else None
+    target_matcher = compile_terms([target_company] + COMPANY_ALIASES.get(target_company, []))
+    pause_controller.bind()
+
 
     # --- 2. 初始化浏览器和数据存储 ---
     # saved_contacts = [] # <-- 已移至全局
     
-    if not os.path.exists("state.json"):
+    if not BROWSER_CDP_URL and not os.path.exists("state.json"):
         print("错误：未找到 state.json 登录文件。")
         print("请先运行 save_session() 函数并手动登录一次。")
         return
 
-    async with async_playwright() as p:
-        # headless=False 可以在调试时看到浏览器窗口
-        browser = await p.chromium.launch(headless=False, channel='chrome')
-        context = await browser.new_context(storage_state="state.json")
-        page = await context.new_page()
+    # --- 检查点: 上次同一搜索未正常结束时，可选择从中断处继续 ---
+    checkpoint_path = checkpoint_path_for(output_filename)
+    previous = RunCheckpoint.peek(checkpoint_path)
+    unfinished = previous is not None and not previous[1]
+    # 非交互的 "resume": 只有上次确实未正常结束时才续跑；没有检查点或已完成的从头开始
+    resume = bool(job.get("resume")) and unfinished
+    if job.get("resume") and not unfinished:
+        print("--- 没有未完成的检查点，从头开始本轮搜索 ---")
+    if interactive and unfinished and previous[0]:
+        choice = (await asyncio.to_thread(
+            input, f"检测到上次未完成的运行 (已处理 {previous[0]} 个简历)，是否从中断处继续? (Y/n): ")).strip().lower()
+        resume = choice != 'n'
+
+    run_checkpoint = RunCheckpoint(checkpoint_path, resume=resume)
+    contact_journal = ContactJournal(journal_path_for(output_filename), reset=not resume)
+    cv_store = CVStore()
+    if resume:
+        restored = [CandidateRecord.from_journal(row, cv_store) for row in contact_journal.read_all()]
+        with contacts_lock:
+            saved_contacts.extend(restored)
+            qualified_resumes_count = len(restored)
+            processed_resumes_count = len(run_checkpoint.decided)
+        print(f"--- 已恢复 {len(restored)} 位合格候选人，将跳过 {len(run_checkpoint.decided)} 个已处理的简历 ---")
+    print(f"--- 合格候选人将实时追加到: {contact_journal.path} ---")
+
+    # 每轮运行共用一个带连接池的 AI 客户端，前面挂一层持久化判断缓存
+    run_metrics = RunMetrics()
+    rate_controller = rates or RateController()
+    wait_tracker = WaitTracker()
+    selector_stats = SelectorStats()
+    owns_client = client is None
+    verdict_cache = VerdictCache() if owns_client else client.cache
+    contact_ocr = open_contact_ocr()
+    seen_index = SeenIndex(scope=seen_scope_for(job)) if SEEN_INDEX_ENABLED else None
+    if seen_index is not None:
+        print(f"--- 已处理候选人索引: {len(seen_index)} 条记录 ---")
+    candidate_warehouse = CandidateWarehouse() if WAREHOUSE_ENABLED else None
+    owns_browser = browser_manager is None
+    if owns_browser:
+        browser_manager = BrowserManager()
+    run_summary = {
+        "company": target_company,
+        "position": target_position,
+        "output_filename": output_filename,
+        "status": "ok",
+        "cards": 0,
+        "processed": 0,
+        "qualified": 0,
+        "undecided": 0,
+    }
+    started = time.perf_counter()
+    if owns_client:
+        client_context = VolcScreeningClient(cache=verdict_cache, limiter=rate_controller.api)
+    else:
+        client_context = contextlib.nullcontext(client)
+    async with client_context as client:
+        llm_client = BatchScreener(client) if LLM_BATCH_MODE else client
+        page = await browser_manager.new_page()
+        context = browser_manager.context
+        resource_blocker = browser_manager.resource_blocker
+        response_collector = browser_manager.response_collector
 
         print("--- 自动化流程启动 ---")
 
         try:
             # --- 3. 访问搜索页并搜索 ---
-            await page.goto("https://h.liepin.com/search/getConditionItem") # 假设这是搜索页
-            
-            print("--- 浏览器已打开，页面已加载 ---")
-            print("--- 按 Enter 键以执行搜索... ---")
-            input()
-            
-            # <-- [Gemini 已保留你的修改] -->
-            await page.fill('input#rc_select_1, input.search-input, input.company-position-input, .search-box, .search-input', f"{target_company} {target_position}")
-            await page.click('button:has-text("搜 索"), button:has-text("搜索"), .search-btn, .submit-btn')
-
-            print("搜索已提交，等待结果加载...")
-            await page.wait_for_load_state('networkidle', timeout=10000)
+            await submit_search(page, target_company, target_position, wait_for_enter=interactive)
 
-            # Wait for page to load
-            await page.wait_for_timeout(2000)  # 2-second wait for page to load
-            
             profile_link_selector = RESUME_LINK_SELECTOR
             print(f"--- 使用预设选择器: '{profile_link_selector}' ---")
-            
-            profile_links_locators = await page.locator(profile_link_selector).all()
-            
-            if not profile_links_locators:
-                print(f"依然未找到简历链接，请检查你的选择器: '{profile_link_selector}'")
-                await browser.close()
-                return
 
-            # --- [!!! 修改: 获取总数 !!!] ---
-            total_links = len(profile_links_locators)
-            print(f"共找到 {total_links} 个简历链接，开始筛选...")
-            # --- [!!! 修改结束 !!!] ---
+            # --- [!!! 流式处理: 逐页遍历搜索结果 + 有界 worker 池 !!!] ---
+            # opener 按顺序点击卡片打开简历页 (必须在翻页前点完当前页)，
+            # 打开的页面交给 worker 并发处理；当前页点完后立即翻到下一页，
+            # 翻页加载与 worker 处理同时进行。
+            pacer = ProfilePacer(*PROFILE_OPEN_INTERVAL_MS)
+            worker_count = max(1, MAX_CONCURRENT_TABS)
+            # 同时打开的简历页数: 导航通道的并发上限 (不超过 worker 数，被限流时自动减少)
+            tab_slots = rate_controller.navigation
+            queue = asyncio.Queue()
+            cards_seen = 0
+            undecided = []  # AI 无法判断的简历，本轮结束前重试
+            still_undecided = set()  # 重试后仍无法判断的 card_key (检查点保持未完成，下次可续跑)
+            print(f"--- 启动 {worker_count} 个并发标签页 worker ---")
 
-            for i, link_locator in enumerate(profile_links_locators): 
-                
-                # --- [!!! 修改点 5: 更新已处理计数器 m !!!] ---
-                with contacts_lock:
-                    processed_resumes_count = i + 1
-                
-                print(f"\n--- 正在处理第 {i+1} / {total_links} 个简历 ---")
-                # --- [!!! 修改结束 !!!] ---
-                
-                # 检查是否需要暂停
-                while not pause_flag.is_set():
-                    time.sleep(0.1)  # 暂停时短暂休眠
-                
+            async def opener():
+                nonlocal cards_seen
                 try:
-                    # <-- [Gemini 已确认] -->
-                    async with context.expect_page() as new_page_info:
-                        await link_locator.click(timeout=5000) # 点击你找到的SOP'器
-                    
-                    profile_page = await new_page_info.value
-                    await profile_page.wait_for_load_state('domcontentloaded')
-                    profile_url = profile_page.url 
-                    # <-- [Gemini 逻辑结束] -->
-
-
-                    # Wait for page to load
-                    await profile_page.wait_for_timeout(2000)  # 2-second wait for page to load
-                    current_cv_selector = CV_TEXT_SELECTOR
-                    print(f"--- 使用预设CV文本选择器: '{current_cv_selector}' ---")
-                    
-                    cv_text = "" # 初始化
-                    try:
-                        cv_text = await profile_page.locator(current_cv_selector).text_content(timeout=5000)
-                    except Exception as e:
-                        print(f"提取简历文本失败: {e}。请检查选择器 {current_cv_selector}")
-                        print("--- 调试SOP：请将这个新打开的“简历详情页”另存为 HTML，然后发给我。---")
-                        await profile_page.close()
-                        continue
-                    
-                    work_time_selector = 'div.work-time, .work-duration, .time-text, .work-time-text, .contact-time, span.rd-work-time'
-                    raw_work_time = ""
-                    work_time = ""
-                    try:
-                        raw_work_time = await profile_page.locator(work_time_selector).first.text_content(timeout=5000)
-                        work_time = format_work_time(raw_work_time) # <-- 应用格式化
-                        print(f"--- 提取在职时间: {work_time} (原始: {raw_work_time.strip()}) ---")
-                    except Exception as e:
-                        print(f"--- 提取 [在职时间] 失败: {e}，跳过此人 ---")
-                        await profile_page.close()
-                        continue
+                    async for i, page_no, link_locator, card_text in iter_result_cards(page, MAX_RESULT_PAGES):
+                        await pause_controller.wait_if_paused()
+                        if pause_controller.draining:
+                            print("--- (drain) 不再打开新的简历，等待已打开的处理完毕 ---")
+                            break
+                        cards_seen += 1
+                        card_key = await get_card_key(link_locator)
+                        if run_checkpoint.is_decided(card_key):
+                            print(f"--- (续跑) 第 {i+1} 个简历上次已处理 ({run_checkpoint.decided[card_key]})，跳过 ---")
+                            continue
+                        if seen_index is not None:
+                            reason = seen_index.should_skip(card_key)
+                            if reason:
+                                print(f"--- 第 {i+1} 个简历{reason}，不再打开 ---")
+                                continue
+                        if card_screener is not None and card_text:
+                            passed, stage = card_screener.check(card_text)
+                            if not passed:
+                                print(f"--- 第 {i+1} 个简历卡片预筛未通过 (阶段: {stage})，不打开 ---")
+                                count_event("outcome:card-rejected")
+                                run_checkpoint.record(card_key, None, "card-rejected")
+                                continue
 
-                    if not is_departure_date_ok(work_time, min_departure_str):
-                        print(f"--- 日期不符: 候选人离职于 {work_time} (要求不早于 {min_departure_str})，跳过 ---")
-                        await profile_page.close()
-                        continue
-                    else:
-                        print(f"--- 日期符合: {work_time} (要求: {min_departure_str})，进入AI判断 ---")
-
-
-                    while not pause_flag.is_set():
-                        time.sleep(0.1)
-                    
-                    if is_match_volc(cv_text, briefing_text):
-                        print(f"AI 判断匹配: {profile_url}")
-                        
-                        name = ""
-                        gender = "" 
-                        clean_name = "" 
-                        company = ""
-                        title = ""
-                        contact_info = None
-
-                        name_selector = 'div.resume-preview-name, .person-name, .resume-name, .name-text, .contact-name, h4.name'
-                        gender_info_selector = 'div.basic-cont > div.sep-info' # 包含性别、年龄、地区的行
-                        company_selector = 'div.company-name, .work-company, .company-text, .company-title, .contact-company, div.rd-work-comp > h5'
-                        title_selector = 'div.position-name, .work-position, .position-text, .position-title, .contact-position, h6.job-name'
-                        
-                        try:
-                            name = await profile_page.locator(name_selector).first.text_content(timeout=5000) # 5秒超时
-                        except Exception as e:
-                            print(f"--- 提取 [姓名] 失败: {e} ---")
-                            pass
-                        
-                        try:
-                            info_text = await profile_page.locator(gender_info_selector).first.inner_text(timeout=5000)
-                            gender_match = re.search(r'\s*(男|女)\s*', info_text)
-                            if gender_match:
-                                gender = gender_match.group(1)
-                                print(f"--- G (G): {gender} ---")
-                            else:
-                                print(f"--- 未能从 '{info_text}' 中提取到性别 ---")
-                        except Exception as e:
-                            print(f"--- 提取 [性别] 失败: {e} ---")
-                            pass
-
-                        clean_name = name.strip().replace("*", "") # <-- 移除星号
-                        
-                        if gender and "先生" not in clean_name and "女士" not in clean_name:
-                            if gender == "男":
-                                clean_name = clean_name + "先生"
-                            elif gender == "女":
-                                clean_name = clean_name + "女士"
-                            print(f"--- 格式化后 [姓名]: {clean_name} ---")
-                        else:
-                            print(f"--- 成功提取到 [姓名]: {clean_name} (无需添加称谓) ---")
-                        
-                        try:
-                            company = await profile_page.locator(company_selector).first.text_content(timeout=5000)
-                            print(f"--- 成功提取到 [公司]: {company.strip()} ---")
-                        except Exception as e:
-                            print(f"--- 提取 [公司] 失败: {e} ---")
-                            pass
-                            
+                        await tab_slots.acquire_slot()
                         try:
-                            title = await profile_page.locator(title_selector).first.text_content(timeout=5000)
-                            print(f"--- 成功提取到 [职位]: {title.strip()} ---")
+                            profile_page = await open_profile(context, link_locator, pacer)
                         except Exception as e:
-                            print(f"--- 提取 [职位] 失败: {e} ---")
-                            pass
-                            
-                        print(f"--- (确认) 在职时间: {work_time} ---")
+                            await tab_slots.release(False, 0.0)
+                            print(f"打开第 {i+1} 个简历时出错: {e}")
+                            run_checkpoint.record(card_key, None, "error")
+                            continue
+                        queue.put_nowait((i, page_no, card_key, profile_page))
+                finally:
+                    for _ in range(worker_count):
+                        queue.put_nowait(None)  # 通知 worker 结束
 
-                        try:
-                            cloud_phone_selector = '#resume-detail-basic-info > div.basic-cont > dl > dd:nth-child(1) > span.view-phone-btn, span.view-phone-btn:has-text("查看云电话")'
-                            cloud_phone_button = profile_page.locator(cloud_phone_selector).first
-                            
-                            is_already_paid = False
-                            try:
-                                await cloud_phone_button.wait_for(state="visible", timeout=3000) 
-                                print("--- (优先检查) 检测到“查看云电话”按钮，判定为已购买 ---")
-                                await cloud_phone_button.click(timeout=3000) # 点击它以显示号码
-                                await profile_page.wait_for_timeout(2000) # 等待号码加载
-                                is_already_paid = True
-                            except Exception:
-                                print("--- (优先检查) 未检测到“查看云电话”按钮，判定为未购买 ---")
-                                is_already_paid = False
-
-                            if not is_already_paid:
-                                contact_button_selector = 'button:has-text("联系"), .get-chat-btn'
-                                await profile_page.locator(contact_button_selector).first.click(timeout=5000)
-                                print("--- 已点击“查看联系方式”按钮 ---")
-
-                                try:
-                                    pay_button_selector = 'button:has-text("立即获得"), button:has-text("确认支付"), button:has-text("立即打开"), button:has-text("立即获取")'
-                                    pay_button = profile_page.locator(pay_button_selector).first
-                                    
-                                    await pay_button.wait_for(state="visible", timeout=3000) # 等待最多3秒
-                                    print("--- 检测到支付弹窗，尝试点击支付按钮 ---")
-                                    await pay_button.click()
-                                    await profile_page.wait_for_timeout(2000)
-
-                                except Exception as e:
-                                    print(f"--- 未检测到支付弹窗 (或处理出错: {e})，直接进入下一步 ---")
-                                    pass
-                            
-                            try:
-                                image_selector = 'img[src*="liepin.com/v1/getcontact"]' # 使用更通用的图片src选择器
-                                image_locator = profile_page.locator(image_selector).first
-                                await image_locator.wait_for(state="visible", timeout=5000)
-                                
-                                print("--- 检测到图片格式的联系方式，准备截图 ---")
-                                
-                                name_for_file = clean_name if clean_name else f"Unknown_contact_{i+1}"
-                                image_filename = f"{name_for_file}.png"
-                                image_path = os.path.join(os.getcwd(), image_filename)
-                                
-                                await image_locator.screenshot(path=image_path)
-                                
-                                contact_info = image_path # 在Excel中记录图片的完整路径
-                                print(f"--- 成功截图并保存为: {image_path} ---")
+            def record_outcome(card_key, profile_url, fingerprint, outcome):
+                count_event(f"outcome:{outcome}")
+                run_checkpoint.record(card_key, profile_url, outcome)
+                if seen_index is not None:
+                    seen_index.mark([card_key, profile_url, fingerprint], outcome)
+                if outcome == "ai-undecided":
+                    still_undecided.add(card_key)
+                else:
+                    still_undecided.discard(card_key)
 
-                            except Exception:
-                                print("--- 未找到图片格式的联系方式，尝试提取文本格式 ---")
-                                try:
-                                    await profile_page.wait_for_timeout(2000)  # 等待2秒让联系方式加载
-                                    
-                                    phone_selectors = [
-                                        'div.cloud-phone h3', 
-                                        '.contact-phone-text', 
-                                        '#resume-detail-basic-info > div.basic-cont > dl > dd:nth-child(1) > span.view-phone-btn',
-                                        'span.view-phone-btn',  # 简化选择器
-                                        '.basic-cont dl dd span'  # 一般性选择器
-                                    ]
-                                    
-                                    phone_number = None
-                                    for selector in phone_selectors:
-                                        try:
-                                            phone_locator = profile_page.locator(selector).first
-                                            await phone_locator.wait_for(state="visible", timeout=5000)
-                                            phone_number = await phone_locator.text_content()
-                                            if phone_number and phone_number.strip():  # 确保获取到非空文本
-                                                break
-                                        except Exception:
-                                            continue  # 尝试下一个选择器
-                                    
-                                    if phone_number:
-                                        cleaned_phone = phone_number.replace(" ", "") # 移除所有空格
-                                        contact_info = f"云 {cleaned_phone}" # 云 后面加一个空格
-                                        print(f"--- 成功提取文本联系方式: {contact_info} ---")
-                                    else:
-                                        print("--- 尝试从页面源码中查找电话号码 ---")
-                                        page_content = await profile_page.content()
-                                        phone_pattern = r'1[3-9]\d{9}'
-                                        phone_matches = re.findall(phone_pattern, page_content)
-                                        if phone_matches:
-                                            contact_info = f"云 {phone_matches[0]}" # 匹配结果已经是无空格的
-                                            print(f"--- 从页面源码中提取到电话号码: {contact_info} ---")
-                                        else:
-                                            raise ValueError("无法在页面上找到电话号码")
-                                except Exception:
-                                    print("--- 提取图片和文本联系方式均失败 ---")
-                                    raise ValueError("无法找到联系方式")
-
-                            if contact_info:
-                                
-                                # --- [!!! 修改点 6: 更新合格计数器 n !!!] ---
-                                with contacts_lock:
-                                    saved_contacts.append({
-                                        "姓名": clean_name,
-                                        "职位": title.strip(),
-                                        "在职公司": company.strip(),
-                                        "在职时间": work_time.strip(), # work_time 已经是格式化后的
-                                        "云号码": contact_info,
-                                        "简历链接": profile_url,
-                                        "Profile": cv_text
-                                    })
-                                    qualified_resumes_count += 1 # <-- 合格计数器+1
-                                # --- [!!! 修改结束 !!!] ---
-                                print(f"成功保存候选人: {clean_name}, 职位: {title.strip()}, 在职时间: {work_time.strip()}, 联系方式: {contact_info}")
-                            else:
-                                if name:
-                                    print(f"--- 成功提取了 {clean_name} 的信息，但提取联系方式失败 ---")
+            async def worker():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    i, page_no, card_key, profile_page = item
+                    ok = False
+                    try:
+                        with metric_span("profile_total"):
+                            outcome, profile_url, fingerprint = await process_profile(
+                                profile_page, i, page_no, briefing_text, min_departure_str)
+                        # 页面打开了却提取不到内容 (常见于验证码 / 拦截页) 也视为导航失败
+                        ok = outcome != "error"
+                    finally:
+                        await tab_slots.release(ok, 0.0)
+                    record_outcome(card_key, profile_url, fingerprint, outcome)
+                    if outcome == "ai-undecided" and profile_url:
+                        undecided.append((i, page_no, card_key, profile_url))
 
-                        except Exception as e:
-                            print(f"提取联系方式的整体流程(步骤6)出错: {e}")
-                    
-                    else:
-                        print("AI 判断不匹配，跳过。")
-
-                    
-                    while not pause_flag.is_set():
-                        time.sleep(0.1)
-                    
-                    await profile_page.close()
-                    
-                    # --- [!!! 修改点 7: 打印当前进度 !!!] ---
-                    with contacts_lock:
-                        n = qualified_resumes_count
-                        m = processed_resumes_count
-                    print(f"--- 进度: {n}/{m} (合格/已看) ---")
-                    # --- [!!! 修改结束 !!!] ---
+            # opener 出错时 (例如 NavigationBlocked) 其 finally 仍会发出结束信号:
+            # 等所有 worker 处理完已打开的标签页后再抛出，避免下面的 finally 关闭页面/浏览器时 worker 仍在运行
+            results = await asyncio.gather(opener(), *(worker() for _ in range(worker_count)), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
 
-                    await page.wait_for_timeout(random.randint(2000, 5000)) # 暂停2-5秒
+            if undecided and LLM_UNDECIDED_RETRY and not pause_controller.draining:
+                await retry_undecided_profiles(context.new_page, undecided, pacer, briefing_text,
+                                               min_departure_str, record_outcome)
 
-                except Exception as e:
-                    print(f"处理第 {i+1} 个链接时发生未知错误: {e}")
-                    if 'profile_page' in locals() and not profile_page.is_closed():
-                        await profile_page.close()
-                    
-                    # --- [!!! 新增: 即使出错也打印进度 !!!] ---
-                    with contacts_lock:
-                        n = qualified_resumes_count
-                        m = processed_resumes_count
-                    print(f"--- (出错) 进度: {n}/{m} (合格/已看) ---")
-                    # --- [!!! 修改结束 !!!] ---
-                    continue
+            run_summary["cards"] = cards_seen
+            run_summary["undecided"] = len(still_undecided)
+            if not cards_seen:
+                print(f"依然未找到简历链接，请检查你的选择器: '{profile_link_selector}'")
+                run_summary["status"] = "no-results"
+            else:
+                print(f"--- 共遍历 {cards_seen} 个简历卡片 ---")
+                if still_undecided:
+                    print(f"--- 仍有 {len(still_undecided)} 份简历 AI 无法判断，下次运行选择续跑即可重试 ---")
+                elif not pause_controller.draining:
+                    run_checkpoint.mark_completed()  # drain 提前结束的运行保留检查点，可续跑
+                if pause_controller.draining:
+                    run_summary["status"] = "drained"
 
         except Exception as e:
             print(f"主流程发生严重错误: {e}")
+            run_summary["status"] = "error"
+            run_summary["error"] = str(e)
         
         finally:
             # --- [!!! 修改点 8: 调用新的保存函数 (已包含进度) !!!] ---
@@ -654,46 +3364,577 @@ async def main():
             save_data_to_excel() # 使用新的保存函数
             # --- [!!! 修改结束 !!!] ---
 
-            await browser.close()
-            print("浏览器已关闭。")
+            if not page.is_closed():
+                await page.close()
+            if owns_browser:
+                await browser_manager.close()
+                print("浏览器已关闭。")
+            print(f"--- 时间统计: {wait_tracker.summary()} ---")
+            print(f"--- 限速: {rate_controller.summary()} ---")
+            if resource_blocker is not None:
+                print(f"--- (精简模式) {resource_blocker.summary()} ---")
+            print("--- 分阶段耗时 ---")
+            print(run_metrics.summary_text())
+            run_metrics.export(metrics_path_for(output_filename))
+            selector_stats.save()
+            if owns_client:
+                verdict_cache.close()
+            if contact_ocr is not None:
+                contact_ocr.close()
+            contact_journal.close()
+            run_checkpoint.close()
+            if seen_index is not None:
+                seen_index.close()
+            if candidate_warehouse is not None:
+                print(f"--- 本轮 {candidate_warehouse.stored} 份简历已存入候选人库 ({candidate_warehouse.path}) ---")
+                candidate_warehouse.close()
+            with contacts_lock:
+                run_summary["processed"] = processed_resumes_count
+                run_summary["qualified"] = qualified_resumes_count
+            run_summary["seconds"] = round(time.perf_counter() - started, 1)
+    return run_summary
+
+# -------------------------------------------------------------------
+# 4. 多账号多进程分片运行
+# -------------------------------------------------------------------
+# 协调进程负责搜索并收集简历链接，按轮询分发到各 worker 的队列；
+# 每个 worker 是独立进程，使用自己的浏览器和登录文件 (SHARD_STATE_FILES)。
+# worker 自己的队列空了会从其他 worker 的队列"偷"任务 (work stealing)，
+# 每个 worker 最多处理 SHARD_WORKER_QUOTA 份简历，避免单个账号被限流。
+# 结束后把各 worker 的流水文件合并、去重，导出为一个 Excel。
+
+CARD_URL_JS = """
+el => {
+    const link = el.closest('a[href]') || (el.closest('li, .resume-card, .new-resume-card') || el).querySelector('a[href]');
+    return link ? link.href : null;
+}
+"""
+
+
+async def get_card_profile_url(link_locator):
+    """从结果卡片中读取简历详情页链接 (不点击)；读不到返回 None。"""
+    try:
+        return await link_locator.evaluate(CARD_URL_JS, timeout=3000)
+    except Exception:
+        return None
+
+
+def shard_output_path(filename, worker_id):
+    """worker 各自的输出文件名，例如 a_contacts.xlsx -> a_contacts.shard1.xlsx"""
+    base, ext = os.path.splitext(filename)
+    return f"{base}.shard{worker_id}{ext}"
+
+
+def take_shard_item(worker_id, queues):
+    """先取自己的队列，空了再依次从其他 worker 的队列偷一个。返回 (任务, 是否偷来的)。"""
+    order = [worker_id] + [k for k in range(len(queues)) if k != worker_id]
+    for k in order:
+        try:
+            return queues[k].get_nowait(), k != worker_id
+        except QueueEmpty:
+            continue
+    return None, False
+
+
+def use_shard_quota(counter):
+    """账号 0 的配额计数 +1 (协调进程与 worker 0 共用同一账号，共享一个跨进程计数)。"""
+    with counter.get_lock():
+        counter.value += 1
+
+
+async def collect_profile_urls(job, state_file, queues, account_opens=None):
+    """
+    协调进程: 执行搜索，逐页收集简历链接并轮询分发到各 worker 队列。返回分发数量。
+    协调进程使用第一个账号 (与 worker 0 相同)，为读取链接而打开的简历页计入该账号的配额
+    (account_opens 为与 worker 0 共享的 multiprocessing.Value)；配额用完后不再打开，没有链接的卡片跳过。
+    """
+    global wait_tracker, card_screener
+    wait_tracker = WaitTracker()
+    if CARD_PRESCREEN_ENABLED:
+        card_screener = CardScreener(job["company"], job["position"], job["briefing"], job["min_departure"])
+    seen = SeenIndex(scope=seen_scope_for(job)) if SEEN_INDEX_ENABLED else None
+    browser_manager = BrowserManager(cdp_url="", storage_state=state_file)
+    pacer = ProfilePacer(*PROFILE_OPEN_INTERVAL_MS)
+    dispatched = 0
+    urls = set()
+    try:
+        page = await browser_manager.new_page()
+        await submit_search(page, job["company"], job["position"], wait_for_enter=False)
+        async for i, page_no, link_locator, card_text in iter_result_cards(page, MAX_RESULT_PAGES):
+            card_key = await get_card_key(link_locator)
+            if seen is not None and seen.should_skip(card_key):
+                continue
+            if card_screener is not None and card_text and not card_screener.check(card_text)[0]:
+                continue
+            url = await get_card_profile_url(link_locator)
+            if not url:
+                # 卡片上没有链接: 打开一次读取地址 (计入账号 0 的配额)
+                if account_opens is not None:
+                    if account_opens.value >= SHARD_WORKER_QUOTA:
+                        print(f"--- (协调) 账号 0 已达到配额 {SHARD_WORKER_QUOTA}，第 {i+1} 个简历没有链接，跳过 ---")
+                        continue
+                    use_shard_quota(account_opens)
+                try:
+                    profile_page = await open_profile(browser_manager.context, link_locator, pacer)
+                    url = profile_page.url
+                    await profile_page.close()
+                except Exception as e:
+                    print(f"--- (协调) 无法获取第 {i+1} 个简历的链接: {e} ---")
+                    continue
+            if url in urls:
+                continue
+            urls.add(url)
+            queues[dispatched % len(queues)].put((i, page_no, card_key, url))
+            dispatched += 1
+    finally:
+        await browser_manager.close()
+        if seen is not None:
+            seen.close()
+    if card_screener is not None:
+        print(f"--- (协调) {card_screener.stats_text()} ---")
+    return dispatched
+
+
+async def shard_worker_main(worker_id, state_file, job, queues, collection_done, account_opens=None):
+    """
+    worker 进程: 用自己的浏览器/账号处理队列中的简历链接，结果写入自己的流水文件。
+    account_opens: worker 0 与协调进程共用账号时的共享配额计数 (其他 worker 为 None，各自计数)。
+    """
+    global output_filename, llm_client, verdict_cache, pre_screener, contact_journal, seen_index, wait_tracker
+    global selector_stats, response_collector, resource_blocker, run_metrics, cv_store, contact_ocr, target_matcher
+    global rate_controller, candidate_warehouse
+
+    output_filename = shard_output_path(job["output_filename"], worker_id)
+    rate_controller = RateController()
+    target_matcher = compile_terms([job["company"]] + COMPANY_ALIASES.get(job["company"], []))
+    run_metrics = RunMetrics()
+    cv_store = CVStore()
+    pre_screener = PreScreener(job["company"], job["position"], job["briefing"]) if PRESCREEN_ENABLED else None
+    contact_journal = ContactJournal(journal_path_for(output_filename), reset=True)
+    wait_tracker = WaitTracker()
+    selector_stats = SelectorStats()
+    verdict_cache = VerdictCache()
+    contact_ocr = open_contact_ocr()
+    seen_index = SeenIndex(scope=seen_scope_for(job)) if SEEN_INDEX_ENABLED else None
+    candidate_warehouse = CandidateWarehouse() if WAREHOUSE_ENABLED else None
+    browser_manager = BrowserManager(cdp_url="", storage_state=state_file)
+    pacer = ProfilePacer(*PROFILE_OPEN_INTERVAL_MS)
+    handled = 0
+    stolen = 0
+
+    def quota_used():
+        return account_opens.value if account_opens is not None else handled
+
+    try:
+        async with VolcScreeningClient(cache=verdict_cache, limiter=rate_controller.api) as client:
+            llm_client = BatchScreener(client) if LLM_BATCH_MODE else client
+            undecided = []
+
+            def record_outcome(card_key, profile_url, fingerprint, outcome):
+                count_event(f"outcome:{outcome}")
+                if seen_index is not None:
+                    seen_index.mark([card_key, profile_url, fingerprint], outcome)
+
+            while quota_used() < SHARD_WORKER_QUOTA:
+                item, was_stolen = take_shard_item(worker_id, queues)
+                if item is None:
+                    if collection_done.is_set() and all(q.empty() for q in queues):
+                        break
+                    await asyncio.sleep(0.5)
+                    continue
+
+                i, page_no, card_key, url = item
+                async with navigation_tab() as attempt:
+                    profile_page = await browser_manager.new_page()
+                    resource_blocker = browser_manager.resource_blocker
+                    response_collector = browser_manager.response_collector
+                    try:
+                        await goto_profile(profile_page, url, pacer)
+                    except Exception as e:
+                        print(f"--- [worker {worker_id}] 打开简历失败: {e} ---")
+                        await profile_page.close()
+                        attempt.fail()
+                        continue
+
+                    handled += 1
+                    stolen += was_stolen
+                    if account_opens is not None:
+                        use_shard_quota(account_opens)
+                    with metric_span("profile_total"):
+                        outcome, profile_url, fingerprint = await process_profile(
+                            profile_page, i, page_no, job["briefing"], job["min_departure"])
+                    if outcome == "error":
+                        attempt.fail()
+                record_outcome(card_key, profile_url, fingerprint, outcome)
+                if outcome == "ai-undecided":
+                    undecided.append((i, page_no, card_key, url))
+            else:
+                print(f"--- [worker {worker_id}] 已达到配额 {SHARD_WORKER_QUOTA}，停止领取任务 ---")
+
+            if undecided and LLM_UNDECIDED_RETRY:
+                await retry_undecided_profiles(browser_manager.new_page, undecided, pacer, job["briefing"],
+                                               job["min_departure"], record_outcome)
+    finally:
+        await browser_manager.close()
+        run_metrics.export(metrics_path_for(output_filename))
+        selector_stats.save()
+        verdict_cache.close()
+        if contact_ocr is not None:
+            contact_ocr.close()
+        contact_journal.close()
+        if seen_index is not None:
+            seen_index.close()
+        if candidate_warehouse is not None:
+            candidate_warehouse.close()
+
+    return {"worker": worker_id, "processed": processed_resumes_count,
+            "qualified": qualified_resumes_count, "stolen": stolen}
+
+
+def shard_settings():
+    """
+    当前进程中的模块配置 (大写常量)。spawn 模式下子进程会重新导入本模块，
+    运行时修改过的配置 (例如基准测试指向本地模拟站点) 需要随任务一起传给 worker。
+    """
+    plain = (str, int, float, bool, tuple, list, dict, type(None), re.Pattern)
+    return {name: value for name, value in globals().items() if name.isupper() and isinstance(value, plain)}
+
+
+def shard_worker_process(worker_id, state_file, job, queues, collection_done, result_queue, account_opens=None,
+                         settings=None):
+    """worker 子进程入口 (模块顶层函数，spawn 模式下可被 pickle)。settings 见 shard_settings()。"""
+    if settings:
+        globals().update(settings)
+    try:
+        summary = asyncio.run(shard_worker_main(worker_id, state_file, job, queues, collection_done, account_opens))
+    except Exception as e:
+        print(f"--- [worker {worker_id}] 发生错误: {e} ---")
+        summary = {"worker": worker_id, "error": str(e)}
+    result_queue.put(summary)
+
+
+def merge_shard_exports(journal_paths, filename):
+    """合并各 worker 的流水文件，按简历链接 (无链接时按 姓名+公司+号码) 去重后导出 Excel。"""
+    store = CVStore()
+    records = []
+    keys = set()
+    for path in journal_paths:
+        if not os.path.exists(path):
+            continue
+        for row in ContactJournal(path).read_all():
+            record = CandidateRecord.from_journal(row, store)
+            key = record.url or (record.name, record.company, record.contact)
+            if key in keys:
+                continue
+            keys.add(key)
+            records.append(record)
+
+    if not records:
+        print("--- (分片合并) 没有数据可保存 ---")
+        return 0
+    count = export_contacts(records, filename, store)
+    print(f"--- (分片合并) {count} 条数据 (已去重) 已保存到: {filename} ---")
+    return count
+
+
+def run_sharded(state_files=None, job=None):
+    """
+    多账号多进程运行一次搜索。
+    state_files: 每个 worker 的登录文件列表 (默认 SHARD_STATE_FILES)，第一个账号同时用于搜索，
+    搜索时打开的简历页与 worker 0 共用该账号的配额。配额用完后未处理的链接数量在结束时报告。
+    job: 搜索条件 (默认交互式询问，格式同 prompt_search_job())。
+    返回 {"dispatched": 分发的链接数, "leftover": 未处理的链接数, "workers": 各 worker 的摘要}。
+    """
+    state_files = state_files or SHARD_STATE_FILES
+    missing = [path for path in state_files if not os.path.exists(path)]
+    if not state_files or missing:
+        print(f"错误：分片运行需要的登录文件不存在: {missing or '(未配置 SHARD_STATE_FILES)'}")
+        return
+    job = job or asyncio.run(prompt_search_job())
+
+    mp = multiprocessing.get_context("spawn")
+    queues = [mp.Queue() for _ in state_files]
+    collection_done = mp.Event()
+    result_queue = mp.Queue()
+    account_opens = mp.Value("i", 0)  # 账号 0 (协调进程 + worker 0) 已打开的简历页数
+    settings = shard_settings()
+    processes = [
+        mp.Process(target=shard_worker_process,
+                   args=(k, path, job, queues, collection_done, result_queue, account_opens if k == 0 else None,
+                         settings),
+                   daemon=True)
+        for k, path in enumerate(state_files)
+    ]
+    for process in processes:
+        process.start()
+    print(f"--- 已启动 {len(processes)} 个 worker 进程 ---")
+
+    try:
+        dispatched = asyncio.run(collect_profile_urls(job, state_files[0], queues, account_opens))
+        print(f"--- (协调) 共分发 {dispatched} 个简历链接 ---")
+    finally:
+        collection_done.set()
+
+    results = []
+    while len(results) < len(processes):
+        try:
+            results.append(result_queue.get(timeout=1))
+        except QueueEmpty:
+            if not any(process.is_alive() for process in processes):
+                break
+    for process in processes:
+        process.join(timeout=10)
+
+    for summary in sorted(results, key=lambda s: s["worker"]):
+        if "error" in summary:
+            print(f"--- worker {summary['worker']}: 出错 ({summary['error']}) ---")
+        else:
+            print(f"--- worker {summary['worker']}: 合格/已看 {summary['qualified']}/{summary['processed']}，偷取任务 {summary['stolen']} 个 ---")
+
+    # worker 全部达到配额 (或出错退出) 后，队列中剩下的链接本次不会处理
+    leftover = 0
+    for q in queues:
+        while True:
+            try:
+                q.get(timeout=0.1)
+            except QueueEmpty:
+                break
+            leftover += 1
+    if leftover:
+        print(f"--- 注意: 还有 {leftover} 个简历链接未处理 (各账号配额 {SHARD_WORKER_QUOTA} 已用完或 worker 出错) ---")
+
+    journal_paths = [journal_path_for(shard_output_path(job["output_filename"], k)) for k in range(len(state_files))]
+    merge_shard_exports(journal_paths, job["output_filename"])
+    return {"dispatched": dispatched, "leftover": leftover, "workers": sorted(results, key=lambda s: s["worker"])}
+
+
+class PauseController:
+    """
+    asyncio 原生的暂停/继续控制。
+    - 协程在安全点 await wait_if_paused()：暂停时只挂起走到安全点的协程，
+      事件循环照常运行，进行中的页面加载和 AI 请求不受影响
+    - drain: 不再打开新的简历，已打开的处理完后本轮提前结束并正常保存 (检查点保留，可续跑)
+    - 键盘监听等其他线程通过 call_threadsafe() 发送命令，状态修改在事件循环中执行；
+      导出 Excel (save，以及 EXCEL_ON_PAUSE 时的暂停) 放到线程中，不阻塞事件循环
+    """
+
+    COMMANDS = ("pause", "resume", "toggle", "save", "status", "drain")
+
+    def __init__(self):
+        self._loop = None
+        self._running = None
+        self.paused = False
+        self.draining = False
+        self.paused_seconds = 0.0
+        self._paused_at = None
+
+    def bind(self, loop=None):
+        """绑定到当前事件循环 (每个 asyncio.run() 需重新绑定)。"""
+        loop = loop or asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._running = asyncio.Event()
+            if not self.paused:
+                self._running.set()
+
+    def reset(self):
+        """新一轮开始: 恢复运行状态，清除 drain 标记。"""
+        self.draining = False
+        if self.paused:
+            self.resume()
+
+    async def wait_if_paused(self):
+        if not self.paused:
+            return
+        self.bind()
+        await self._running.wait()
+
+    def pause(self):
+        if self.paused:
+            return
+        self.paused = True
+        self._paused_at = time.monotonic()
+        if self._running is not None:
+            self._running.clear()
+        print("\n--- 程序暂停中 (进行中的步骤完成后挂起)，按 ESC 键或发送 resume 继续 ---")
+        if EXCEL_ON_PAUSE:
+            print("--- 正在保存当前进度... ---")  # 由 execute() 在线程中导出
+        elif contact_journal is not None:
+            # 每位候选人找到时已写入流水文件，暂停时无需重写整个 Excel
+            print(f"--- 已保存的候选人均已写入: {contact_journal.path} (Excel 将在结束时生成) ---")
+        with contacts_lock:
+            n = qualified_resumes_count
+            m = processed_resumes_count
+        print(f"--- (暂停时) 当前进度: {n}/{m} (合格/已看) ---")
+
+    def resume(self):
+        if not self.paused:
+            return
+        self.paused = False
+        self.paused_seconds += time.monotonic() - self._paused_at
+        if self._running is not None:
+            self._running.set()
+        print("\n--- 程序继续运行 ---")
+
+    def drain(self):
+        if not self.draining:
+            print("\n--- 收到 drain 命令: 处理完已打开的简历后结束本轮 ---")
+        self.draining = True
+        self.resume()  # 暂停中也要让已打开的简历处理完
+
+    def status(self):
+        with contacts_lock:
+            n = qualified_resumes_count
+            m = processed_resumes_count
+        paused_seconds = self.paused_seconds
+        if self.paused:
+            paused_seconds += time.monotonic() - self._paused_at
+        return {
+            "state": "draining" if self.draining else "paused" if self.paused else "running",
+            "output_filename": output_filename,
+            "journal": contact_journal.path if contact_journal is not None else None,
+            "qualified": n,
+            "processed": m,
+            "paused_seconds": round(paused_seconds, 1),
+        }
+
+    async def execute(self, command):
+        """
+        在事件循环中执行一个命令，返回当前状态。未知命令抛出 ValueError。
+        需要导出 Excel 时 (读取全部简历全文并重写整个文件) 放到线程中执行，
+        save_data_to_excel() 会在锁内复制数据，其余协程照常运行。
+        """
+        if command not in self.COMMANDS:
+            raise ValueError(f"未知命令: {command}")
+        save = command == "save"
+        if command == "pause":
+            save = not self.paused and EXCEL_ON_PAUSE
+            self.pause()
+        elif command == "resume":
+            self.resume()
+        elif command == "toggle":
+            if self.paused:
+                self.resume()
+            else:
+                save = EXCEL_ON_PAUSE
+                self.pause()
+        elif command == "drain":
+            self.drain()
+        if save:
+            await asyncio.to_thread(save_data_to_excel)
+        return self.status()
+
+    def call_threadsafe(self, command):
+        """供其他线程调用: 把命令交给事件循环执行，不在调用线程中修改状态或写文件。"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            asyncio.run(self.execute(command))
+        else:
+            asyncio.run_coroutine_threadsafe(self.execute(command), loop)
+
+
+pause_controller = PauseController()
+
+
+class ControlServer:
+    """
+    本机 HTTP 控制接口，无键盘时 (无头模式、远程) 也能控制运行:
+        curl http://127.0.0.1:8765/status
+        curl -X POST http://127.0.0.1:8765/pause    (resume / save / drain 同理)
+    仅监听 CONTROL_HOST (默认 127.0.0.1)。
+    """
+
+    def __init__(self, controller, host=None, port=None):
+        self.controller = controller
+        self.host = host or CONTROL_HOST
+        self.port = CONTROL_PORT if port is None else port
+        self._runner = None
+
+    async def start(self):
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/status", self._handle)
+        app.router.add_post("/{command}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            print(f"--- 控制接口启动失败 ({self.host}:{self.port}): {e} ---")
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        print(f"--- 控制接口: http://{self.host}:{self.port}/status (POST /pause /resume /save /drain) ---")
+
+    async def _handle(self, request):
+        command = request.match_info.get("command", "status")
+        try:
+            status = await self.controller.execute(command)
+        except ValueError as e:
+            return web.json_response({"error": str(e), "commands": list(PauseController.COMMANDS)}, status=404)
+        return web.json_response(status)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
 
 def keyboard_listener():
-    """监听键盘事件，用于暂停/继续功能"""
+    """监听键盘事件: ESC 暂停/继续 (命令交给事件循环中的 pause_controller 执行)"""
     try:
         from pynput import keyboard
-        
-        # --- [!!! 修改点 9: 修改 on_press 以便保存和打印进度 !!!] ---
+
         def on_press(key):
-            # --- [!!! 新增: 引用全局计数器 !!!] ---
-            global qualified_resumes_count, processed_resumes_count, contacts_lock
-            
-            try:
-                if key == keyboard.Key.esc:
-                    if pause_flag.is_set():
-                        print("\n--- 程序暂停中，按 ESC 键继续 ---")
-                        print("--- 正在保存当前进度... ---")
-                        pause_flag.clear()  # 暂停
-                        save_data_to_excel() # <-- 已包含进度打印
-                        
-                        # ( save_data_to_excel() 已经会打印进度了, 
-                        #   为避免重复, 这里的额外打印可以注释掉,
-                        #   但保留也无妨，作为明确的暂停反馈 )
-                        with contacts_lock:
-                            n = qualified_resumes_count
-                            m = processed_resumes_count
-                        print(f"--- (暂停时) 当前进度: {n}/{m} (合格/已看) ---")
-                        
-                    else:
-                        print("\n--- 程序继续运行 ---")
-                        pause_flag.set()  # 继续
-            except AttributeError:
-                pass  # 特殊按键不处理
-        # --- [!!! 修改结束 !!!] ---
+            if key == keyboard.Key.esc:
+                pause_controller.call_threadsafe("toggle")
 
         with keyboard.Listener(on_press=on_press) as listener:
             listener.join()
     except ImportError:
         print("pynput库未安装，无法使用ESC暂停功能。请运行: pip install pynput")
+        print(f"--- 仍可通过控制接口暂停/继续: http://{CONTROL_HOST}:{CONTROL_PORT}/status ---")
+
+
+async def run_rounds():
+    """在同一个事件循环和同一个常驻浏览器中循环执行多轮 main()。"""
+    pause_controller.bind()
+    control_server = ControlServer(pause_controller)
+    await control_server.start()
+    browser_manager = BrowserManager()
+    try:
+        while True:
+            # 运行主程序
+            # 浏览器在各轮之间保持打开，每轮只获取一个新页面；
+            # 崩溃或达到页面数上限时由 BrowserManager 自动重启
+            try:
+                pause_controller.reset() # 确保每次循环开始时程序是运行状态
+                await main(browser_manager)
+            except Exception as e:
+                print(f"--- 运行 main() 时发生意外错误: {e} ---")
+                print("--- 准备进入下一轮... ---")
+
+            print("\n" + "="*50)
+            print("--- 本轮运行已结束 ---")
+            print("="*50)
+
+            if pause_controller.draining:
+                print("--- 已通过 drain 命令结束，程序退出。---")
+                break
+
+            # 在线程中等待输入，不阻塞事件循环 (浏览器连接保持活跃)
+            choice = (await asyncio.to_thread(input, "是否要用新的条件开始一轮新的搜索? [Y/n]: ")).strip().lower()
+
+            if choice == 'n':
+                print("感谢使用，程序退出。")
+                break
+            # 如果输入 'y' 或直接按 Enter, 循环将继续
+            # 并重新执行 main()，提示输入新的条件
+    finally:
+        await browser_manager.close()
+        print("浏览器已关闭。")
+        await control_server.stop()
 
 
 def run_with_pause_control():
@@ -702,33 +3943,325 @@ def run_with_pause_control():
     # 启动键盘监听线程
     listener_thread = threading.Thread(target=keyboard_listener, daemon=True)
     listener_thread.start()
-    
-    while True:
-        # 运行主程序
-        # 每次循环都会创建一个新的事件循环来运行 main()
-        # 确保资源 (如浏览器) 被正确关闭和重新初始化
+
+    asyncio.run(run_rounds())
+
+
+# -------------------------------------------------------------------
+# 5. 批量任务 (非交互)
+# -------------------------------------------------------------------
+# 任务文件 (JSON，或安装了 PyYAML 时的 YAML) 列出多组搜索条件，依次在同一个浏览器、
+# 同一个 AI 客户端 (连接池 + 判断缓存) 和同一个限速器下执行，全程不读取标准输入。
+# 每个任务照常导出自己的 Excel / 流水 / 检查点，另写一份汇总报告 (每个任务结束后更新)。
+#   {
+#     "defaults": {"min_departure": "23/1", "resume": true},
+#     "report": "batch_report.json",
+#     "jobs": [
+#       {"company": "腾讯", "position": "产品经理"},
+#       {"company": "字节跳动", "position": "算法工程师", "min_departure": "Present",
+#        "briefing": ["1. 必须有在字节跳动的工作经历。", "2. 做过推荐算法。"],
+#        "output_filename": "字节_算法.xlsx"}
+#     ]
+#   }
+# 省略的 briefing / output_filename / min_departure 与交互模式直接回车时的默认值相同；
+# 文件内容也可以只是 jobs 列表。
+
+BATCH_JOB_KEYS = ("company", "position", "briefing", "output_filename", "min_departure", "resume")
+
+
+def normalize_batch_job(entry, defaults=None):
+    """把任务文件中的一项补全为 main() 使用的 job 字典 (格式同 prompt_search_job())。"""
+    if not isinstance(entry, dict):
+        raise ValueError(f"任务必须是对象: {entry!r}")
+    merged = dict(defaults or {})
+    merged.update(entry)
+    unknown = set(merged) - set(BATCH_JOB_KEYS)
+    if unknown:
+        raise ValueError(f"未知的任务字段: {', '.join(sorted(unknown))}")
+    company = str(merged.get("company") or "").strip()
+    position = str(merged.get("position") or "").strip()
+    if not company or not position:
+        raise ValueError(f"任务缺少 company 或 position: {entry!r}")
+
+    briefing = merged.get("briefing")
+    if isinstance(briefing, list):
+        briefing = "\n".join(str(line) for line in briefing)
+    if not briefing or not str(briefing).strip():
+        briefing = build_default_briefing(company, position)
+
+    filename = str(merged.get("output_filename") or "").strip() or f"{company}_{position}_contacts.xlsx"
+    if not filename.endswith(".xlsx"):
+        filename += ".xlsx"
+
+    return {
+        "company": company,
+        "position": position,
+        "briefing": str(briefing),
+        "output_filename": filename,
+        "min_departure": str(merged.get("min_departure") or "").strip() or "00/1",
+        "resume": bool(merged.get("resume")),
+    }
+
+
+def load_job_file(path):
+    """
+    读取并校验任务文件，返回 (jobs, report_path)。
+    所有任务在打开浏览器之前校验完毕，避免跑到半夜才发现某个任务写错；
+    两个任务的输出文件名相同时会互相覆盖流水和检查点，直接报错。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("读取 YAML 任务文件需要 PyYAML: pip install pyyaml (或改用 JSON)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    if isinstance(data, list):
+        data = {"jobs": data}
+    if not isinstance(data, dict) or not isinstance(data.get("jobs"), list) or not data["jobs"]:
+        raise ValueError(f"任务文件中没有任务列表 (jobs): {path}")
+
+    jobs = []
+    filenames = set()
+    for n, entry in enumerate(data["jobs"], 1):
         try:
-            pause_flag.set() # 确保每次循环开始时程序是运行状态
-            asyncio.run(main())
-        except Exception as e:
-            print(f"--- 运行 main() 时发生意外错误: {e} ---")
-            print("--- 准备进入下一轮... ---")
+            job = normalize_batch_job(entry, data.get("defaults"))
+        except ValueError as e:
+            raise ValueError(f"第 {n} 个任务: {e}")
+        if job["output_filename"] in filenames:
+            raise ValueError(f"第 {n} 个任务: 输出文件名重复 ({job['output_filename']})")
+        filenames.add(job["output_filename"])
+        jobs.append(job)
 
-        print("\n" + "="*50)
-        print("--- 本轮运行已结束 ---")
-        print("="*50)
-        
-        choice = input("是否要用新的条件开始一轮新的搜索? [Y/n]: ").strip().lower()
-        
-        if choice == 'n':
-            print("感谢使用，程序退出。")
-            break
-        # 如果输入 'y' 或直接按 Enter, 循环将继续
-        # 并重新执行 main()，提示输入新的条件
+    report_path = data.get("report") or f"batch_report_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    return jobs, report_path
+
+
+def write_batch_report(path, report):
+    """原子地写出汇总报告 (先写临时文件再替换，中途崩溃也不会留下半个文件)。"""
+    jobs = [entry for entry in report["jobs"] if entry.get("status") not in ("pending", "skipped")]
+    report["totals"] = {
+        "jobs": len(report["jobs"]),
+        "finished": len(jobs),
+        "failed": sum(1 for entry in jobs if entry.get("status") == "error"),
+        "processed": sum(entry.get("processed", 0) for entry in jobs),
+        "qualified": sum(entry.get("qualified", 0) for entry in jobs),
+        "seconds": round(sum(entry.get("seconds", 0) for entry in jobs), 1),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def run_batch_jobs(jobs, report_path, job_file=None):
+    """依次执行 jobs，共用浏览器、AI 客户端和限速器；每个任务结束后更新汇总报告。"""
+    report = {
+        "job_file": job_file,
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "finished_at": None,
+        "jobs": [{"company": job["company"], "position": job["position"],
+                  "output_filename": job["output_filename"], "status": "pending"} for job in jobs],
+    }
+    write_batch_report(report_path, report)
+    print(f"--- 批量模式: 共 {len(jobs)} 个任务，汇总报告: {report_path} ---")
+
+    pause_controller.bind()
+    control_server = ControlServer(pause_controller)
+    await control_server.start()
+    browser_manager = BrowserManager()
+    rates = RateController()
+    cache = VerdictCache()
+    try:
+        async with VolcScreeningClient(cache=cache, limiter=rates.api) as client:
+            for n, job in enumerate(jobs):
+                if pause_controller.draining:
+                    report["jobs"][n]["status"] = "skipped"
+                    continue
+                print("\n" + "=" * 50)
+                print(f"--- 批量任务 {n + 1}/{len(jobs)}: {job['company']} {job['position']} -> {job['output_filename']} ---")
+                print("=" * 50)
+                pause_controller.reset()
+                started = time.perf_counter()
+                try:
+                    summary = await main(browser_manager, job, client=client, rates=rates)
+                except Exception as e:
+                    print(f"--- 批量任务 {n + 1} 发生意外错误: {e} ---")
+                    summary = None
+                    report["jobs"][n].update(status="error", error=str(e))
+                if summary is not None:
+                    report["jobs"][n].update(summary)
+                    if pause_controller.draining:
+                        print("--- 已通过 drain 命令结束，剩余任务不再执行 ---")
+                elif report["jobs"][n]["status"] == "pending":
+                    report["jobs"][n].update(status="error", error="未找到登录文件")
+                report["jobs"][n].setdefault("seconds", round(time.perf_counter() - started, 1))
+                report["jobs"][n]["finished_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                write_batch_report(report_path, report)
+    finally:
+        cache.close()
+        await browser_manager.close()
+        print("浏览器已关闭。")
+        await control_server.stop()
+        report["finished_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        write_batch_report(report_path, report)
+
+    print("\n--- 批量任务汇总 ---")
+    for entry in report["jobs"]:
+        print(f"  [{entry['status']}] {entry['company']} {entry['position']}: "
+              f"{entry.get('qualified', 0)}/{entry.get('processed', 0)} (合格/已看) -> {entry['output_filename']}")
+    totals = report["totals"]
+    print(f"--- 完成 {totals['finished']}/{totals['jobs']} 个任务，合格 {totals['qualified']} 人，"
+          f"用时 {totals['seconds']:.0f} 秒，报告: {report_path} ---")
+    return report
+
+
+def run_batch(job_file):
+    """
+    批量模式入口: 读取任务文件，无人值守地依次执行所有任务 (不读取标准输入，不监听键盘)。
+    运行中可通过控制接口暂停或 drain (当前任务处理完已打开的简历后结束，剩余任务跳过)。
+    """
+    jobs, report_path = load_job_file(job_file)
+    if not BROWSER_CDP_URL and not os.path.exists("state.json"):
+        print("错误：未找到 state.json 登录文件。")
+        print("请先运行 save_session() 函数并手动登录一次。")
+        return None
+    return asyncio.run(run_batch_jobs(jobs, report_path, job_file))
+
+
+# -------------------------------------------------------------------
+# 6. 离线重筛 (候选人库)
+# -------------------------------------------------------------------
+# 新提纲到来时，直接对候选人库 (CandidateWarehouse) 中已抓取的简历重新筛选，不打开浏览器:
+# 全文检索缩小范围 -> 日期过滤 -> 本地预筛 -> AI 判断，合格者按 save_data_to_excel() 的列格式导出。
+# 库中已有联系方式的直接带出；没有的 "云号码" 列留空，需要时再打开简历链接获取。
+
+RESCREEN_CONCURRENCY = 16  # 离线重筛同时等待 AI 判断的简历数 (实际请求并发仍由限速器控制)
+
+
+def rescreen_path_for(filename):
+    """离线重筛的导出文件名，例如 a_b_contacts.xlsx -> a_b_contacts.rescreen.xlsx (不覆盖在线运行的导出)"""
+    return os.path.splitext(filename)[0] + ".rescreen.xlsx"
+
+
+async def rescreen_warehouse(job, query_terms=None, limit=None):
+    """
+    用一组搜索条件 (格式同 prompt_search_job()) 对候选人库离线重筛，返回摘要字典。
+    query_terms: 全文检索关键词 (任一出现即可)，默认使用目标公司及其别名
+    (PRESCREEN_ENABLED 为 False 时默认不缩小范围)；limit: 最多检查多少份简历。
+    AI 判断经过同一套限速器和判断缓存，同一简历 + 同一提纲重复重筛不会再次调用 API。
+    """
+    global llm_client, verdict_cache, rate_controller, run_metrics
+
+    company = job["company"]
+    briefing_text = job["briefing"]
+    min_departure_str = job["min_departure"]
+    filename = rescreen_path_for(job["output_filename"])
+    company_terms = [company] + COMPANY_ALIASES.get(company, [])
+    matcher = compile_terms(company_terms)
+    screener = PreScreener(company, job["position"], briefing_text) if PRESCREEN_ENABLED else None
+    terms = list(query_terms or (company_terms if screener is not None else []))
+
+    run_metrics = RunMetrics()
+    rate_controller = RateController()
+    verdict_cache = VerdictCache()
+    warehouse = CandidateWarehouse()
+    store = CVStore()
+    counts = dict.fromkeys(("date-rejected", "prescreen-rejected", "ai-rejected", "ai-undecided", "qualified"), 0)
+    hits = []
+    checked = 0
+    started = time.perf_counter()
+    print(f"\n--- 离线重筛: {company} {job['position']}，候选人库共 {len(warehouse)} 份简历 ---")
+    if terms:
+        print(f"--- 全文检索: {build_match_query(terms)} ---")
+    rows = enumerate(warehouse.search(terms, limit))
+
+    async def worker():
+        nonlocal checked
+        # 各 worker 共用同一个游标，逐行领取 (取行本身是同步的，不会交错)
+        for n, row in rows:
+            checked += 1
+            cv_text = row["cv_text"]
+            departure = select_departure_period(parse_work_history(cv_text), matcher) or row["work_time"]
+            if not departure or not is_departure_date_ok(departure, min_departure_str):
+                outcome = "date-rejected"
+            elif screener is not None and not screener.check(cv_text)[0]:
+                outcome = "prescreen-rejected"
+            else:
+                with metric_span("llm"):
+                    verdict = await llm_client.is_match(cv_text, briefing_text)
+                if verdict is None:
+                    outcome = "ai-undecided"
+                elif verdict:
+                    outcome = "qualified"
+                    hits.append((n, row))
+                    print(f"--- 合格: {row['name'] or '(无姓名)'} {row['url']} ---")
+                else:
+                    outcome = "ai-rejected"
+            counts[outcome] += 1
+            count_event(f"outcome:{outcome}")
+
+    try:
+        async with VolcScreeningClient(cache=verdict_cache, limiter=rate_controller.api) as client:
+            llm_client = BatchScreener(client) if LLM_BATCH_MODE else client
+            await asyncio.gather(*(worker() for _ in range(max(1, RESCREEN_CONCURRENCY))))
+    finally:
+        warehouse.close()
+        verdict_cache.close()
+
+    hits.sort(key=lambda item: item[0])  # 恢复检索顺序 (有关键词时按相关度)
+    records = [
+        CandidateRecord(name=row["name"], title=row["title"], company=row["company"], work_time=row["work_time"],
+                        contact=row["contact"], url=row["url"], contact_image=row["contact_image"],
+                        cv_ref=store.put(row["cv_text"]))
+        for _, row in hits
+    ]
+    if records:
+        export_contacts(records, filename, store)
+        missing = sum(1 for record in records if not record.contact)
+        print(f"--- {len(records)} 位合格候选人已导出到: {filename} (其中 {missing} 位尚无联系方式) ---")
+    else:
+        print("--- 没有合格的候选人 ---")
+
+    seconds = time.perf_counter() - started
+    print(f"--- 离线重筛完成: 检查 {checked} 份，用时 {seconds:.1f} 秒，"
+          + ", ".join(f"{outcome} {count}" for outcome, count in counts.items()) + " ---")
+    if screener is not None:
+        print(f"--- {screener.stats_text()} ---")
+    print(f"--- {verdict_cache.stats_text()} ---")
+    if counts["ai-undecided"]:
+        print(f"--- {counts['ai-undecided']} 份简历 AI 无法判断，可稍后重新运行 (已判断的会命中缓存) ---")
+    return {
+        "company": company,
+        "position": job["position"],
+        "output_filename": filename if records else None,
+        "checked": checked,
+        "seconds": round(seconds, 1),
+        **counts,
+    }
+
+
+def run_rescreen(job=None, query_terms=None, limit=None):
+    """
+    离线重筛入口 (不需要浏览器和登录文件):
+        run_rescreen()                          交互式输入搜索条件
+        run_rescreen("jobs.json")               对任务文件 (格式见第 5 节) 中的每个任务依次重筛
+        run_rescreen({"company": "腾讯", ...})  单个任务 (字段同任务文件)
+    """
+    if job is None:
+        jobs = [asyncio.run(prompt_search_job())]
+    elif isinstance(job, str):
+        jobs = load_job_file(job)[0]
+    else:
+        jobs = [normalize_batch_job(job)]
+    return [asyncio.run(rescreen_warehouse(entry, query_terms, limit)) for entry in jobs]
 
 
 # -------------------------------------------------------------------
-# 4. 运行主程序
+# 7. 运行主程序
 # -------------------------------------------------------------------
 if __name__ == "__main__":
     
@@ -738,5 +4271,20 @@ if __name__ == "__main__":
     # 如果是第一次运行或登录过期，取消注释下一行来保存会话
     #asyncio.run(save_session())
     
+    # 联系方式为图片时，用一张核对过的截图生成字形模板 (覆盖 0-9)，之后会自动识别号码:
+    #build_digit_templates("张先生.png", "13812345678")
+
     # 保存会话后，注释掉 save_session()，然后运行 main()
-    run_with_pause_control()
\ No newline at end of file
+    run_with_pause_control()
+
+    # 无人值守批量运行: 把搜索条件写进任务文件 (格式见第 5 节)，
+    # 然后注释掉 run_with_pause_control()，改为运行下一行
+    #run_batch("jobs.json")
+
+    # 离线重筛: 用新的提纲筛选候选人库中已抓取的简历，不打开浏览器 (参数同 run_batch，或留空交互输入)。
+    # 以前导出的 Excel 可先导入候选人库: CandidateWarehouse().import_excel("腾讯_产品经理_contacts.xlsx")
+    #run_rescreen("jobs.json")
+
+    # 多账号并行: 为每个账号运行 save_session("state_N.json")，填好 SHARD_STATE_FILES，
+    # 然后注释掉 run_with_pause_control()，改为运行下一行
+    #run_sharded()
\ No newline at end of file